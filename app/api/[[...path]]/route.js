@@ -1,7 +1,29 @@
 import { NextResponse } from 'next/server';
-import { query } from '@/lib/db';
+import { query, prepared, trackQueries, withTransaction, getQueryStats, getPoolStats } from '@/lib/db';
 import { runMigrations } from '@/lib/migrate';
 import { runSeed } from '@/lib/seed';
+import { getRevenueSummary, rebuildDailyRevenue, recordRevenueChange } from '@/lib/revenue';
+import {
+  createOrders,
+  validateOrder,
+  listOrders,
+  listRecentOrders,
+  ORDER_LIST_FIELDS,
+  ORDER_LIST_DEFAULT,
+  MAX_BATCH_ORDERS
+} from '@/lib/orders';
+import { getResourceVersion, bumpResourceVersion, CATALOG, TEAM } from '@/lib/versions';
+import {
+  renderPdf,
+  getPdfPool,
+  PdfQueueFullError,
+  pdfCacheKey,
+  getOrRenderPdf,
+  invalidateOrderPdfs,
+  invalidateClientPdfs,
+  clearPdfCache,
+  getPdfCacheStats
+} from '@/lib/pdf';
 import {
   generateAccessToken,
   generateRefreshToken,
@@ -10,12 +32,20 @@ import {
   comparePassword,
   hashPassword,
   getUserWithTenants,
+  getCachedUserWithTenants,
+  clearUserCache,
+  getUserCacheStats,
+  getPasswordHashingStats,
   hasPermission
 } from '@/lib/auth';
+import { TokenBucketLimiter, RateLimitError } from '@/lib/ratelimit';
+import { compressResponse } from '@/lib/compression';
+import { enqueueEmail, kickOutbox, startOutboxWorker, getEmailStats } from '@/lib/email';
+import { openOrderExport, validateExportParams, getExportStats } from '@/lib/export';
+import { trackTiming, timePhase, timePhaseSync, serverTimingEntry } from '@/lib/timing';
 import { v4 as uuidv4 } from 'uuid';
-import nodemailer from 'nodemailer';
-import puppeteer from 'puppeteer';
-import { zonedTimeToUtc, format } from 'date-fns-tz';
+import fs from 'fs';
+import { timingSafeEqual } from 'crypto';
 
 // ============ MIDDLEWARE ============
 function getTokenFromRequest(request) {
@@ -39,7 +69,7 @@ async function authenticate(request) {
     return { error: 'Invalid or expired token', status: 401 };
   }
   
-  const user = await getUserWithTenants(decoded.userId);
+  const user = await getCachedUserWithTenants(decoded.userId);
   if (!user) {
     return { error: 'User not found', status: 404 };
   }
@@ -47,6 +77,25 @@ async function authenticate(request) {
   return { user };
 }
 
+// Operator endpoints report on the whole process (every tenant's queries,
+// pid, memory), so they take the METRICS_TOKEN secret as the bearer token
+// rather than any tenant's login. Without METRICS_TOKEN they are disabled.
+const METRICS_TOKEN = process.env.METRICS_TOKEN || '';
+
+function authenticateOperator(request) {
+  if (!METRICS_TOKEN) {
+    return { error: 'Route not found', status: 404 };
+  }
+  
+  const given = Buffer.from(getTokenFromRequest(request) || '');
+  const expected = Buffer.from(METRICS_TOKEN);
+  if (given.length !== expected.length || !timingSafeEqual(given, expected)) {
+    return { error: 'Invalid operator token', status: 401 };
+  }
+  
+  return {};
+}
+
 function getTenantFromUser(user, tenantId) {
   if (!tenantId) {
     return user.tenants && user.tenants.length > 0 ? user.tenants[0] : null;
@@ -55,44 +104,198 @@ function getTenantFromUser(user, tenantId) {
   return user.tenants?.find(t => t.tenant_id === tenantId) || null;
 }
 
-// ============ EMAIL HELPER ============
-let emailTransporter = null;
-
-async function getEmailTransporter() {
-  if (emailTransporter) return emailTransporter;
-  
-  const { SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS } = process.env;
-  
-  if (!SMTP_HOST) {
-    // Use Ethereal for dev
-    const testAccount = await nodemailer.createTestAccount();
-    emailTransporter = nodemailer.createTransport({
-      host: 'smtp.ethereal.email',
-      port: 587,
-      secure: false,
-      auth: {
-        user: testAccount.user,
-        pass: testAccount.pass,
-      },
-    });
-    console.log('📧 Using Ethereal test email account');
-  } else {
-    emailTransporter = nodemailer.createTransport({
-      host: SMTP_HOST,
-      port: parseInt(SMTP_PORT || '587'),
-      secure: SMTP_PORT === '465',
-      auth: {
-        user: SMTP_USER,
-        pass: SMTP_PASS,
-      },
-    });
+// ============ RATE LIMITING ============
+// Login attempts per client IP (every attempt counts) and per account (only
+// failed attempts count: each attempt reserves a token before the password is
+// checked and a correct password gives it back). Accounts are keyed by user
+// id, so guessing by username and by email draw on one budget; logins that
+// match no account are limited per login string. A burst of 0 disables that
+// limiter.
+// Trade-off: once failed guesses (from any IPs) empty an account's bucket, the
+// owner's correct password is refused with 429 too until it refills
+// (LOGIN_USER_BURST / LOGIN_USER_PER_MINUTE, one minute by default). Letting a
+// correct password through an empty bucket would tell a distributed guesser
+// exactly when it hit, so the per-account limit would bound nothing.
+const loginIpLimiter = new TokenBucketLimiter({
+  burst: parseInt(process.env.LOGIN_IP_BURST || '20', 10),
+  perMinute: parseInt(process.env.LOGIN_IP_PER_MINUTE || '10', 10)
+});
+const loginUserLimiter = new TokenBucketLimiter({
+  burst: parseInt(process.env.LOGIN_USER_BURST || '5', 10),
+  perMinute: parseInt(process.env.LOGIN_USER_PER_MINUTE || '5', 10)
+});
+
+// Proxies in front of the app that append to X-Forwarded-For; the client is
+// the entry that many hops from the end (anything earlier is client-supplied)
+const TRUSTED_PROXY_HOPS = parseInt(process.env.TRUSTED_PROXY_HOPS || '1', 10);
+
+function getClientIp(request) {
+  const forwarded = (request.headers.get('x-forwarded-for') || '')
+    .split(',')
+    .map((hop) => hop.trim())
+    .filter(Boolean);
+  
+  if (forwarded.length > 0 && TRUSTED_PROXY_HOPS > 0) {
+    return forwarded[Math.max(forwarded.length - TRUSTED_PROXY_HOPS, 0)];
   }
   
-  return emailTransporter;
+  return request.headers.get('x-real-ip') || 'unknown';
+}
+
+function tooManyRequests(message, retryAfter) {
+  return NextResponse.json(
+    { error: message },
+    { status: 429, headers: { 'Retry-After': String(retryAfter) } }
+  );
+}
+
+// ============ PAGINATION HELPER ============
+const DEFAULT_PAGE_SIZE = 100;
+const MAX_PAGE_SIZE = 500;
+
+// Keyset cursor over (created_at, id). created_at travels as Postgres text so
+// microsecond precision survives (a JS Date would truncate it to ms).
+function encodeCursor(row) {
+  return Buffer.from(JSON.stringify([row._cursor_created_at, row.id])).toString('base64url');
+}
+
+function decodeCursor(cursor) {
+  try {
+    const [createdAt, id] = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf8'));
+    if (typeof createdAt !== 'string' || typeof id !== 'string') return null;
+    return { createdAt, id };
+  } catch (error) {
+    return null;
+  }
+}
+
+// Returns null when the client didn't ask for pagination (full listing)
+function getPageParams(url) {
+  const limitParam = url.searchParams.get('limit');
+  const after = url.searchParams.get('after');
+  
+  if (limitParam === null && after === null) {
+    return null;
+  }
+  
+  const limit = Math.min(Math.max(parseInt(limitParam || DEFAULT_PAGE_SIZE, 10) || DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE);
+  const cursor = after ? decodeCursor(after) : null;
+  
+  if (after && !cursor) {
+    return { error: 'Invalid cursor' };
+  }
+  
+  return { limit, cursor };
+}
+
+// Rows are fetched with LIMIT page.limit + 1 so we know whether another page exists
+function buildPage(rows, limit) {
+  const hasMore = rows.length > limit;
+  const pageRows = (hasMore ? rows.slice(0, limit) : rows).map(({ _cursor_created_at, ...row }) => row);
+  
+  return {
+    rows: pageRows,
+    nextCursor: hasMore ? encodeCursor(rows[limit - 1]) : null
+  };
+}
+
+// ============ CONDITIONAL REQUESTS ============
+// If-None-Match check with weak comparison, so W/"x" and "x" match each other
+function etagMatches(request, etag) {
+  const ifNoneMatch = request.headers.get('if-none-match');
+  
+  if (!ifNoneMatch) return false;
+  
+  const opaque = etag.replace(/^W\//, '');
+  return ifNoneMatch.split(',').some((tag) => {
+    const candidate = tag.trim();
+    return candidate === '*' || candidate.replace(/^W\//, '') === opaque;
+  });
+}
+
+// ETag for a tenant listing versioned in resource_versions. Weak, since the
+// same version goes out both compressed and uncompressed.
+function versionETag(tenantId, resource, version) {
+  return `W/"${resource}-${tenantId}-${version}"`;
+}
+
+// ============ FIELD PROJECTION ============
+// Columns list endpoints return with ?fields=a,b,c, mapped to their SQL
+// (orders: ORDER_LIST_FIELDS in lib/orders). Only expressions from these maps
+// ever reach the query text.
+const CLIENT_LIST_FIELDS = {
+  id: 'id',
+  tenant_id: 'tenant_id',
+  name: 'name',
+  phone: 'phone',
+  email: 'email',
+  vehicle_plate: 'vehicle_plate',
+  vehicle_model: 'vehicle_model',
+  notes: 'notes',
+  created_at: 'created_at',
+  updated_at: 'updated_at'
+};
+const CLIENT_LIST_DEFAULT = '*';
+
+// SELECT list for the ?fields= parameter, or the full default without it.
+// id is always included: the keyset cursor and the UI's list keys need it.
+// The rest are sorted, so every order of the same fields is one statement
+// (and one prepared statement name) rather than one per permutation.
+function getProjection(url, allowed, defaultSelect) {
+  const param = url.searchParams.get('fields');
+  
+  if (param === null) {
+    return { select: defaultSelect };
+  }
+  
+  const requested = param.split(',').map((field) => field.trim()).filter((field) => field && field !== 'id');
+  const fields = ['id', ...[...new Set(requested)].sort()];
+  const unknown = fields.filter((field) => !Object.hasOwn(allowed, field));
+  
+  if (unknown.length > 0) {
+    return { error: `Unknown fields: ${unknown.join(', ')}` };
+  }
+  
+  return { select: fields.map((field) => `${allowed[field]} as ${field}`).join(', ') };
+}
+
+// ============ DIAGNOSTICS HELPER ============
+// Open file descriptors of this process (Linux only; null elsewhere)
+function countOpenFds() {
+  try {
+    return fs.readdirSync('/proc/self/fd').length;
+  } catch (error) {
+    return null;
+  }
+}
+
+// Point-in-time resource usage, sampled over time by the soak harness to
+// spot leaks (memory, sockets/fds, pg connections, Chromium instances)
+function getDiagnostics() {
+  const memory = process.memoryUsage();
+  
+  return {
+    sampledAt: new Date().toISOString(),
+    process: {
+      pid: process.pid,
+      uptimeSec: process.uptime(),
+      rss: memory.rss,
+      heapTotal: memory.heapTotal,
+      heapUsed: memory.heapUsed,
+      external: memory.external,
+      arrayBuffers: memory.arrayBuffers,
+      openFds: countOpenFds()
+    },
+    db: getPoolStats(),
+    pdf: getPdfPool().stats(),
+    email: getEmailStats()
+  };
 }
 
 // ============ PDF HELPER ============
-async function generateOrderPDF(orderId, tenantId) {
+// Everything the receipt shows (also what its cache key is hashed from);
+// null when the order doesn't exist
+async function loadOrderForPDF(orderId, tenantId) {
   const orderResult = await query(`
     SELECT o.*, c.name as client_name, c.phone as client_phone, 
            c.vehicle_plate, c.vehicle_model,
@@ -104,19 +307,20 @@ async function generateOrderPDF(orderId, tenantId) {
   `, [orderId, tenantId]);
   
   if (orderResult.rows.length === 0) {
-    throw new Error('Order not found');
+    return null;
   }
   
-  const order = orderResult.rows[0];
-  
   const itemsResult = await query(`
     SELECT service_name, price, quantity
     FROM order_items
     WHERE order_id = $1
+    ORDER BY created_at, id
   `, [orderId]);
   
-  const items = itemsResult.rows;
-  
+  return { order: orderResult.rows[0], items: itemsResult.rows };
+}
+
+async function generateOrderPDF(order, items) {
   const logoPath = order.logo_url || '/assets/logo/teste.png';
   const primaryColor = order.primary_color || '#0071CE';
   
@@ -225,28 +429,24 @@ async function generateOrderPDF(orderId, tenantId) {
     </html>
   `;
   
-  const browser = await puppeteer.launch({
-    headless: true,
-    args: ['--no-sandbox', '--disable-setuid-sandbox']
-  });
-  
-  const page = await browser.newPage();
-  await page.setContent(html, { waitUntil: 'networkidle0' });
-  
-  const pdf = await page.pdf({
+  // Rendered on a pooled page of a long-lived browser (see lib/pdf.js)
+  return renderPdf(html, {
     format: 'A4',
     printBackground: true,
     margin: { top: '20px', right: '20px', bottom: '20px', left: '20px' }
   });
-  
-  await browser.close();
-  
-  return pdf;
+}
+
+// ============ SERVER TIMING ============
+// NextResponse.json() that books the JSON.stringify time under "serialize" in
+// Server-Timing; used for the responses whose payload can be large
+function jsonResponse(body, init) {
+  return timePhaseSync('serialize', () => NextResponse.json(body, init));
 }
 
 // ============ ROUTES ============
 
-export async function GET(request) {
+async function handleGet(request) {
   const url = new URL(request.url);
   const path = url.pathname.replace('/api', '');
   
@@ -259,11 +459,50 @@ export async function GET(request) {
     if (path === '/setup') {
       await runMigrations();
       await runSeed();
+      await rebuildDailyRevenue();
+      clearUserCache();
+      clearPdfCache();
+      // The outbox poll pauses while email_outbox is missing; it exists now
+      kickOutbox();
       return NextResponse.json({ message: 'Database setup completed successfully' });
     }
     
+    // ============ OPERATOR ROUTES ============
+    // GET /metrics - Process-wide query and cache instrumentation (METRICS_TOKEN)
+    if (path === '/metrics') {
+      const operator = authenticateOperator(request);
+      if (operator.error) {
+        return NextResponse.json({ error: operator.error }, { status: operator.status });
+      }
+      
+      return jsonResponse({
+        queries: getQueryStats(),
+        authCache: getUserCacheStats(),
+        login: {
+          passwordHashing: getPasswordHashingStats(),
+          ipLimiter: loginIpLimiter.stats(),
+          userLimiter: loginUserLimiter.stats()
+        },
+        pdf: {
+          pool: getPdfPool().stats(),
+          cache: getPdfCacheStats()
+        },
+        export: getExportStats()
+      });
+    }
+    
+    // GET /diagnostics - Process resource usage for leak tracking (METRICS_TOKEN)
+    if (path === '/diagnostics') {
+      const operator = authenticateOperator(request);
+      if (operator.error) {
+        return NextResponse.json({ error: operator.error }, { status: operator.status });
+      }
+      
+      return jsonResponse(getDiagnostics());
+    }
+    
     // ============ PROTECTED ROUTES ============
-    const auth = await authenticate(request);
+    const auth = await timePhase('auth', () => authenticate(request));
     if (auth.error) {
       return NextResponse.json({ error: auth.error }, { status: auth.status });
     }
@@ -283,113 +522,152 @@ export async function GET(request) {
     
     // GET /dashboard - Dashboard analytics
     if (path === '/dashboard') {
-      const timezone = 'America/Sao_Paulo';
-      const now = new Date();
-      
-      // Today revenue
-      const todayStart = format(now, 'yyyy-MM-dd', { timeZone: timezone });
-      const todayResult = await query(`
-        SELECT COALESCE(SUM(total_amount), 0) as total
-        FROM orders
-        WHERE tenant_id = $1 
-          AND status = 'paid'
-          AND DATE(paid_at AT TIME ZONE 'America/Sao_Paulo') = $2
-      `, [tenant.tenant_id, todayStart]);
-      
-      // Last 15 days revenue
-      const last15Result = await query(`
-        SELECT COALESCE(SUM(total_amount), 0) as total
-        FROM orders
-        WHERE tenant_id = $1 
-          AND status = 'paid'
-          AND paid_at >= NOW() - INTERVAL '15 days'
-      `, [tenant.tenant_id]);
+      // ?fields= projects recentOrders, like GET /orders
+      const projection = getProjection(url, ORDER_LIST_FIELDS, ORDER_LIST_DEFAULT);
       
-      // Last 30 days revenue
-      const last30Result = await query(`
-        SELECT COALESCE(SUM(total_amount), 0) as total
-        FROM orders
-        WHERE tenant_id = $1 
-          AND status = 'paid'
-          AND paid_at >= NOW() - INTERVAL '30 days'
-      `, [tenant.tenant_id]);
+      if (projection.error) {
+        return NextResponse.json({ error: projection.error }, { status: 400 });
+      }
       
-      // Recent orders
-      const recentOrdersResult = await query(`
-        SELECT o.*, c.name as client_name, c.vehicle_plate
-        FROM orders o
-        LEFT JOIN clients c ON o.client_id = c.id
-        WHERE o.tenant_id = $1
-        ORDER BY o.created_at DESC
-        LIMIT 10
-      `, [tenant.tenant_id]);
+      // Revenue windows come from the daily_revenue rollup in one aggregate;
+      // both queries are independent, so run them side by side
+      const [revenue, recentOrdersResult] = await Promise.all([
+        getRevenueSummary(tenant.tenant_id),
+        listRecentOrders(tenant.tenant_id, projection.select)
+      ]);
       
-      return NextResponse.json({
-        revenue: {
-          today: parseFloat(todayResult.rows[0].total),
-          last15Days: parseFloat(last15Result.rows[0].total),
-          last30Days: parseFloat(last30Result.rows[0].total)
-        },
+      return jsonResponse({
+        revenue,
         recentOrders: recentOrdersResult.rows
       });
     }
     
-    // GET /clients - List all clients
+    // GET /clients - List clients (keyset-paginated when ?limit= or ?after= is given)
     if (path === '/clients') {
-      const result = await query(`
-        SELECT * FROM clients
+      const page = getPageParams(url);
+      const projection = getProjection(url, CLIENT_LIST_FIELDS, CLIENT_LIST_DEFAULT);
+      
+      if (page?.error || projection.error) {
+        return NextResponse.json({ error: page?.error || projection.error }, { status: 400 });
+      }
+      
+      if (page) {
+        const result = await query(prepared('clients_page', `
+          SELECT ${projection.select}, created_at::text as _cursor_created_at FROM clients
+          WHERE tenant_id = $1
+            AND ($2::timestamptz IS NULL OR (created_at, id) < ($2::timestamptz, $3::uuid))
+          ORDER BY created_at DESC, id DESC
+          LIMIT $4
+        `), [tenant.tenant_id, page.cursor?.createdAt ?? null, page.cursor?.id ?? null, page.limit + 1]);
+        
+        const { rows, nextCursor } = buildPage(result.rows, page.limit);
+        return jsonResponse({ nextCursor, clients: rows });
+      }
+      
+      const result = await query(prepared('clients_all', `
+        SELECT ${projection.select} FROM clients
         WHERE tenant_id = $1
         ORDER BY created_at DESC
-      `, [tenant.tenant_id]);
+      `), [tenant.tenant_id]);
       
-      return NextResponse.json({ clients: result.rows });
+      return jsonResponse({ clients: result.rows });
     }
     
-    // GET /services - List all services
+    // GET /services - List all services (304 while the catalog version is unchanged)
     if (path === '/services') {
-      const result = await query(`
+      // Version first: a write landing in between makes the ETag stale, never the rows
+      const version = await getResourceVersion(tenant.tenant_id, CATALOG);
+      const cacheHeaders = { 'ETag': versionETag(tenant.tenant_id, CATALOG, version), 'Cache-Control': 'private, no-cache' };
+      
+      if (etagMatches(request, cacheHeaders.ETag)) {
+        return new NextResponse(null, { status: 304, headers: cacheHeaders });
+      }
+      
+      const result = await query(prepared('services_list', `
         SELECT * FROM catalog_items
         WHERE tenant_id = $1
         ORDER BY name ASC
-      `, [tenant.tenant_id]);
+      `), [tenant.tenant_id]);
       
-      return NextResponse.json({ services: result.rows });
+      return jsonResponse({ services: result.rows }, { headers: cacheHeaders });
     }
     
-    // GET /orders - List all orders
+    // GET /orders - List orders (keyset-paginated when ?limit= or ?after= is given)
     if (path === '/orders') {
-      const result = await query(`
-        SELECT o.*, c.name as client_name, c.vehicle_plate
-        FROM orders o
-        LEFT JOIN clients c ON o.client_id = c.id
-        WHERE o.tenant_id = $1
-        ORDER BY o.created_at DESC
-      `, [tenant.tenant_id]);
+      const page = getPageParams(url);
+      const projection = getProjection(url, ORDER_LIST_FIELDS, ORDER_LIST_DEFAULT);
+      
+      if (page?.error || projection.error) {
+        return NextResponse.json({ error: page?.error || projection.error }, { status: 400 });
+      }
+      
+      const result = await listOrders(tenant.tenant_id, projection.select, page);
+      
+      if (page) {
+        const { rows, nextCursor } = buildPage(result.rows, page.limit);
+        return jsonResponse({ nextCursor, orders: rows });
+      }
+      
+      return jsonResponse({ orders: result.rows });
+    }
+    
+    // GET /orders/export - Stream orders with their items and client as CSV or
+    // NDJSON (?format=, default csv). ?paid_from= / ?paid_to= (YYYY-MM-DD,
+    // inclusive) export the paid orders of that period instead of every order.
+    if (path === '/orders/export') {
+      const params = {
+        format: url.searchParams.get('format') || 'csv',
+        paidFrom: url.searchParams.get('paid_from'),
+        paidTo: url.searchParams.get('paid_to')
+      };
+      const invalid = validateExportParams(params);
+      
+      if (invalid) {
+        return NextResponse.json({ error: invalid }, { status: 400 });
+      }
+      
+      let body;
+      try {
+        body = await openOrderExport(tenant.tenant_id, params);
+      } catch (error) {
+        if (error instanceof RateLimitError) {
+          return tooManyRequests(error.message, error.retryAfter);
+        }
+        throw error;
+      }
       
-      return NextResponse.json({ orders: result.rows });
+      const period = (params.paidFrom ? `-from-${params.paidFrom}` : '') + (params.paidTo ? `-to-${params.paidTo}` : '');
+      
+      return new NextResponse(body, {
+        headers: {
+          'Content-Type': params.format === 'csv' ? 'text/csv; charset=utf-8' : 'application/x-ndjson; charset=utf-8',
+          'Content-Disposition': `attachment; filename="orders${period}.${params.format}"`,
+          'Cache-Control': 'no-store'
+        }
+      });
     }
     
     // GET /orders/:id - Get single order with items
     if (path.startsWith('/orders/') && !path.includes('/pdf')) {
       const orderId = path.split('/')[2];
       
-      const orderResult = await query(`
+      const orderResult = await query(prepared('order_by_id', `
         SELECT o.*, c.name as client_name, c.phone as client_phone,
                c.vehicle_plate, c.vehicle_model
         FROM orders o
         LEFT JOIN clients c ON o.client_id = c.id
         WHERE o.id = $1 AND o.tenant_id = $2
-      `, [orderId, tenant.tenant_id]);
+      `), [orderId, tenant.tenant_id]);
       
       if (orderResult.rows.length === 0) {
         return NextResponse.json({ error: 'Order not found' }, { status: 404 });
       }
       
-      const itemsResult = await query(`
+      const itemsResult = await query(prepared('order_items', `
         SELECT * FROM order_items WHERE order_id = $1
-      `, [orderId]);
+      `), [orderId]);
       
-      return NextResponse.json({
+      return jsonResponse({
         order: {
           ...orderResult.rows[0],
           items: itemsResult.rows
@@ -401,18 +679,61 @@ export async function GET(request) {
     if (path.match(/\/orders\/[^\/]+\/pdf$/)) {
       const orderId = path.split('/')[2];
       
-      const pdf = await generateOrderPDF(orderId, tenant.tenant_id);
+      const receipt = await loadOrderForPDF(orderId, tenant.tenant_id);
+      
+      if (!receipt) {
+        return NextResponse.json({ error: 'Order not found' }, { status: 404 });
+      }
+      
+      const cacheKey = pdfCacheKey(receipt.order, receipt.items);
+      const etag = `"${cacheKey}"`;
+      const cacheHeaders = { 'ETag': etag, 'Cache-Control': 'private, no-cache' };
+      
+      if (etagMatches(request, etag)) {
+        return new NextResponse(null, { status: 304, headers: cacheHeaders });
+      }
+      
+      // X-PDF-Cache: bypass forces a fresh render (the harness uses it to
+      // benchmark the browser pool rather than the cache)
+      const bypass = request.headers.get('x-pdf-cache') === 'bypass';
+      const renderStart = Date.now();
+      let pdf;
+      let cacheStatus;
+      
+      try {
+        ({ pdf, status: cacheStatus } = await getOrRenderPdf(
+          cacheKey,
+          () => generateOrderPDF(receipt.order, receipt.items),
+          { orderId: receipt.order.id, clientId: receipt.order.client_id },
+          { bypass }
+        ));
+      } catch (error) {
+        if (error instanceof PdfQueueFullError) {
+          return NextResponse.json({ error: error.message }, { status: 503, headers: { 'Retry-After': '1' } });
+        }
+        throw error;
+      }
       
       return new NextResponse(pdf, {
         headers: {
+          ...cacheHeaders,
           'Content-Type': 'application/pdf',
-          'Content-Disposition': `attachment; filename="OS-${orderId}.pdf"`
+          'Content-Disposition': `attachment; filename="OS-${orderId}.pdf"`,
+          'X-Cache': cacheStatus,
+          'X-Render-Time': String(Date.now() - renderStart)
         }
       });
     }
     
-    // GET /team - List team members
+    // GET /team - List team members (304 while the team version is unchanged)
     if (path === '/team') {
+      const version = await getResourceVersion(tenant.tenant_id, TEAM);
+      const cacheHeaders = { 'ETag': versionETag(tenant.tenant_id, TEAM, version), 'Cache-Control': 'private, no-cache' };
+      
+      if (etagMatches(request, cacheHeaders.ETag)) {
+        return new NextResponse(null, { status: 304, headers: cacheHeaders });
+      }
+      
       const result = await query(`
         SELECT u.id, u.email, u.username, u.full_name, ut.role, ut.created_at
         FROM user_tenants ut
@@ -421,7 +742,7 @@ export async function GET(request) {
         ORDER BY ut.created_at DESC
       `, [tenant.tenant_id]);
       
-      return NextResponse.json({ team: result.rows });
+      return jsonResponse({ team: result.rows }, { headers: cacheHeaders });
     }
     
     return NextResponse.json({ error: 'Route not found' }, { status: 404 });
@@ -432,7 +753,7 @@ export async function GET(request) {
   }
 }
 
-export async function POST(request) {
+async function handlePost(request) {
   const url = new URL(request.url);
   const path = url.pathname.replace('/api', '');
   
@@ -448,22 +769,54 @@ export async function POST(request) {
         return NextResponse.json({ error: 'Username and password required' }, { status: 400 });
       }
       
+      // Refuse before spending a query or a bcrypt round on the attempt
+      const ipWait = loginIpLimiter.take(getClientIp(request));
+      if (ipWait > 0) {
+        return tooManyRequests('Too many login attempts, try again later', ipWait);
+      }
+      
       const result = await query(
-        'SELECT * FROM users WHERE username = $1 OR email = $1',
+        prepared('login_user', 'SELECT * FROM users WHERE username = $1 OR email = $1'),
         [username]
       );
       
       if (result.rows.length === 0) {
+        const loginWait = loginUserLimiter.take(`login:${String(username).toLowerCase()}`);
+        if (loginWait > 0) {
+          return tooManyRequests('Too many failed login attempts for this user, try again later', loginWait);
+        }
         return NextResponse.json({ error: 'Invalid credentials' }, { status: 401 });
       }
       
       const user = result.rows[0];
-      const validPassword = await comparePassword(password, user.password_hash);
+      
+      // Reserve the guess before hashing: concurrent attempts each need their
+      // own token, so no more than the bucket holds get as far as bcrypt. An
+      // empty bucket refuses the owner too (see loginUserLimiter above).
+      const userKey = `user:${user.id}`;
+      const userWait = loginUserLimiter.take(userKey);
+      if (userWait > 0) {
+        return tooManyRequests('Too many failed login attempts for this user, try again later', userWait);
+      }
+      
+      let validPassword;
+      try {
+        validPassword = await comparePassword(password, user.password_hash);
+      } catch (error) {
+        // The password was never checked, so the attempt doesn't count
+        loginUserLimiter.giveBack(userKey);
+        if (error instanceof RateLimitError) {
+          return tooManyRequests(error.message, error.retryAfter);
+        }
+        throw error;
+      }
       
       if (!validPassword) {
         return NextResponse.json({ error: 'Invalid credentials' }, { status: 401 });
       }
       
+      loginUserLimiter.giveBack(userKey);
+      
       const userWithTenants = await getUserWithTenants(user.id);
       
       const accessToken = generateAccessToken({ userId: user.id });
@@ -496,7 +849,7 @@ export async function POST(request) {
     }
     
     // ============ PROTECTED ROUTES ============
-    const auth = await authenticate(request);
+    const auth = await timePhase('auth', () => authenticate(request));
     if (auth.error) {
       return NextResponse.json({ error: auth.error }, { status: auth.status });
     }
@@ -543,61 +896,63 @@ export async function POST(request) {
         return NextResponse.json({ error: 'Name and price are required' }, { status: 400 });
       }
       
-      const result = await query(`
-        INSERT INTO catalog_items (tenant_id, name, description, price, duration_minutes)
-        VALUES ($1, $2, $3, $4, $5)
-        RETURNING *
-      `, [tenant.tenant_id, name, description, price, duration_minutes]);
+      const service = await withTransaction(async (tx) => {
+        const result = await tx.query(`
+          INSERT INTO catalog_items (tenant_id, name, description, price, duration_minutes)
+          VALUES ($1, $2, $3, $4, $5)
+          RETURNING *
+        `, [tenant.tenant_id, name, description, price, duration_minutes]);
+        
+        await bumpResourceVersion(tenant.tenant_id, CATALOG, tx);
+        return result.rows[0];
+      });
       
-      return NextResponse.json({ service: result.rows[0] }, { status: 201 });
+      return NextResponse.json({ service }, { status: 201 });
     }
     
-    // POST /orders - Create order
-    if (path === '/orders') {
+    // POST /orders/batch - Create many orders in one transaction
+    if (path === '/orders/batch') {
       if (!hasPermission(tenant.role, 'create')) {
         return NextResponse.json({ error: 'Permission denied' }, { status: 403 });
       }
       
-      const { client_id, items, notes, status, payment_method } = body;
+      const { orders } = body;
       
-      if (!items || items.length === 0) {
-        return NextResponse.json({ error: 'Order must have at least one item' }, { status: 400 });
+      if (!Array.isArray(orders) || orders.length === 0) {
+        return NextResponse.json({ error: 'Batch must contain at least one order' }, { status: 400 });
       }
       
-      // Calculate total
-      const total = items.reduce((sum, item) => sum + (parseFloat(item.price) * item.quantity), 0);
+      if (orders.length > MAX_BATCH_ORDERS) {
+        return NextResponse.json({ error: `Batch exceeds ${MAX_BATCH_ORDERS} orders` }, { status: 413 });
+      }
       
-      // Generate order number
-      const orderNumber = 'OS-' + Date.now();
+      for (const [index, order] of orders.entries()) {
+        const error = validateOrder(order);
+        if (error) {
+          return NextResponse.json({ error: `Order ${index}: ${error}` }, { status: 400 });
+        }
+      }
       
-      // Create order
-      const orderResult = await query(`
-        INSERT INTO orders (tenant_id, client_id, order_number, status, total_amount, payment_method, notes, created_by, paid_at)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-        RETURNING *
-      `, [
-        tenant.tenant_id,
-        client_id || null,
-        orderNumber,
-        status || 'pending',
-        total,
-        payment_method || null,
-        notes || null,
-        user.id,
-        (status === 'paid' ? new Date() : null)
-      ]);
+      const created = await withTransaction((tx) => createOrders(tx, tenant.tenant_id, user.id, orders));
       
-      const orderId = orderResult.rows[0].id;
+      return jsonResponse({ orders: created }, { status: 201 });
+    }
+    
+    // POST /orders - Create order
+    if (path === '/orders') {
+      if (!hasPermission(tenant.role, 'create')) {
+        return NextResponse.json({ error: 'Permission denied' }, { status: 403 });
+      }
       
-      // Create order items
-      for (const item of items) {
-        await query(`
-          INSERT INTO order_items (order_id, catalog_item_id, service_name, price, quantity)
-          VALUES ($1, $2, $3, $4, $5)
-        `, [orderId, item.catalog_item_id || null, item.service_name, item.price, item.quantity || 1]);
+      const error = validateOrder(body);
+      if (error) {
+        return NextResponse.json({ error }, { status: 400 });
       }
       
-      return NextResponse.json({ order: orderResult.rows[0] }, { status: 201 });
+      // Same path as the batch endpoint: numbered, inserted and rolled up atomically
+      const [order] = await withTransaction((tx) => createOrders(tx, tenant.tenant_id, user.id, [body]));
+      
+      return NextResponse.json({ order }, { status: 201 });
     }
     
     // POST /team/invite - Invite team member
@@ -627,18 +982,18 @@ export async function POST(request) {
       const token = uuidv4();
       const expiresAt = new Date(Date.now() + 7 * 24 * 60 * 60 * 1000); // 7 days
       
-      await query(`
-        INSERT INTO invite_tokens (token, email, tenant_id, role, invited_by, expires_at)
-        VALUES ($1, $2, $3, $4, $5, $6)
-      `, [token, email, tenant.tenant_id, role, user.id, expiresAt]);
+      const inviteUrl = `${process.env.NEXT_PUBLIC_APP_URL}/accept-invite?token=${token}`;
       
-      // Send email
-      try {
-        const transporter = await getEmailTransporter();
-        const inviteUrl = `${process.env.NEXT_PUBLIC_APP_URL}/accept-invite?token=${token}`;
+      // The email is queued with the invite and delivered by the outbox
+      // worker, so the response never waits on SMTP
+      const emailId = await withTransaction(async (tx) => {
+        await tx.query(`
+          INSERT INTO invite_tokens (token, email, tenant_id, role, invited_by, expires_at)
+          VALUES ($1, $2, $3, $4, $5, $6)
+        `, [token, email, tenant.tenant_id, role, user.id, expiresAt]);
         
-        const info = await transporter.sendMail({
-          from: process.env.SMTP_FROM || 'noreply@espacobraite.com',
+        return enqueueEmail({
+          tenantId: tenant.tenant_id,
           to: email,
           subject: `Convite para ${tenant.tenant_name}`,
           html: `
@@ -648,21 +1003,11 @@ export async function POST(request) {
             <a href="${inviteUrl}">${inviteUrl}</a>
             <p>Este convite expira em 7 dias.</p>
           `
-        });
-        
-        console.log('📧 Email sent:', info.messageId);
-        if (process.env.SMTP_HOST === '') {
-          console.log('📧 Preview URL:', nodemailer.getTestMessageUrl(info));
-        }
-      } catch (emailError) {
-        console.error('Email error:', emailError);
-        return NextResponse.json({
-          message: 'Invite created but email failed to send',
-          token
-        }, { status: 201 });
-      }
+        }, tx);
+      });
+      kickOutbox();
       
-      return NextResponse.json({ message: 'Invite sent successfully' }, { status: 201 });
+      return NextResponse.json({ message: 'Invite created, email queued', emailId }, { status: 201 });
     }
     
     return NextResponse.json({ error: 'Route not found' }, { status: 404 });
@@ -673,12 +1018,12 @@ export async function POST(request) {
   }
 }
 
-export async function PUT(request) {
+async function handlePut(request) {
   const url = new URL(request.url);
   const path = url.pathname.replace('/api', '');
   
   try {
-    const auth = await authenticate(request);
+    const auth = await timePhase('auth', () => authenticate(request));
     if (auth.error) {
       return NextResponse.json({ error: auth.error }, { status: auth.status });
     }
@@ -703,22 +1048,44 @@ export async function PUT(request) {
       
       const paidAt = status === 'paid' ? new Date() : null;
       
-      const result = await query(`
-        UPDATE orders
-        SET status = COALESCE($1, status),
-            payment_method = COALESCE($2, payment_method),
-            notes = COALESCE($3, notes),
-            paid_at = COALESCE($4, paid_at),
-            updated_at = NOW()
-        WHERE id = $5 AND tenant_id = $6
-        RETURNING *
-      `, [status, payment_method, notes, paidAt, orderId, tenant.tenant_id]);
+      // Lock the row, update it and adjust the revenue rollup atomically
+      const order = await withTransaction(async (tx) => {
+        const result = await tx.query(`
+          WITH previous AS (
+            SELECT id, status, paid_at
+            FROM orders
+            WHERE id = $5 AND tenant_id = $6
+            FOR UPDATE
+          )
+          UPDATE orders o
+          SET status = COALESCE($1, o.status),
+              payment_method = COALESCE($2, o.payment_method),
+              notes = COALESCE($3, o.notes),
+              paid_at = COALESCE($4, o.paid_at),
+              updated_at = NOW()
+          FROM previous
+          WHERE o.id = previous.id
+          RETURNING o.*, previous.status as previous_status, previous.paid_at as previous_paid_at
+        `, [status, payment_method, notes, paidAt, orderId, tenant.tenant_id]);
+        
+        if (result.rows.length === 0) {
+          return null;
+        }
+        
+        const { previous_status, previous_paid_at, ...updated } = result.rows[0];
+        const before = { status: previous_status, paid_at: previous_paid_at, total_amount: updated.total_amount };
+        await recordRevenueChange(tenant.tenant_id, before, updated, tx);
+        
+        return updated;
+      });
       
-      if (result.rows.length === 0) {
+      if (!order) {
         return NextResponse.json({ error: 'Order not found' }, { status: 404 });
       }
       
-      return NextResponse.json({ order: result.rows[0] });
+      invalidateOrderPdfs(order.id);
+      
+      return NextResponse.json({ order });
     }
     
     // PUT /clients/:id - Update client
@@ -747,6 +1114,8 @@ export async function PUT(request) {
         return NextResponse.json({ error: 'Client not found' }, { status: 404 });
       }
       
+      invalidateClientPdfs(clientId);
+      
       return NextResponse.json({ client: result.rows[0] });
     }
     
@@ -758,12 +1127,12 @@ export async function PUT(request) {
   }
 }
 
-export async function DELETE(request) {
+async function handleDelete(request) {
   const url = new URL(request.url);
   const path = url.pathname.replace('/api', '');
   
   try {
-    const auth = await authenticate(request);
+    const auth = await timePhase('auth', () => authenticate(request));
     if (auth.error) {
       return NextResponse.json({ error: auth.error }, { status: auth.status });
     }
@@ -780,6 +1149,35 @@ export async function DELETE(request) {
       return NextResponse.json({ error: 'Permission denied' }, { status: 403 });
     }
     
+    // DELETE /orders/:id - Items go with it (ON DELETE CASCADE)
+    if (path.startsWith('/orders/')) {
+      const orderId = path.split('/')[2];
+      
+      // Delete it and take it out of the revenue rollup atomically
+      const order = await withTransaction(async (tx) => {
+        const result = await tx.query(`
+          DELETE FROM orders
+          WHERE id = $1 AND tenant_id = $2
+          RETURNING id, status, paid_at, total_amount
+        `, [orderId, tenant.tenant_id]);
+        
+        if (result.rows.length === 0) {
+          return null;
+        }
+        
+        await recordRevenueChange(tenant.tenant_id, result.rows[0], null, tx);
+        return result.rows[0];
+      });
+      
+      if (!order) {
+        return NextResponse.json({ error: 'Order not found' }, { status: 404 });
+      }
+      
+      invalidateOrderPdfs(order.id);
+      
+      return NextResponse.json({ message: 'Order deleted successfully' });
+    }
+    
     // DELETE /clients/:id
     if (path.startsWith('/clients/')) {
       const clientId = path.split('/')[2];
@@ -794,6 +1192,8 @@ export async function DELETE(request) {
         return NextResponse.json({ error: 'Client not found' }, { status: 404 });
       }
       
+      invalidateClientPdfs(clientId);
+      
       return NextResponse.json({ message: 'Client deleted successfully' });
     }
     
@@ -801,13 +1201,20 @@ export async function DELETE(request) {
     if (path.startsWith('/services/')) {
       const serviceId = path.split('/')[2];
       
-      const result = await query(`
-        DELETE FROM catalog_items
-        WHERE id = $1 AND tenant_id = $2
-        RETURNING id
-      `, [serviceId, tenant.tenant_id]);
+      const deleted = await withTransaction(async (tx) => {
+        const result = await tx.query(`
+          DELETE FROM catalog_items
+          WHERE id = $1 AND tenant_id = $2
+          RETURNING id
+        `, [serviceId, tenant.tenant_id]);
+        
+        if (result.rows.length > 0) {
+          await bumpResourceVersion(tenant.tenant_id, CATALOG, tx);
+        }
+        return result.rows.length > 0;
+      });
       
-      if (result.rows.length === 0) {
+      if (!deleted) {
         return NextResponse.json({ error: 'Service not found' }, { status: 404 });
       }
       
@@ -821,3 +1228,41 @@ export async function DELETE(request) {
     return NextResponse.json({ error: error.message }, { status: 500 });
   }
 }
+
+// ============ REQUEST INSTRUMENTATION ============
+
+// Report how many queries each request issued and where its time went
+// (Server-Timing: auth, db, pdf queue/render, serialize and the handler
+// total), so clients can see the cost of a route without the server logs.
+// db sums every query, so with concurrent queries it can exceed the total.
+async function withInstrumentation(handler, request) {
+  // First request starts the email outbox poll (outside any request's counter)
+  startOutboxWorker();
+  const start = performance.now();
+  const { result: { result: response, stats }, phases } = await trackTiming(
+    () => trackQueries(() => handler(request))
+  );
+  const timings = [...phases].map(([name, duration]) => serverTimingEntry(name, duration));
+  timings.push(serverTimingEntry('db', stats.duration, `${stats.count} queries`));
+  timings.push(serverTimingEntry('total', performance.now() - start));
+  
+  response.headers.set('X-Query-Count', String(stats.count));
+  response.headers.set('Server-Timing', timings.join(', '));
+  return response;
+}
+
+export async function GET(request) {
+  return compressResponse(request, await withInstrumentation(handleGet, request));
+}
+
+export async function POST(request) {
+  return compressResponse(request, await withInstrumentation(handlePost, request));
+}
+
+export async function PUT(request) {
+  return compressResponse(request, await withInstrumentation(handlePut, request));
+}
+
+export async function DELETE(request) {
+  return compressResponse(request, await withInstrumentation(handleDelete, request));
+}
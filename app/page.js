@@ -30,6 +30,10 @@ import {
   X as CloseIcon
 } from 'lucide-react';
 
+// Columns the list views render; the API returns only these (?fields=)
+const ORDER_LIST_FIELDS = 'order_number,status,client_name,vehicle_plate,total_amount,created_at';
+const CLIENT_LIST_FIELDS = 'name,phone,email,vehicle_plate,vehicle_model';
+
 export default function App() {
   const [isAuthenticated, setIsAuthenticated] = useState(false);
   const [loading, setLoading] = useState(true);
@@ -177,7 +181,7 @@ export default function App() {
   
   const loadDashboard = async (token, tenantId) => {
     try {
-      const response = await fetch(`/api/dashboard?tenant_id=${tenantId}`, {
+      const response = await fetch(`/api/dashboard?tenant_id=${tenantId}&fields=${ORDER_LIST_FIELDS}`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       
@@ -192,7 +196,7 @@ export default function App() {
   
   const loadOrders = async () => {
     try {
-      const response = await apiRequest('/api/orders');
+      const response = await apiRequest(`/api/orders?fields=${ORDER_LIST_FIELDS}`);
       if (response.ok) {
         const data = await response.json();
         setOrders(data.orders);
@@ -204,7 +208,7 @@ export default function App() {
   
   const loadClients = async () => {
     try {
-      const response = await apiRequest('/api/clients');
+      const response = await apiRequest(`/api/clients?fields=${CLIENT_LIST_FIELDS}`);
       if (response.ok) {
         const data = await response.json();
         setClients(data.clients);
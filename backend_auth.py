@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Access-token lifecycle for the Espaço Braite API harness
+Shares tokens per (user, tenant), refreshes them before they expire and makes
+sure only one refresh/login is in flight per key
+"""
+
+import asyncio
+import base64
+import json
+import threading
+import time
+
+# Refresh this many seconds before the access token's exp claim (tokens live 15m)
+DEFAULT_REFRESH_MARGIN = 60
+
+def decode_jwt_payload(token):
+    """Claims of a JWT without verifying the signature (the server does that)"""
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError, AttributeError):
+        return {}
+
+def token_expiry(token):
+    """exp claim as a unix timestamp, or 0 if the token can't be decoded"""
+    return decode_jwt_payload(token).get("exp", 0)
+
+class TokenEntry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.access_token = None
+        self.refresh_token = None
+        self.username = None
+        self.password = None
+        self.user = None
+
+class TokenManager:
+    """
+    Thread-safe token cache keyed by (username, tenant_id).
+
+    get() returns a token that is valid for at least refresh_margin seconds.
+    When it is not, the first caller refreshes via /auth/refresh (falling back
+    to /auth/login) while concurrent callers for the same key wait on the
+    entry lock and then reuse the result: one refresh per key, not one per
+    virtual user.
+    """
+
+    def __init__(self, request, refresh_margin=DEFAULT_REFRESH_MARGIN, clock=time.time):
+        self.request = request
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.stats = {"logins": 0, "refreshes": 0, "hits": 0}
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _entry(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = TokenEntry()
+            return entry
+
+    def _fresh(self, token):
+        return bool(token) and token_expiry(token) - self.refresh_margin > self.clock()
+
+    def register(self, key, username, password, access_token=None, refresh_token=None, user=None):
+        """Remember credentials (and tokens already obtained elsewhere) for a key"""
+        entry = self._entry(key)
+        with entry.lock:
+            entry.username, entry.password = username, password
+            if access_token:
+                entry.access_token, entry.refresh_token = access_token, refresh_token
+                entry.user = user
+
+    def get(self, key):
+        """Access token for key, refreshing or logging in first if it is about to expire"""
+        entry = self._entry(key)
+        token = entry.access_token
+        if self._fresh(token):
+            self._count("hits")
+            return token
+        with entry.lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._fresh(entry.access_token):
+                self._count("hits")
+                return entry.access_token
+            if not self._refresh(entry):
+                self._login(entry)
+            return entry.access_token
+
+    async def get_async(self, key):
+        """Asyncio variant: the fast path never leaves the event loop"""
+        token = self.entries.get(key) and self.entries[key].access_token
+        if self._fresh(token):
+            self._count("hits")
+            return token
+        return await asyncio.to_thread(self.get, key)
+
+    def invalidate(self, key, rejected_token=None):
+        """
+        Drop the access token after a 401 so the next get() renews it. Passing
+        the rejected token makes a burst of 401s renew once: only the first
+        caller clears it, later ones see a different (already renewed) token.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            with entry.lock:
+                if rejected_token is None or entry.access_token == rejected_token:
+                    entry.access_token = None
+
+    def _refresh(self, entry):
+        if not entry.refresh_token or token_expiry(entry.refresh_token) <= self.clock():
+            return False
+        response = self.request("POST", "/auth/refresh", data={"refreshToken": entry.refresh_token})
+        if response is None or response.status_code != 200:
+            return False
+        entry.access_token = response.json()["accessToken"]
+        self._count("refreshes")
+        return True
+
+    def _login(self, entry):
+        if not entry.username:
+            raise RuntimeError("Token expired and no credentials are registered to log in again")
+        response = self.request("POST", "/auth/login",
+                                data={"username": entry.username, "password": entry.password})
+        if response is None or response.status_code != 200:
+            status = response.status_code if response is not None else "No response"
+            raise RuntimeError(f"Login failed for {entry.username}: {status}")
+        result = response.json()
+        entry.access_token = result["accessToken"]
+        entry.refresh_token = result.get("refreshToken")
+        entry.user = result.get("user")
+        self._count("logins")
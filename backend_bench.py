@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Server-side benchmarks for the Espaço Braite API
+Each benchmark targets one backend optimization and prints what it saves
+"""
+
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # optional: without it br responses can't be measured
+    brotli = None
+
+import backend_metrics
+import backend_test as bt
+
+# Login storm: concurrent login workers, and how much the probe endpoint's p99
+# may grow over its quiet baseline (ratio, plus an absolute floor for fast hosts)
+STORM_WORKERS = int(os.environ.get("BRAITE_STORM_WORKERS", "16"))
+STORM_MAX_P99_RATIO = float(os.environ.get("BRAITE_STORM_MAX_P99_RATIO", "3"))
+STORM_MIN_DELTA_MS = float(os.environ.get("BRAITE_STORM_MIN_DELTA_MS", "20"))
+
+def print_header(title):
+    print("\n" + "=" * 80)
+    print(f"⏱️  {title}")
+    print("=" * 80)
+
+def create_bench_fixtures(name, plate):
+    """A client and service to attach benchmark orders to, or None if either can't be created"""
+    headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+    client = bt.make_request("POST", "/clients", headers=headers, params=params,
+                             data={"name": name, "phone": "11900000000", "vehicle_plate": plate})
+    service = bt.make_request("POST", "/services", headers=headers, params=params,
+                              data={"name": f"{name} Service", "price": 50.0, "duration_minutes": 30})
+    fixtures = {
+        "client_id": client.json()["client"]["id"] if client is not None and client.status_code == 201 else None,
+        "service_id": service.json()["service"]["id"] if service is not None and service.status_code == 201 else None,
+        "order_ids": [],
+    }
+    if fixtures["client_id"] and fixtures["service_id"]:
+        return fixtures
+    print("❌ Could not create benchmark client/service")
+    delete_bench_fixtures(fixtures)
+    return None
+
+def delete_bench_fixtures(fixtures):
+    """Remove the orders, client and service a benchmark created from the shared tenant"""
+    failed = bt.delete_rows("orders", fixtures["order_ids"])
+    failed += bt.delete_rows("clients", [fixtures["client_id"]] if fixtures["client_id"] else [])
+    failed += bt.delete_rows("services", [fixtures["service_id"]] if fixtures["service_id"] else [])
+    if failed:
+        print(f"⚠️  {failed} benchmark rows could not be deleted")
+
+def query_count(response):
+    """Queries the server ran for a response (X-Query-Count), or None if not reported"""
+    value = response.headers.get("X-Query-Count") if response is not None else None
+    return int(value) if value is not None else None
+
+# ============ BENCHMARKS ============
+
+def bench_auth_cache(requests=50):
+    """
+    GET /orders query count and latency with the authenticate() user cache.
+    The first request after login misses the cache (user lookup + list = 2
+    queries); warm requests should need only the list query.
+    """
+    print_header("AUTH CACHE: GET /orders")
+    counts = Counter()
+    cold = warm = None
+    histogram = backend_metrics.LatencyHistogram()
+    for index in range(requests):
+        start = time.perf_counter()
+        response = bt.make_request("GET", "/orders", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+        elapsed = time.perf_counter() - start
+        if response is None or response.status_code != 200:
+            print(f"❌ Request {index} failed: {response.status_code if response is not None else 'No response'}")
+            return False
+        count = query_count(response)
+        if count is None:
+            print("⚠️  Server does not report X-Query-Count; cannot measure query savings")
+            return False
+        counts[count] += 1
+        if index == 0:
+            cold = (count, elapsed)
+        else:
+            histogram.record(elapsed)
+            warm = count
+
+    summary = histogram.summary()
+    print(f"Cold request: {cold[0]} queries, {cold[1] * 1000:.1f}ms")
+    print(f"Warm requests: {dict(sorted(counts.items()))} (queries: requests), "
+          f"p50 {summary['p50_ms']:.1f}ms, p95 {summary['p95_ms']:.1f}ms")
+    if warm is not None and warm < cold[0]:
+        print(f"✅ Cache saves {cold[0] - warm} query per request on GET /orders")
+    elif cold[0] == 0:
+        print("⚠️  Server ran no queries (the stub has no database); nothing for the cache to save")
+    else:
+        print("⚠️  No query saving observed (is AUTH_CACHE_TTL_MS=0 on the server?)")
+    return True
+
+def bench_batch_orders(requests=50):
+    """
+    Orders/s creating `requests` orders one POST /orders at a time (the
+    test_create_order path) versus POST /orders/batch, at a few batch sizes.
+    """
+    print_header(f"BATCH ORDERS: {requests} orders")
+    headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+    fixtures = create_bench_fixtures("Bench Batch", "BCH-0001")
+    if fixtures is None:
+        return False
+    payload = bt.build_order_payload(fixtures["client_id"], fixtures["service_id"])
+
+    try:
+        start = time.perf_counter()
+        for index in range(requests):
+            response = bt.make_request("POST", "/orders", data=payload, headers=headers, params=params)
+            if response is None or response.status_code != 201:
+                print(f"❌ Single create {index} failed: {response.status_code if response is not None else 'No response'}")
+                return False
+            fixtures["order_ids"].append(response.json()["order"]["id"])
+        single_s = time.perf_counter() - start
+        single_rate = requests / single_s
+        print(f"{'Mode':<20}{'Requests':>10}{'Seconds':>10}{'Orders/s':>10}{'Speedup':>9}")
+        print(f"{'one-at-a-time':<20}{requests:>10}{single_s:>10.2f}{single_rate:>10.0f}{'1.0x':>9}")
+
+        for batch_size in sorted({10, 100, requests}):
+            start = time.perf_counter()
+            try:
+                created = bt.create_orders_batch([payload] * requests, batch_size=batch_size,
+                                                 headers=headers, params=params)
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                return False
+            elapsed = time.perf_counter() - start
+            fixtures["order_ids"] += [order["id"] for order in created]
+            calls = -(-requests // batch_size)
+            print(f"{f'batch of {batch_size}':<20}{calls:>10}{elapsed:>10.2f}{requests / elapsed:>10.0f}"
+                  f"{f'{single_s / elapsed:.1f}x':>9}")
+        return True
+    finally:
+        delete_bench_fixtures(fixtures)
+
+# List views and the ?fields= each renders (see app/page.js): endpoint, JSON key, fields
+LIST_VIEWS = [
+    ("/orders", "orders", "order_number,status,client_name,vehicle_plate,total_amount,created_at"),
+    ("/dashboard", "recentOrders", "order_number,status,client_name,total_amount"),
+    ("/clients", "clients", "name,phone,email,vehicle_plate,vehicle_model"),
+]
+
+def decode_body(raw, encoding):
+    if encoding == "br":
+        raw = brotli.decompress(raw)
+    elif encoding == "gzip":
+        raw = gzip.decompress(raw)
+    return json.loads(raw)
+
+def bench_compression(requests=50):
+    """
+    Bytes on the wire and client decode time (decompress + JSON parse) for
+    each list view, full versus ?fields= projected, per Accept-Encoding.
+    Needs some rows to be meaningful, so `requests` orders are created first.
+    """
+    print_header("COMPRESSION + PROJECTION: list views")
+    headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+    fixtures = create_bench_fixtures("Bench Compression", "BCH-0002")
+    if fixtures is None:
+        return False
+    payload = bt.build_order_payload(fixtures["client_id"], fixtures["service_id"])
+    try:
+        try:
+            created = bt.create_orders_batch([payload] * requests, headers=headers, params=params)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return False
+        fixtures["order_ids"] += [order["id"] for order in created]
+        return measure_list_views(requests, headers, params)
+    finally:
+        delete_bench_fixtures(fixtures)
+
+def measure_list_views(requests, headers, params):
+    """The compression table: each LIST_VIEWS endpoint, full and projected, per encoding"""
+    encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+    if not brotli:
+        print("⚠️  brotli module not installed; skipping br")
+    print(f"{'Endpoint':<14}{'Shape':<11}{'Encoding':<18}{'Rows':>6}{'Wire bytes':>12}{'vs full':>9}{'Decode ms':>11}")
+    ok = True
+    for endpoint, key, fields in LIST_VIEWS:
+        full_identity = None
+        for shape in ("full", "projected"):
+            shape_params = params | ({"fields": fields} if shape == "projected" else {})
+            for encoding in encodings:
+                wire = []
+                histogram = backend_metrics.LatencyHistogram()
+                for _ in range(max(requests // 10, 3)):
+                    response = bt.make_request("GET", endpoint, params=shape_params, stream=True,
+                                               headers=headers | {"Accept-Encoding": encoding})
+                    if response is None or response.status_code != 200:
+                        print(f"❌ {endpoint} failed: {response.status_code if response is not None else 'No response'}")
+                        return False
+                    raw = response.raw.read(decode_content=False)
+                    served = response.headers.get("Content-Encoding", "identity")
+                    start = time.perf_counter()
+                    body = decode_body(raw, served)
+                    histogram.record(time.perf_counter() - start)
+                    wire.append(len(raw))
+                rows = body[key]
+                wire_bytes = sum(wire) / len(wire)
+                if shape == "full" and encoding == "identity":
+                    full_identity = wire_bytes
+                # Small bodies go out uncompressed (COMPRESSION_MIN_BYTES on the server)
+                label = encoding if served == encoding else f"{encoding}→{served}"
+                if shape == "projected" and rows and set(rows[0]) - set(fields.split(",")) - {"id"}:
+                    print(f"⚠️  {endpoint} ignored fields= (returned {sorted(rows[0])})")
+                    ok = False
+                summary = histogram.summary()
+                print(f"{endpoint:<14}{shape:<11}{label:<18}{len(rows):>6}{wire_bytes:>12.0f}"
+                      f"{wire_bytes / full_identity * 100:>8.0f}%{summary['p50_ms']:>11.2f}")
+    return ok
+
+def probe_latencies(count, headers, params, histogram):
+    """GET /services `count` times into histogram; False if any probe fails"""
+    for _ in range(count):
+        start = time.perf_counter()
+        response = bt.make_request("GET", "/services", headers=headers, params=params)
+        if response is None or response.status_code != 200:
+            print(f"❌ Probe failed: {response.status_code if response is not None else 'No response'}")
+            return False
+        histogram.record(time.perf_counter() - start)
+    return True
+
+def bench_login_storm(requests=50):
+    """
+    GET /services latency while STORM_WORKERS threads hammer POST /auth/login
+    with bad credentials. The login rate limiter should answer most of the
+    storm with 429 + Retry-After before any bcrypt work, and the bounded
+    hashing pool should keep the rest from starving other endpoints, so the
+    probe's p99 must stay within STORM_MAX_P99_RATIO of its quiet baseline.
+    Run it last: it leaves this client's IP rate limited for a while.
+    """
+    print_header(f"LOGIN STORM: {STORM_WORKERS} workers vs GET /services")
+    headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+    # Enough pooled connections that storm workers don't queue behind each other or the probe
+    bt.http_session = bt.create_session(pool_maxsize=STORM_WORKERS + 1, max_retries=0)
+
+    baseline = backend_metrics.LatencyHistogram()
+    if not probe_latencies(requests, headers, params, baseline):
+        return False
+
+    statuses = Counter()
+    missing_retry_after = 0
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def storm(worker):
+        nonlocal missing_retry_after
+        attempt = 0
+        while not stop.is_set():
+            # A few usernames per worker so the per-account buckets fill up too
+            data = {"username": f"storm-{worker}-{attempt % 3}", "password": "wrong-password"}
+            response = bt.make_request("POST", "/auth/login", data=data)
+            with lock:
+                statuses[response.status_code if response is not None else "error"] += 1
+                if response is not None and response.status_code == 429 and not response.headers.get("Retry-After"):
+                    missing_retry_after += 1
+            attempt += 1
+
+    during = backend_metrics.LatencyHistogram()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=STORM_WORKERS) as executor:
+        for worker in range(STORM_WORKERS):
+            executor.submit(storm, worker)
+        try:
+            ok = probe_latencies(requests, headers, params, during)
+        finally:
+            stop.set()
+    elapsed = time.perf_counter() - start
+
+    quiet, loud = baseline.summary(), during.summary()
+    attempts = sum(statuses.values())
+    print(f"Storm: {attempts} logins in {elapsed:.1f}s ({attempts / elapsed:.0f}/s), "
+          f"statuses {dict(sorted(statuses.items(), key=str))}")
+    print(f"{'GET /services':<16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(f"{'quiet':<16}{quiet['p50_ms']:>9.1f}{quiet['p95_ms']:>9.1f}{quiet['p99_ms']:>9.1f}")
+    print(f"{'during storm':<16}{loud['p50_ms']:>9.1f}{loud['p95_ms']:>9.1f}{loud['p99_ms']:>9.1f}")
+
+    if missing_retry_after:
+        print(f"❌ {missing_retry_after} 429 responses without Retry-After")
+        ok = False
+    if not statuses[429]:
+        print("⚠️  No login was rate limited (are LOGIN_IP_BURST/LOGIN_USER_BURST 0 on the server?)")
+    ceiling = max(quiet["p99_ms"] * STORM_MAX_P99_RATIO, quiet["p99_ms"] + STORM_MIN_DELTA_MS)
+    if loud["p99_ms"] > ceiling:
+        print(f"❌ p99 under storm {loud['p99_ms']:.1f}ms exceeds {ceiling:.1f}ms "
+              f"({STORM_MAX_P99_RATIO:g}x quiet p99)")
+        ok = False
+    elif ok:
+        print(f"✅ p99 held at {loud['p99_ms']:.1f}ms (limit {ceiling:.1f}ms) with "
+              f"{statuses[429] / attempts * 100 if attempts else 0:.0f}% of logins refused")
+    return ok
+
+BENCHMARKS = {
+    "auth-cache": bench_auth_cache,
+    "batch-orders": bench_batch_orders,
+    "compression": bench_compression,
+    # Last: leaves this client's IP rate limited on /auth/login
+    "login-storm": bench_login_storm,
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Espaço Braite server-side benchmarks")
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--base-url", help="API host (default: $BRAITE_BASE_URL or the preview host)")
+    parser.add_argument("--local", action="store_true", help="run against the in-process stub server")
+    parser.add_argument("--requests", type=int, default=50, help="requests per benchmark")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        raise SystemExit(f"❌ Unknown benchmark(s): {', '.join(unknown)}")
+    names = args.benchmarks or list(BENCHMARKS)
+    if args.local and "login-storm" in names:
+        # The stub answers every request on one event loop (sharing this process's GIL
+        # with the storm threads), so the probe queues behind the logins whatever the
+        # limiter does; the p99 budget only means something against the real server
+        print("⚠️  login-storm needs a real server; skipping it under --local")
+        names.remove("login-storm")
+    stub = None
+    if args.local:
+        import backend_stub_server
+        stub = backend_stub_server.StubServer()
+        bt.set_base_url(stub.start_in_thread())
+    elif args.base_url:
+        bt.set_base_url(args.base_url)
+    try:
+        if not bt.test_login(bt.context):
+            raise SystemExit("❌ Login failed, cannot benchmark")
+        results = {name: BENCHMARKS[name](args.requests) for name in names}
+    finally:
+        if stub:
+            stub.stop()
+    raise SystemExit(0 if all(results.values()) else 1)
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Traffic cassettes for the Espaço Braite API harness
+Record every request/response pair a run makes (PDF bodies included) into an
+append-only binary file, then replay the run offline from a memory-mapped copy
+of it: deterministic responses, no server, bodies read straight from the page cache
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# File layout (all integers little-endian):
+#   header   FILE_MAGIC
+#   record   RECORD (b"RECD", key length, meta length, body length), key, meta JSON, body
+#   index    INDEX (b"INDX", record count), one INDEX_ENTRY (record offset) per record
+#   trailer  TRAILER (offset of the index, b"CEND")
+# Records are only ever appended. Closing a writer appends an index of every
+# record in the file and a trailer pointing at it; reopening the file to record
+# more appends after that index, and the next close writes a new one. A file
+# whose last write was cut short (no trailer) is recovered by scanning records.
+FILE_MAGIC = b"BRCASS01"
+RECORD = struct.Struct("<4sIIQ")
+INDEX = struct.Struct("<4sI")
+INDEX_ENTRY = struct.Struct("<Q")
+TRAILER = struct.Struct("<Q4s")
+RECORD_MAGIC, INDEX_MAGIC, TRAILER_MAGIC = b"RECD", b"INDX", b"CEND"
+
+# Bytes handed to requests per read() of a replayed body
+READ_CHUNK_SIZE = 64 * 1024
+
+class CassetteError(Exception):
+    pass
+
+class CassetteMiss(requests.exceptions.ConnectionError):
+    """Replay found no recorded response for a request (make_request reports it as failed)"""
+
+def request_key(request, scope=None):
+    """
+    Exact match key of a PreparedRequest: its scope (the test that sent it),
+    method, path with query string, and a digest of the body. The host is left
+    out so a cassette replays under any base URL.
+    """
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    digest = hashlib.sha1(body).hexdigest() if body else ""
+    return f"{scope or ''}\n{request.method} {request.path_url}\n{digest}".encode("utf-8")
+
+def loose_key(key):
+    """Scope, method and path only, for requests whose query or body varies run to run (dates, random emails)"""
+    scope, request_line, _ = key.split(b"\n", 2)
+    return scope + b"\n" + request_line.split(b"?", 1)[0]
+
+def read_index(buffer):
+    """
+    Offsets of every record in a cassette buffer (bytes or mmap) and the end of
+    its last complete write. Uses the trailing index when there is one, else
+    scans record headers from the start.
+    """
+    size = len(buffer)
+    if size < len(FILE_MAGIC) or buffer[:len(FILE_MAGIC)] != FILE_MAGIC:
+        raise CassetteError("Not a cassette file (bad magic)")
+
+    if size >= len(FILE_MAGIC) + INDEX.size + TRAILER.size:
+        index_offset, magic = TRAILER.unpack_from(buffer, size - TRAILER.size)
+        if magic == TRAILER_MAGIC and index_offset + INDEX.size <= size - TRAILER.size:
+            index_magic, count = INDEX.unpack_from(buffer, index_offset)
+            start = index_offset + INDEX.size
+            if index_magic == INDEX_MAGIC and start + count * INDEX_ENTRY.size == size - TRAILER.size:
+                offsets = [offset for (offset,) in INDEX_ENTRY.iter_unpack(buffer[start:size - TRAILER.size])]
+                return offsets, size
+
+    offsets = []
+    pos = end = len(FILE_MAGIC)
+    while pos + RECORD.size <= size:
+        magic, key_len, meta_len, body_len = RECORD.unpack_from(buffer, pos)
+        if magic == RECORD_MAGIC:
+            next_pos = pos + RECORD.size + key_len + meta_len + body_len
+            if next_pos > size:
+                break
+            offsets.append(pos)
+        elif magic == INDEX_MAGIC:
+            # An earlier writer's index and trailer, superseded by later records
+            next_pos = pos + INDEX.size + key_len * INDEX_ENTRY.size + TRAILER.size
+            if next_pos > size:
+                break
+        else:
+            break
+        pos = end = next_pos
+    return offsets, end
+
+class CassetteWriter:
+    """
+    Appends recorded exchanges to a cassette file, thread-safe. Bodies are
+    written as the client saw them (already decompressed), headers unchanged.
+    scope() names what sent the request being recorded (see CassettePlayer).
+    """
+
+    def __init__(self, path, scope=lambda: None):
+        self.path = path
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.offsets = []
+        self.recorded = 0
+        self.body_bytes = 0
+        self.fh = open(path, "r+b" if os.path.exists(path) else "w+b")
+        size = self.fh.seek(0, os.SEEK_END)
+        if size == 0:
+            self.fh.write(FILE_MAGIC)
+            self.offset = len(FILE_MAGIC)
+        else:
+            with mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                self.offsets, self.offset = read_index(buffer)
+            if self.offset < size:
+                # A torn last write (killed mid-record); nothing after it is readable
+                self.fh.truncate(self.offset)
+            self.fh.seek(self.offset)
+
+    def record(self, request, response, body, elapsed):
+        key = request_key(request, self.scope())
+        meta = json.dumps({
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": list(response.headers.items()),
+            "recorded_at": time.time(),
+            "elapsed_ms": elapsed * 1000,
+        }, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            self.fh.write(RECORD.pack(RECORD_MAGIC, len(key), len(meta), len(body)))
+            self.fh.write(key)
+            self.fh.write(meta)
+            self.fh.write(body)
+            self.offsets.append(self.offset)
+            self.offset += RECORD.size + len(key) + len(meta) + len(body)
+            self.recorded += 1
+            self.body_bytes += len(body)
+
+    def close(self):
+        with self.lock:
+            if self.fh.closed:
+                return
+            self.fh.write(INDEX.pack(INDEX_MAGIC, len(self.offsets)))
+            self.fh.write(b"".join(INDEX_ENTRY.pack(offset) for offset in self.offsets))
+            self.fh.write(TRAILER.pack(self.offset, TRAILER_MAGIC))
+            self.fh.close()
+
+class CassetteEntry:
+    __slots__ = ("key", "meta_start", "meta_end", "body_start", "body_end")
+
+    def __init__(self, key, meta_start, meta_end, body_start, body_end):
+        self.key = key
+        self.meta_start, self.meta_end = meta_start, meta_end
+        self.body_start, self.body_end = body_start, body_end
+
+class CassettePlayer:
+    """
+    Serves a cassette's responses from a read-only memory map. Opening it reads
+    only the index and record headers; bodies stay on disk (or in the page
+    cache) until a replayed response is read, so cassettes larger than RAM work.
+
+    Each recorded response is served once. A request takes the oldest unused
+    response with the same scope, method, path, query and body; failing that,
+    the oldest with the same scope, method and path (a body with a fresh
+    timestamp or random email). The scope (the harness passes the running
+    test's name) keeps tests that run concurrently and send identical requests,
+    like two POST /orders, from taking each other's responses.
+    """
+
+    def __init__(self, path, scope=lambda: None):
+        self.path = path
+        self.scope = scope
+        self.fh = open(path, "rb")
+        self.buffer = mmap.mmap(self.fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.buffer)
+        self.lock = threading.Lock()
+        offsets, _ = read_index(self.buffer)
+        self.entries = []
+        self.exact = {}
+        self.loose = {}
+        for offset in offsets:
+            _, key_len, meta_len, body_len = RECORD.unpack_from(self.buffer, offset)
+            key_start = offset + RECORD.size
+            meta_start = key_start + key_len
+            body_start = meta_start + meta_len
+            key = self.buffer[key_start:meta_start]
+            self.exact.setdefault(key, []).append(len(self.entries))
+            self.loose.setdefault(loose_key(key), []).append(len(self.entries))
+            self.entries.append(CassetteEntry(key, meta_start, body_start, body_start, body_start + body_len))
+        self.recorded_at = 0.0
+        self.rewind()
+
+    def rewind(self):
+        """Make every response available again (start of another --iterations pass)"""
+        with self.lock:
+            self.used = bytearray(len(self.entries))
+            self.cursors = {}
+            self.replayed = 0
+            self.misses = 0
+            self.recorded_at = self.meta(self.entries[0])["recorded_at"] if self.entries else time.time()
+
+    def meta(self, entry):
+        return json.loads(self.buffer[entry.meta_start:entry.meta_end])
+
+    def body(self, entry):
+        """The body as a memoryview into the map: no copy is made"""
+        return self.view[entry.body_start:entry.body_end]
+
+    def _next_unused(self, table, key):
+        candidates = table.get(key)
+        if not candidates:
+            return None
+        # Entries are taken roughly in order, so remember where the scan stopped
+        position = self.cursors.get((id(table), key), 0)
+        while position < len(candidates) and self.used[candidates[position]]:
+            position += 1
+        self.cursors[(id(table), key)] = position
+        return candidates[position] if position < len(candidates) else None
+
+    def take(self, request):
+        """The next recorded entry for a PreparedRequest and its metadata; raises CassetteMiss"""
+        key = request_key(request, self.scope())
+        with self.lock:
+            index = self._next_unused(self.exact, key)
+            if index is None:
+                index = self._next_unused(self.loose, loose_key(key))
+            if index is None:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response left for {request.method} {request.path_url}",
+                                   request=request)
+            self.used[index] = 1
+            self.replayed += 1
+            entry = self.entries[index]
+            meta = self.meta(entry)
+            self.recorded_at = max(self.recorded_at, meta["recorded_at"])
+        return entry, meta
+
+    def clock(self):
+        """
+        Wall time of the recording as far as the replay has got. Tokens in the
+        cassette expired long ago by time.time(); judged by this clock they are
+        as fresh as when they were recorded, so no unrecorded refresh is attempted.
+        """
+        return self.recorded_at
+
+    def summary(self):
+        endpoints = Counter(loose_key(entry.key).split(b"\n", 1)[1].decode("utf-8")
+                            for entry in self.entries)
+        return {
+            "records": len(self.entries),
+            "file_bytes": len(self.buffer),
+            "body_bytes": sum(entry.body_end - entry.body_start for entry in self.entries),
+            "endpoints": dict(endpoints.most_common()),
+        }
+
+    def close(self):
+        self.view.release()
+        try:
+            self.buffer.close()
+        except BufferError:
+            # Replayed responses still hold views into the map; it goes with them
+            pass
+        self.fh.close()
+
+class BodyReader:
+    """File-like body of a replayed response, read out of the cassette map"""
+
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def read(self, amt=None, decode_content=True):
+        end = len(self.view) if amt is None else min(self.pos + amt, len(self.view))
+        chunk = self.view[self.pos:end].tobytes()
+        self.pos = end
+        return chunk
+
+    def stream(self, amt=READ_CHUNK_SIZE, decode_content=True):
+        while self.pos < len(self.view):
+            yield self.read(amt)
+
+    def close(self):
+        pass
+
+def body_view(response):
+    """
+    Zero-copy view of a response body: straight into the cassette map for a
+    replayed response, over .content otherwise. Compare or measure bodies with
+    it instead of .content to keep large replayed PDFs from being copied.
+    """
+    if isinstance(response.raw, BodyReader):
+        return response.raw.view
+    return memoryview(response.content)
+
+class RecordingAdapter(BaseAdapter):
+    """
+    Wraps a live adapter and writes each response it returns to a cassette.
+    The body is read in full before the caller sees the response, so a
+    stream=True download is held in memory once while recording.
+    """
+
+    def __init__(self, adapter, writer):
+        super().__init__()
+        self.adapter = adapter
+        self.writer = writer
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = self.adapter.send(request, **kwargs)
+        body = response.content
+        self.writer.record(request, response, body, time.perf_counter() - start)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+class ReplayAdapter(BaseAdapter):
+    """Answers every request from a CassettePlayer; nothing goes over the network"""
+
+    def __init__(self, player):
+        super().__init__()
+        self.player = player
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        entry, meta = self.player.take(request)
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.reason = meta["reason"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = BodyReader(self.player.body(entry))
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+def measure_replay(player):
+    """Read every body once through the map; returns (bytes, seconds)"""
+    total = 0
+    start = time.perf_counter()
+    for entry in player.entries:
+        reader = BodyReader(player.body(entry))
+        for chunk in reader.stream():
+            total += len(chunk)
+    return total, time.perf_counter() - start
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Inspect an Espaço Braite traffic cassette (record one with backend_test.py --record PATH)")
+    parser.add_argument("path")
+    parser.add_argument("--bench", action="store_true",
+                        help="also time reading every recorded body back through the memory map")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    player = CassettePlayer(args.path)
+    summary = player.summary()
+    print(f"📼 {args.path}: {summary['records']} responses, "
+          f"{summary['body_bytes'] / 1024 / 1024:.1f}MB of bodies in a "
+          f"{summary['file_bytes'] / 1024 / 1024:.1f}MB file")
+    for endpoint, count in summary["endpoints"].items():
+        print(f"   {count:>6}  {endpoint}")
+    if args.bench:
+        total, elapsed = measure_replay(player)
+        print(f"⏱️  Read {total / 1024 / 1024:.1f}MB of bodies in {elapsed * 1000:.1f}ms "
+              f"({total / 1024 / 1024 / max(elapsed, 1e-9):.0f}MB/s)")
+    player.close()
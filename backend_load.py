@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Load generator for the Espaço Braite API
+Replays the backend_test.py request shapes as weighted scenarios at a target RPS
+"""
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import backend_metrics
+import backend_test as bt
+
+# Default traffic mix (scenario name -> weight)
+DEFAULT_MIX = {
+    "orders_list": 60,
+    "create_order": 20,
+    "dashboard": 10,
+    "order_pdf": 10,
+}
+
+# ============ SCENARIOS ============
+# Each scenario returns (endpoint label, response) using the same request
+# shapes as the matching test_* function.
+
+def scenario_orders_list():
+    return "GET /orders", bt.make_request(
+        "GET", "/orders", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+
+# Orders the create_order scenario made, deleted again by teardown_fixtures()
+created_order_ids = []
+
+def scenario_create_order():
+    data = bt.build_order_payload(bt.context.created_client_id, bt.context.created_service_id)
+    response = bt.make_request(
+        "POST", "/orders", data=data, headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+    if response is not None and response.status_code == 201:
+        created_order_ids.append(response.json()["order"]["id"])
+    return "POST /orders", response
+
+def scenario_dashboard():
+    return "GET /dashboard", bt.make_request(
+        "GET", "/dashboard", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+
+def scenario_order_pdf():
+    # Always the same order, so bypass the receipt cache or this would only load it
+    return "GET /orders/:id/pdf", bt.make_request(
+        "GET", f"/orders/{bt.context.created_order_id}/pdf",
+        headers={**bt.get_auth_headers(), **bt.PDF_CACHE_BYPASS}, params=bt.get_tenant_params())
+
+def scenario_clients_list():
+    return "GET /clients", bt.make_request(
+        "GET", "/clients", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+
+def scenario_services_list():
+    return "GET /services", bt.make_request(
+        "GET", "/services", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+
+def scenario_team_list():
+    return "GET /team", bt.make_request(
+        "GET", "/team", headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+
+SCENARIOS = {
+    "orders_list": scenario_orders_list,
+    "create_order": scenario_create_order,
+    "dashboard": scenario_dashboard,
+    "order_pdf": scenario_order_pdf,
+    "clients_list": scenario_clients_list,
+    "services_list": scenario_services_list,
+    "team_list": scenario_team_list,
+}
+
+# ============ STATS ============
+
+class LoadStats:
+    """Per-endpoint latency histograms; memory stays flat however long the run"""
+
+    def __init__(self):
+        # Measured from the scheduled start, so it includes client-side queueing
+        self.latency = backend_metrics.LatencyRecorder()
+        # Measured from the actual send
+        self.service = backend_metrics.LatencyRecorder()
+
+    def record(self, endpoint, latency, service_time, ok):
+        self.latency.record(endpoint, latency, ok)
+        self.service.record(endpoint, service_time, ok)
+
+    def report(self, elapsed):
+        print("\n" + "=" * 80)
+        print("📈 LOAD TEST RESULTS")
+        print("=" * 80)
+        print(f"{'Endpoint':<22}{'Reqs':>7}{'RPS':>8}{'Err%':>7}"
+              f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'svc p99':>9}")
+        service = self.service.summaries()
+        total = errors = 0
+        for endpoint, summary in self.latency.summaries().items():
+            count = summary["count"]
+            failed = summary["errors"]
+            total += count
+            errors += failed
+            print(f"{endpoint:<22}{count:>7}{count / elapsed:>8.1f}{failed / count * 100:>7.1f}"
+                  f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}"
+                  f"{summary['p99_ms']:>9.1f}{service[endpoint]['p99_ms']:>9.1f}")
+        if total:
+            print(f"\n🎯 {total} requests in {elapsed:.1f}s "
+                  f"({total / elapsed:.1f} req/s), error rate {errors / total * 100:.2f}%")
+
+# ============ DRIVER ============
+
+def parse_mix(value):
+    """Parse 'orders_list=60,dashboard=10' into a weight dict"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def setup_fixtures():
+    """Log in and create the client/service/order the scenarios reference"""
+    steps = [bt.test_login, bt.test_create_client, bt.test_create_service, bt.test_create_order]
+    return all(step(bt.context) for step in steps)
+
+def teardown_fixtures():
+    """Delete every row the run created, so load runs don't grow the shared tenant"""
+    failed = bt.delete_rows("orders", created_order_ids)
+    if failed:
+        print(f"⚠️  {failed}/{len(created_order_ids)} orders created by the run could not be deleted")
+    bt.test_delete_order(bt.context)
+    bt.test_delete_service(bt.context)
+    bt.test_delete_client(bt.context)
+
+def run_scenario(name, scheduled_at, stats):
+    started = time.perf_counter()
+    endpoint, response = SCENARIOS[name]()
+    finished = time.perf_counter()
+    ok = response is not None and response.status_code < 400
+    if response is not None and response.status_code == 401:
+        # Token rejected (e.g. server restarted with a new secret): renew once for everyone
+        rejected = response.request.headers.get("Authorization", "")[len("Bearer "):]
+        bt.token_manager.invalidate(bt.token_key(), rejected or None)
+    stats.record(endpoint, finished - scheduled_at, finished - started, ok)
+
+def run_load(mix, rps, duration, virtual_users, poisson=False, seed=None):
+    """
+    Open-loop load: requests are released on a fixed (or Poisson) schedule
+    regardless of how many are still in flight, so a slow server shows up as
+    growing latency instead of silently lowering the offered rate.
+    """
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    stats = LoadStats()
+    # One pooled connection per virtual user
+    bt.http_session = bt.create_session(pool_maxsize=virtual_users)
+    executor = ThreadPoolExecutor(max_workers=virtual_users)
+
+    print(f"🚦 {rps} req/s for {duration}s across {virtual_users} virtual users "
+          f"({'poisson' if poisson else 'constant'} arrivals)")
+    if mix.get("order_pdf"):
+        print("🧾 order_pdf bypasses the receipt cache (X-PDF-Cache: bypass): every request is a render")
+
+    futures = []
+    start = time.perf_counter()
+    next_at = start
+    late = 0
+    while next_at < start + duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        elif delay < -0.01:
+            late += 1
+        name = rng.choices(names, weights)[0]
+        futures.append(executor.submit(run_scenario, name, next_at, stats))
+        next_at += rng.expovariate(rps) if poisson else 1.0 / rps
+
+    wait(futures)
+    executor.shutdown()
+    elapsed = time.perf_counter() - start
+
+    stats.report(elapsed)
+    tokens = bt.token_manager.stats
+    print(f"🔑 Tokens: {tokens['logins']} logins, {tokens['refreshes']} refreshes, {tokens['hits']} cache hits")
+    if late:
+        print(f"⚠️  Scheduler fell behind on {late} arrivals; the client may be the bottleneck")
+    return stats
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Espaço Braite API load generator")
+    parser.add_argument("--base-url", help="API host to load (default: $BRAITE_BASE_URL or the preview host)")
+    parser.add_argument("--local", action="store_true", help="load the in-process stub server instead")
+    parser.add_argument("--rps", type=float, default=10.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--users", type=int, default=20, help="virtual users (concurrent workers)")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="weighted scenarios, e.g. orders_list=60,create_order=20")
+    parser.add_argument("--poisson", action="store_true", help="use Poisson arrivals")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for the scenario mix")
+    parser.add_argument("--json", metavar="PATH", help="write per-endpoint latency as JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    stub = None
+    if args.local:
+        import backend_stub_server
+        stub = backend_stub_server.StubServer()
+        bt.set_base_url(stub.start_in_thread())
+    elif args.base_url:
+        bt.set_base_url(args.base_url)
+    if not setup_fixtures():
+        raise SystemExit("❌ Fixture setup failed, aborting load run")
+    try:
+        stats = run_load(args.mix, args.rps, args.duration, args.users, args.poisson, args.seed)
+        if args.json:
+            backend_metrics.write_json(backend_metrics.build_report(stats.latency), args.json)
+            print(f"📝 JSON results written to {args.json}")
+    finally:
+        teardown_fixtures()
+        if stub:
+            stub.stop()
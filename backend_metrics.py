@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Latency recording and result export for the Espaço Braite API harness
+HDR-style histograms (constant memory), JSON/CSV/JUnit export and baseline comparison,
+Server-Timing breakdowns per test, plus process-tree RSS sampling for local servers
+and trend slopes for soak runs
+"""
+
+import csv
+import json
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+
+# Default histogram range: 1µs .. 60s at 2 significant digits (~1% error)
+DEFAULT_HIGHEST_US = 60_000_000
+DEFAULT_SIGNIFICANT_FIGURES = 2
+
+REPORTED_PERCENTILES = (50, 90, 95, 99)
+
+UUID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+def endpoint_key(method, endpoint):
+    """Collapse ids so /orders/<uuid>/pdf and /orders/<other>/pdf share a histogram"""
+    path = endpoint.split("?", 1)[0]
+    return f"{method.upper()} {UUID_PATTERN.sub(':id', path)}"
+
+class LatencyHistogram:
+    """
+    Log-linear histogram in the style of HdrHistogram.
+
+    Values (microseconds) land in power-of-two buckets that are each split into
+    linear sub-buckets, so relative error is bounded by the significant figures
+    and memory is fixed by the trackable range, not by the number of samples.
+    """
+
+    def __init__(self, highest_us=DEFAULT_HIGHEST_US, significant_figures=DEFAULT_SIGNIFICANT_FIGURES):
+        self.highest_us = highest_us
+        self.significant_figures = significant_figures
+        sub_bucket_count = 1 << math.ceil(math.log2(2 * 10 ** significant_figures))
+        self.sub_bucket_half_count = sub_bucket_count // 2
+        self.sub_bucket_half_count_magnitude = int(math.log2(self.sub_bucket_half_count))
+        bucket_count = 1
+        smallest_untrackable = sub_bucket_count
+        while smallest_untrackable <= highest_us:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = array("Q", bytes(8 * (bucket_count + 1) * self.sub_bucket_half_count))
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+        self.overflows = 0
+
+    def _index(self, value):
+        bucket = max(value.bit_length() - (self.sub_bucket_half_count_magnitude + 1), 0)
+        sub_bucket = value >> bucket
+        return ((bucket + 1) << self.sub_bucket_half_count_magnitude) + (sub_bucket - self.sub_bucket_half_count)
+
+    def _highest_equivalent(self, index):
+        bucket = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket < 0:
+            sub_bucket -= self.sub_bucket_half_count
+            bucket = 0
+        return (sub_bucket << bucket) + (1 << bucket) - 1
+
+    def record(self, seconds):
+        value = max(int(seconds * 1_000_000), 0)
+        if value > self.highest_us:
+            self.overflows += 1
+            value = self.highest_us
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total_us += value
+        self.max_us = max(self.max_us, value)
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.count += other.count
+        self.total_us += other.total_us
+        self.overflows += other.overflows
+        self.max_us = max(self.max_us, other.max_us)
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+
+    def value_at_percentile(self, pct):
+        """Latency in microseconds at the given percentile (0-100)"""
+        if not self.count:
+            return 0
+        target = max(math.ceil(pct / 100.0 * self.count), 1)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_us)
+        return self.max_us
+
+    def summary(self):
+        """Milliseconds, rounded for stable diffs"""
+        result = {
+            "count": self.count,
+            "min_ms": round((self.min_us or 0) / 1000, 3),
+            "mean_ms": round(self.total_us / self.count / 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max_us / 1000, 3),
+        }
+        for pct in REPORTED_PERCENTILES:
+            result[f"p{pct}_ms"] = round(self.value_at_percentile(pct) / 1000, 3)
+        return result
+
+class LatencyRecorder:
+    """Thread-safe per-endpoint histograms plus error counts"""
+
+    def __init__(self, **histogram_options):
+        self.lock = threading.Lock()
+        self.histogram_options = histogram_options
+        self.histograms = {}
+        self.errors = {}
+
+    def record(self, key, seconds, ok=True):
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram(**self.histogram_options)
+            histogram.record(seconds)
+            if not ok:
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def record_error(self, key):
+        with self.lock:
+            self.errors[key] = self.errors.get(key, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.errors = {}
+
+    def export_state(self):
+        """Picklable copy of the recorded data, for handing back from a worker process"""
+        with self.lock:
+            return {"histograms": dict(self.histograms), "errors": dict(self.errors)}
+
+    def merge_state(self, state):
+        """Fold in another recorder's export_state()"""
+        with self.lock:
+            for key, other in state["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = LatencyHistogram(**self.histogram_options)
+                histogram.merge(other)
+            for key, count in state["errors"].items():
+                self.errors[key] = self.errors.get(key, 0) + count
+
+    def summaries(self):
+        with self.lock:
+            keys = sorted(set(self.histograms) | set(self.errors))
+            result = {}
+            for key in keys:
+                histogram = self.histograms.get(key)
+                summary = histogram.summary() if histogram else LatencyHistogram().summary()
+                summary["errors"] = self.errors.get(key, 0)
+                result[key] = summary
+            return result
+
+# ============ EXPORT ============
+
+def build_report(recorder, test_results=None, test_durations=None, server_timings=None):
+    report = {"endpoints": recorder.summaries()}
+    if test_results is not None:
+        durations = test_durations or {}
+        timings = server_timings or {}
+        report["tests"] = [
+            {"name": name, "passed": bool(result), "duration_s": round(durations.get(name, 0.0), 4)}
+            | ({"server_timing": timings[name]} if name in timings else {})
+            for name, result in test_results
+        ]
+    return report
+
+def write_json(report, path):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2, sort_keys=True, ensure_ascii=False)
+        fh.write("\n")
+
+def write_csv(report, path):
+    columns = ["endpoint", "count", "errors", "min_ms", "mean_ms"]
+    columns += [f"p{pct}_ms" for pct in REPORTED_PERCENTILES] + ["max_ms"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(columns)
+        for endpoint, summary in report["endpoints"].items():
+            writer.writerow([endpoint] + [summary[column] for column in columns[1:]])
+
+def write_junit(report, path, suite_name="backend_test"):
+    tests = report.get("tests", [])
+    failures = sum(1 for test in tests if not test["passed"])
+    suite = ET.Element("testsuite", {
+        "name": suite_name,
+        "tests": str(len(tests)),
+        "failures": str(failures),
+        "time": f"{sum(test['duration_s'] for test in tests):.4f}",
+    })
+    properties = ET.SubElement(suite, "properties")
+    for endpoint, summary in report["endpoints"].items():
+        ET.SubElement(properties, "property", {"name": f"{endpoint} p95_ms", "value": str(summary["p95_ms"])})
+    for test in tests:
+        case = ET.SubElement(suite, "testcase", {
+            "classname": suite_name,
+            "name": test["name"],
+            "time": f"{test['duration_s']:.4f}",
+        })
+        if not test["passed"]:
+            ET.SubElement(case, "failure", {"message": f"{test['name']} failed"})
+    ET.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+# ============ BASELINE COMPARISON ============
+
+def compare_to_baseline(report, baseline_path, max_regression_pct, min_delta_ms=1.0):
+    """
+    Return a list of (endpoint, baseline p95, current p95) that regressed by more
+    than max_regression_pct. Deltas under min_delta_ms are treated as noise.
+    """
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    regressions = []
+    for endpoint, summary in report["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous or not previous.get("count"):
+            continue
+        before, after = previous["p95_ms"], summary["p95_ms"]
+        if after - before < min_delta_ms:
+            continue
+        if before == 0 or (after - before) / before * 100 > max_regression_pct:
+            regressions.append((endpoint, before, after))
+    return regressions
+
+def print_latency_table(report):
+    print(f"\n{'Endpoint':<28}{'Count':>7}{'Err':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, summary in report["endpoints"].items():
+        print(f"{endpoint:<28}{summary['count']:>7}{summary['errors']:>5}{summary['p50_ms']:>9.1f}"
+              f"{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}{summary['max_ms']:>9.1f}")
+
+# ============ SERVER QUERY STATS ============
+
+def diff_query_stats(before, after):
+    """
+    Per-statement deltas between two GET /metrics "queries" snapshots, most
+    expensive first. A server restart or stats reset in between (different
+    "since") means the later snapshot is taken as the whole delta.
+    """
+    if not before or before.get("since") != after.get("since"):
+        before = {}
+    previous = {row["statement"]: row for row in before.get("statements", [])}
+    deltas = []
+    for row in after.get("statements", []):
+        prev = previous.get(row["statement"], {})
+        calls = row["calls"] - prev.get("calls", 0)
+        if calls <= 0:
+            continue
+        deltas.append({
+            "statement": row["statement"],
+            "calls": calls,
+            "total_ms": row["totalMs"] - prev.get("totalMs", 0),
+            "rows": row["rows"] - prev.get("rows", 0),
+            "slow": row["slow"] - prev.get("slow", 0),
+            "errors": row["errors"] - prev.get("errors", 0),
+            "prepared": row.get("prepared"),
+        })
+    deltas.sort(key=lambda delta: delta["total_ms"], reverse=True)
+    return deltas
+
+def print_query_report(costs, top=3, width=64):
+    """costs: {label: diff_query_stats(...)}; prints totals and the costliest statements per label"""
+    print(f"\n{'Test':<28}{'Queries':>9}{'DB ms':>10}{'Rows':>8}{'Slow':>6}")
+    for label, deltas in costs.items():
+        calls = sum(delta["calls"] for delta in deltas)
+        total_ms = sum(delta["total_ms"] for delta in deltas)
+        rows = sum(delta["rows"] for delta in deltas)
+        slow = sum(delta["slow"] for delta in deltas)
+        print(f"{label:<28}{calls:>9}{total_ms:>10.1f}{rows:>8}{slow:>6}")
+        for delta in deltas[:top]:
+            # A prepared statement's name is shorter and says which query it is
+            statement = delta["prepared"] or delta["statement"]
+            if len(statement) > width:
+                statement = statement[:width - 1] + "…"
+            print(f"    {delta['calls']:>4}x {delta['total_ms']:>8.1f}ms  {statement}")
+
+# ============ SERVER TIMING ============
+
+# Phases the server reports after its handler "total" (see lib/compression.js)
+POST_HANDLER_PHASES = ("compress",)
+# Breakdown columns, in request order; anything else the server sends goes under "other"
+TIMING_PHASES = ("auth", "db", "pdf-queue", "render", "serialize", "compress")
+
+def parse_server_timing(header):
+    """
+    'auth;dur=1.2, db;desc="3 queries";dur=4.5' -> {"auth": {"dur": 1.2},
+    "db": {"dur": 4.5, "desc": "3 queries"}}. Repeated metrics are summed.
+    """
+    metrics = {}
+    for entry in (header or "").split(","):
+        name, *params = [part.strip() for part in entry.split(";")]
+        if not name:
+            continue
+        metric = metrics.setdefault(name, {"dur": 0.0})
+        for param in params:
+            key, _, value = param.partition("=")
+            key, value = key.strip().lower(), value.strip().strip('"')
+            if key == "dur":
+                try:
+                    metric["dur"] += float(value)
+                except ValueError:
+                    pass
+            elif key == "desc":
+                metric["desc"] = value
+    return metrics
+
+class ServerTimingRecorder:
+    """
+    Per-test totals of client-observed latency and the server's Server-Timing
+    phases, so a slow test can be split into auth, db, rendering, serialization
+    and what is left for the network (client time minus the server's time).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tests = {}
+
+    @staticmethod
+    def _empty():
+        return {"requests": 0, "timed": 0, "client_ms": 0.0, "timed_client_ms": 0.0,
+                "server_ms": 0.0, "queries": 0, "phases": {}}
+
+    def record(self, test_name, seconds, header):
+        metrics = parse_server_timing(header) if header else {}
+        with self.lock:
+            entry = self.tests.setdefault(test_name, self._empty())
+            entry["requests"] += 1
+            entry["client_ms"] += seconds * 1000
+            if "total" not in metrics:
+                return
+            entry["timed"] += 1
+            entry["timed_client_ms"] += seconds * 1000
+            entry["server_ms"] += metrics["total"]["dur"] + sum(
+                metrics[name]["dur"] for name in POST_HANDLER_PHASES if name in metrics)
+            for name, metric in metrics.items():
+                if name == "total":
+                    continue
+                phase = name if name in TIMING_PHASES else "other"
+                entry["phases"][phase] = entry["phases"].get(phase, 0.0) + metric["dur"]
+                if name == "db":
+                    count = metric.get("desc", "").split(" ")[0]
+                    entry["queries"] += int(count) if count.isdigit() else 0
+
+    def reset(self):
+        with self.lock:
+            self.tests = {}
+
+    def export_state(self):
+        """Picklable copy of the recorded data, for handing back from a worker process"""
+        with self.lock:
+            return {name: {**entry, "phases": dict(entry["phases"])} for name, entry in self.tests.items()}
+
+    def merge_state(self, state, prefix=""):
+        """Fold in another recorder's export_state(), test names prefixed with prefix"""
+        with self.lock:
+            for name, other in state.items():
+                entry = self.tests.setdefault(prefix + name, self._empty())
+                for key in ("requests", "timed", "client_ms", "timed_client_ms", "server_ms", "queries"):
+                    entry[key] += other[key]
+                for phase, duration in other["phases"].items():
+                    entry["phases"][phase] = entry["phases"].get(phase, 0.0) + duration
+
+    def summaries(self):
+        """{test: {...totals, "network_ms"}}; network is over the requests that reported timing"""
+        with self.lock:
+            result = {}
+            for name, entry in self.tests.items():
+                summary = {key: round(value, 3) if isinstance(value, float) else value
+                           for key, value in entry.items() if key != "phases"}
+                summary["phases"] = {phase: round(duration, 3) for phase, duration in entry["phases"].items()}
+                summary["network_ms"] = round(max(entry["timed_client_ms"] - entry["server_ms"], 0.0), 3)
+                result[name] = summary
+            return result
+
+def print_timing_breakdown(summaries, test_durations, min_duration_s=0.0):
+    """Where each test's request time went, for tests that took at least min_duration_s"""
+    slow = [name for name in summaries if test_durations.get(name, 0.0) >= min_duration_s]
+    if not slow:
+        return
+    columns = [phase for phase in TIMING_PHASES + ("other",)
+               if any(phase in summaries[name]["phases"] for name in slow)]
+    print("\n🔬 Server time per test (ms, summed over requests; network = client - server)")
+    print(f"{'Test':<34}{'Reqs':>6}{'Client':>9}{'Server':>9}{'Network':>9}{'Queries':>8}"
+          + "".join(f"{phase:>10}" for phase in columns))
+    for name in slow:
+        summary = summaries[name]
+        untimed = summary["requests"] - summary["timed"]
+        print(f"{name[:33]:<34}{summary['requests']:>6}{summary['client_ms']:>9.1f}{summary['server_ms']:>9.1f}"
+              f"{summary['network_ms']:>9.1f}{summary['queries']:>8}"
+              + "".join(f"{summary['phases'].get(phase, 0.0):>10.1f}" for phase in columns)
+              + (f"  ({untimed} untimed)" if untimed else ""))
+
+# ============ PROCESS MEMORY ============
+
+def process_tree_rss(pid):
+    """
+    Resident memory (bytes) of pid plus all of its descendants, read from
+    /proc (Linux only). Counts Chromium's helper processes under the Node
+    server. Returns None when the process can't be inspected.
+    """
+    children = {}
+    rss_pages = {}
+    try:
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # comm may contain spaces; fields after ") " are fixed
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            children.setdefault(int(fields[1]), []).append(int(entry))
+            rss_pages[int(entry)] = int(fields[21])
+    except OSError:
+        return None
+    if pid not in rss_pages:
+        return None
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_pages.get(current, 0)
+        stack.extend(children.get(current, ()))
+    return total * os.sysconf("SC_PAGE_SIZE")
+
+class RssSampler:
+    """Polls process_tree_rss(pid) on a background thread and keeps the peak"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = process_tree_rss(self.pid)
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+# ============ TRENDS ============
+
+def linear_slope(points):
+    """
+    Least-squares slope of (x, y) points, ignoring y=None. Returns None when
+    there are fewer than two distinct x values to fit.
+    """
+    points = [(x, y) for x, y in points if y is not None]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    spread = sum((x - mean_x) ** 2 for x, _ in points)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / spread
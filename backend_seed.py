@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Bulk data seeding and dataset-scaling benchmark for the Espaço Braite API
+Creates clients/services/orders through the public API, then measures how the
+unpaginated list endpoints behave as the tenant grows, or (--export) how the
+streaming order export performs at a million orders
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import backend_soak
+import backend_stream
+import backend_test as bt
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+LIST_ENDPOINTS = ("/clients", "/services", "/orders")
+
+# Orders per POST /orders/batch while seeding (the server's MAX_BATCH_ORDERS)
+SEED_BATCH_ORDERS = 500
+
+DEFAULT_EXPORT_ROWS = 1_000_000
+# Clients and services the exported orders draw from
+EXPORT_CATALOG_SIZE = 1_000
+EXPORT_FORMATS = ("csv", "ndjson")
+# Largest server RSS growth tolerated while an export streams; with a cursor
+# it stays flat instead of scaling with the number of orders
+EXPORT_MAX_RSS_GROWTH_MB = float(os.environ.get("BRAITE_EXPORT_MAX_RSS_MB", "64"))
+
+VEHICLES = ["Honda Civic", "Toyota Corolla", "VW Gol", "Fiat Uno", "Chevrolet Onix", "Hyundai HB20"]
+SERVICE_NAMES = ["Lavagem Completa", "Lavagem Simples", "Polimento", "Enceramento", "Higienização Interna"]
+STATUSES = ["pending", "in_progress", "completed", "paid", "paid", "paid"]
+
+# ============ PAYLOADS ============
+
+def client_payload(rng, index):
+    return {
+        "name": f"Cliente {index:06d}",
+        "phone": f"119{rng.randrange(10**7, 10**8)}",
+        "vehicle_plate": f"{chr(65 + index % 26)}{chr(65 + index // 26 % 26)}C-{index % 10000:04d}",
+        "vehicle_model": f"{rng.choice(VEHICLES)} {rng.randrange(2005, 2026)}",
+    }
+
+def service_payload(rng, index):
+    return {
+        "name": f"{SERVICE_NAMES[index % len(SERVICE_NAMES)]} {index:06d}",
+        "description": "Serviço gerado para benchmark",
+        "price": round(rng.uniform(20, 300), 2),
+        "duration_minutes": rng.choice([30, 60, 90, 120]),
+    }
+
+def order_payload(rng, client_ids, services):
+    items = []
+    for service_id, name, price in rng.sample(services, k=min(len(services), rng.randint(1, 3))):
+        items.append({"catalog_item_id": service_id, "service_name": name,
+                      "price": price, "quantity": rng.randint(1, 2)})
+    status = rng.choice(STATUSES)
+    return {
+        "client_id": rng.choice(client_ids),
+        "items": items,
+        "status": status,
+        "payment_method": "PIX" if status == "paid" else None,
+    }
+
+# ============ SEEDING ============
+
+def post_all(endpoint, payloads, key, concurrency, batch_size):
+    """POST payloads in batches of concurrent requests; returns created rows"""
+    created = []
+    failures = 0
+    headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+
+    def post(data):
+        response = bt.make_request("POST", endpoint, data=data, headers=headers, params=params)
+        if response is None or response.status_code != 201:
+            return None
+        return response.json()[key]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for offset in range(0, len(payloads), batch_size):
+            for row in executor.map(post, payloads[offset:offset + batch_size]):
+                if row is None:
+                    failures += 1
+                else:
+                    created.append(row)
+    if failures:
+        print(f"⚠️  {failures} POST {endpoint} requests failed")
+    return created
+
+class TenantSeeder:
+    """Keeps track of what has been created so sizes can grow incrementally"""
+
+    def __init__(self, concurrency=16, batch_size=500, seed=42):
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self.client_ids = []
+        self.services = []  # (id, name, price)
+        self.orders = 0
+
+    def grow_to(self, size):
+        """Create rows until the tenant has `size` seeded clients, services and orders"""
+        start = time.perf_counter()
+        bt.http_session = bt.create_session(pool_maxsize=self.concurrency)
+
+        clients = [client_payload(self.rng, i) for i in range(len(self.client_ids), size)]
+        self.client_ids += [row["id"] for row in post_all(
+            "/clients", clients, "client", self.concurrency, self.batch_size)]
+
+        services = [service_payload(self.rng, i) for i in range(len(self.services), size)]
+        self.services += [(row["id"], row["name"], float(row["price"])) for row in post_all(
+            "/services", services, "service", self.concurrency, self.batch_size)]
+
+        if not self.client_ids or not self.services:
+            raise RuntimeError("No clients/services were created; cannot seed orders")
+        orders = [order_payload(self.rng, self.client_ids, self.services) for _ in range(self.orders, size)]
+        self.orders += len(bt.create_orders_batch(orders))
+
+        elapsed = time.perf_counter() - start
+        created = len(clients) + len(services) + len(orders)
+        print(f"🌱 Seeded to {size} rows/table: {created} creates in {elapsed:.1f}s "
+              f"({created / elapsed if elapsed else 0:.0f} rows/s)")
+
+    def grow_orders_to(self, count, report_every=100_000):
+        """
+        Create orders only (from the clients/services seeded so far) until
+        `count` exist, `concurrency` POST /orders/batch calls at a time
+        """
+        if not self.client_ids or not self.services:
+            raise RuntimeError("No clients/services were created; cannot seed orders")
+        start = time.perf_counter()
+        initial = self.orders
+        headers, params = bt.get_auth_headers(), bt.get_tenant_params()
+
+        def create(orders):
+            return len(bt.create_orders_batch(orders, batch_size=SEED_BATCH_ORDERS, headers=headers, params=params))
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while self.orders < count:
+                # Generated a round at a time so a million payloads never sit in memory
+                total = min(count - self.orders, self.concurrency * SEED_BATCH_ORDERS)
+                orders = [order_payload(self.rng, self.client_ids, self.services) for _ in range(total)]
+                previous = self.orders
+                self.orders += sum(executor.map(create, [orders[offset:offset + SEED_BATCH_ORDERS]
+                                                         for offset in range(0, total, SEED_BATCH_ORDERS)]))
+                if self.orders // report_every > previous // report_every:
+                    print(f"   {self.orders:,}/{count:,} orders")
+
+        elapsed = time.perf_counter() - start
+        created = self.orders - initial
+        print(f"🌱 Seeded to {self.orders:,} orders: {created:,} creates in {elapsed:.1f}s "
+              f"({created / elapsed if elapsed else 0:.0f} orders/s)")
+
+# ============ SCALING BENCHMARK ============
+
+def measure_list(endpoint, repeats):
+    """Best-of-N fetch latency, payload size and client-side JSON decode time"""
+    latencies, decodes = [], []
+    size = rows = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        response = bt.make_request("GET", endpoint, headers=bt.get_auth_headers(), params=bt.get_tenant_params())
+        latencies.append(time.perf_counter() - start)
+        if response is None or response.status_code != 200:
+            return None
+        body = response.content
+        decode_start = time.perf_counter()
+        payload = json.loads(body)
+        decodes.append(time.perf_counter() - decode_start)
+        size = len(body)
+        rows = len(next(iter(payload.values())))
+    return {
+        "endpoint": endpoint,
+        "rows": rows,
+        "bytes": size,
+        "latency_ms": round(min(latencies) * 1000, 2),
+        "decode_ms": round(min(decodes) * 1000, 2),
+    }
+
+def ascii_bar(value, largest, width=40):
+    return "█" * max(int(value / largest * width), 1) if largest else ""
+
+def print_chart(results, metric, unit):
+    print(f"\n{metric} ({unit}) vs rows")
+    largest = max(result[metric] for result in results)
+    for result in results:
+        print(f"  {result['endpoint']:<10}{result['rows']:>8}  "
+              f"{ascii_bar(result[metric], largest)} {result[metric]:,}")
+
+def run_scaling_benchmark(sizes, repeats=3, concurrency=16, batch_size=500, seed=42):
+    seeder = TenantSeeder(concurrency, batch_size, seed)
+    results = []
+    for size in sorted(sizes):
+        seeder.grow_to(size)
+        for endpoint in LIST_ENDPOINTS:
+            result = measure_list(endpoint, repeats)
+            if result is None:
+                print(f"❌ GET {endpoint} failed at {size} rows")
+                continue
+            result["seeded"] = size
+            results.append(result)
+            print(f"📏 GET {endpoint}: {result['rows']} rows, {result['bytes'] / 1024:.0f} KiB, "
+                  f"{result['latency_ms']:.1f}ms fetch, {result['decode_ms']:.1f}ms decode")
+
+    if results:
+        print("\n" + "=" * 80)
+        print("📊 DATASET SCALING")
+        print("=" * 80)
+        print_chart(results, "bytes", "response size")
+        print_chart(results, "latency_ms", "fetch latency")
+        print_chart(results, "decode_ms", "JSON decode")
+    return results
+
+# ============ EXPORT BENCHMARK ============
+
+def measure_export(export_format, directory, interval=0.25):
+    """Download one export to disk while sampling the server's RSS; the file is removed afterwards"""
+    path = os.path.join(directory, f"orders.{export_format}")
+    try:
+        with backend_soak.DiagnosticsSampler(interval) as sampler:
+            result = backend_stream.download_export(path, export_format)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    if result is None or result["status"] != 200:
+        return None
+    rss = [sample["rss_mb"] for sample in sampler.samples if sample.get("rss_mb") is not None]
+    result["format"] = export_format
+    result["rss_start_mb"] = rss[0] if rss else None
+    result["rss_growth_mb"] = max(rss) - rss[0] if rss else None
+    return result
+
+def run_export_benchmark(rows, concurrency=16, batch_size=500, seed=42, directory=None):
+    """Seed `rows` orders, export them in every format and check server memory stayed flat; returns failures"""
+    seeder = TenantSeeder(concurrency, batch_size, seed)
+    seeder.grow_to(min(rows, EXPORT_CATALOG_SIZE))
+    seeder.grow_orders_to(rows)
+
+    failures = 0
+    print("\n" + "=" * 80)
+    print(f"📦 ORDER EXPORT ({seeder.orders:,} orders)")
+    print("=" * 80)
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        for export_format in EXPORT_FORMATS:
+            result = measure_export(export_format, tmp)
+            if result is None:
+                print(f"❌ GET /orders/export?format={export_format} failed")
+                failures += 1
+                continue
+            megabytes = result["bytes"] / backend_soak.MB
+            growth = result["rss_growth_mb"]
+            flat = growth is None or growth <= EXPORT_MAX_RSS_GROWTH_MB
+            failures += not flat
+            print(f"{'✅' if flat else '❌'} {export_format:<7}{result['lines']:>12,} lines {megabytes:>9.1f} MB "
+                  f"in {result['elapsed_s']:.1f}s ({megabytes / result['elapsed_s']:.1f} MB/s, "
+                  f"{result['lines'] / result['elapsed_s']:,.0f} lines/s), TTFB {result['ttfb_s'] * 1000:.0f}ms, "
+                  + (f"server RSS +{growth:.1f} MB (limit {EXPORT_MAX_RSS_GROWTH_MB:.0f})"
+                     if growth is not None else "server RSS not reported"))
+    return failures
+
+def write_results_csv(results, path):
+    columns = ["seeded", "endpoint", "rows", "bytes", "latency_ms", "decode_ms"]
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.DictWriter(fh, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+def parse_sizes(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed a tenant in bulk and benchmark list endpoints")
+    parser.add_argument("--base-url", help="API host (default: $BRAITE_BASE_URL or the preview host)")
+    parser.add_argument("--local", action="store_true", help="seed the in-process stub server instead")
+    parser.add_argument("--sizes", type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help="comma-separated rows per table to benchmark at (default 1000,10000,100000)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent POSTs while seeding")
+    parser.add_argument("--batch-size", type=int, default=500, help="POSTs submitted per batch")
+    parser.add_argument("--repeats", type=int, default=3, help="fetches per endpoint per size (best is kept)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for generated rows")
+    parser.add_argument("--seed-only", action="store_true", help="only seed up to the largest size")
+    parser.add_argument("--csv", metavar="PATH", help="write the scaling results as CSV")
+    parser.add_argument("--export", action="store_true",
+                        help="benchmark GET /orders/export instead of the list endpoints")
+    parser.add_argument("--export-rows", type=int, default=DEFAULT_EXPORT_ROWS,
+                        help=f"orders to seed and export (default {DEFAULT_EXPORT_ROWS:,})")
+    parser.add_argument("--export-dir", help="where export downloads are written (default: system temp dir)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    stub = None
+    if args.local:
+        import backend_stub_server
+        stub = backend_stub_server.StubServer()
+        bt.set_base_url(stub.start_in_thread())
+        bt.METRICS_TOKEN = backend_stub_server.METRICS_TOKEN
+    elif args.base_url:
+        bt.set_base_url(args.base_url)
+    try:
+        if not bt.test_login(bt.context):
+            raise SystemExit("❌ Login failed, cannot seed")
+        if args.export:
+            if run_export_benchmark(args.export_rows, args.concurrency, args.batch_size, args.seed,
+                                    args.export_dir):
+                raise SystemExit(1)
+        elif args.seed_only:
+            TenantSeeder(args.concurrency, args.batch_size, args.seed).grow_to(max(args.sizes))
+        else:
+            results = run_scaling_benchmark(args.sizes, args.repeats, args.concurrency,
+                                            args.batch_size, args.seed)
+            if args.csv:
+                write_results_csv(results, args.csv)
+                print(f"📝 Scaling results written to {args.csv}")
+    finally:
+        if stub:
+            stub.stop()
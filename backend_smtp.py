@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Local SMTP sink for the Espaço Braite API harness
+Accepts every message on a plain (no TLS, no AUTH) SMTP port and keeps it in
+memory, so tests can assert what the server's email outbox delivered
+"""
+
+import argparse
+import asyncio
+import email
+import threading
+import time
+from email import policy
+
+# Largest DATA section accepted (invites are a few KB)
+MAX_MESSAGE_BYTES = 1024 * 1024
+
+class SmtpSink:
+    """
+    Minimal RFC 5321 receiver: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT.
+    Delivered messages land in self.messages as {"mail_from", "rcpt_to",
+    "message" (email.message.EmailMessage), "received_at"}.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.messages = []
+        self.connections = 0
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self._received = threading.Condition()
+
+    @property
+    def address(self):
+        return self.host, self.port
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=MAX_MESSAGE_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def start_in_thread(self):
+        """Run on a private event loop in a daemon thread; returns (host, port)"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="smtp-sink", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.address
+
+    def stop(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.server.close)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            self.loop.close()
+            self.loop = None
+
+    def wait_for(self, predicate, timeout):
+        """First message matching predicate(message), waiting up to timeout seconds; None if none arrives"""
+        deadline = time.monotonic() + timeout
+        with self._received:
+            while True:
+                match = next((message for message in self.messages if predicate(message)), None)
+                remaining = deadline - time.monotonic()
+                if match is not None or remaining <= 0:
+                    return match
+                self._received.wait(remaining)
+
+    def _deliver(self, mail_from, rcpt_to, data):
+        with self._received:
+            self.messages.append({
+                "mail_from": mail_from,
+                "rcpt_to": rcpt_to,
+                "message": email.message_from_bytes(data, policy=policy.default),
+                "received_at": time.time(),
+            })
+            self._received.notify_all()
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+
+        async def reply(line):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        mail_from, rcpt_to = None, []
+        try:
+            await reply("220 braite-smtp-sink ESMTP")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command, _, argument = line.decode("latin-1").strip().partition(" ")
+                command = command.upper()
+                if command == "EHLO":
+                    writer.write(b"250-braite-smtp-sink\r\n250-8BITMIME\r\n")
+                    await reply(f"250 SIZE {MAX_MESSAGE_BYTES}")
+                elif command == "HELO":
+                    await reply("250 braite-smtp-sink")
+                elif command == "MAIL":
+                    mail_from, rcpt_to = argument.partition(":")[2].split(" ")[0].strip("<>"), []
+                    await reply("250 OK")
+                elif command == "RCPT":
+                    rcpt_to.append(argument.partition(":")[2].split(" ")[0].strip("<>"))
+                    await reply("250 OK")
+                elif command == "DATA":
+                    if mail_from is None or not rcpt_to:
+                        await reply("503 Need MAIL and RCPT first")
+                        continue
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    # Bigger than the stream limit raises LimitOverrunError and drops the connection
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    # Undo dot-stuffing (the first line counts as following a CRLF too)
+                    body = (b"\r\n" + data[:-5]).replace(b"\r\n..", b"\r\n.")[2:]
+                    self._deliver(mail_from, rcpt_to, body)
+                    await reply("250 OK queued")
+                    mail_from, rcpt_to = None, []
+                elif command == "RSET":
+                    mail_from, rcpt_to = None, []
+                    await reply("250 OK")
+                elif command == "NOOP":
+                    await reply("250 OK")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Espaço Braite SMTP sink (point SMTP_HOST/SMTP_PORT here)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    sink = SmtpSink(args.host, args.port)
+    host, port = sink.start_in_thread()
+    print(f"📧 SMTP sink listening on {host}:{port}")
+    seen = 0
+    try:
+        while True:
+            sink.wait_for(lambda _: len(sink.messages) > seen, timeout=3600)
+            for message in sink.messages[seen:]:
+                print(f"📨 {message['mail_from']} -> {', '.join(message['rcpt_to'])}: "
+                      f"{message['message']['Subject']}")
+            seen = len(sink.messages)
+    except KeyboardInterrupt:
+        sink.stop()
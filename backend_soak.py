@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Soak test for the Espaço Braite API
+Repeats the backend_test.py suite at a steady rate for hours while sampling the
+server's GET /diagnostics, then fits a trend to each resource and fails the run
+when one keeps growing (memory, file descriptors, pg connections, browsers)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+
+import requests
+
+import backend_metrics
+import backend_test as bt
+
+MB = 1024 * 1024
+
+# Resource series: name -> (unit, value from a GET /diagnostics payload)
+SERIES = {
+    "rss_mb": ("MB", lambda d: d["process"]["rss"] / MB if d["process"].get("rss") is not None else None),
+    "heap_used_mb": ("MB", lambda d: d["process"]["heapUsed"] / MB if "heapUsed" in d["process"] else None),
+    "open_fds": ("fds", lambda d: d["process"].get("openFds")),
+    "db_connections": ("conns", lambda d: d["db"]["total"] if d.get("db") else None),
+    "db_waiting": ("clients", lambda d: d["db"]["waiting"] if d.get("db") else None),
+    "pdf_browsers": ("browsers", lambda d: d["pdf"].get("openBrowsers")),
+    "email_transporters": ("transporters", lambda d: d.get("email", {}).get("transportersCreated")),
+}
+
+# Server process tree (Node + Chromium), sampled from /proc when the server is local
+TREE_RSS_SERIES = "tree_rss_mb"
+
+# Largest tolerated growth per hour after warmup; other series are only reported
+DEFAULT_MAX_SLOPES = {
+    "rss_mb": 20.0,
+    "tree_rss_mb": 50.0,
+    "open_fds": 10.0,
+    "db_connections": 1.0,
+    "pdf_browsers": 1.0,
+    "email_transporters": 1.0,
+}
+
+# ============ SAMPLING ============
+
+def scrape_diagnostics():
+    """GET /diagnostics with the operator token, or None without one or if the server doesn't answer it"""
+    if not bt.METRICS_TOKEN:
+        return None
+    try:
+        # Straight through the session so samples don't show up in the latency report
+        response = bt.get_session().get(f"{bt.API_BASE}/diagnostics",
+                                        headers={"Authorization": f"Bearer {bt.METRICS_TOKEN}"},
+                                        timeout=bt.REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.json()
+
+class DiagnosticsSampler:
+    """Scrapes GET /diagnostics every interval seconds on a background thread"""
+
+    def __init__(self, interval, server_pid=None):
+        self.interval = interval
+        self.server_pid = server_pid
+        self.samples = []
+        self.missed = 0
+        self.restarts = 0
+        self._pid = None
+        self._start = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        elapsed = time.perf_counter() - self._start
+        diagnostics = scrape_diagnostics()
+        if diagnostics is None:
+            self.missed += 1
+            return
+        pid = diagnostics["process"].get("pid")
+        if self._pid is not None and pid != self._pid:
+            # A restarted server resets every series; a trend across it means nothing
+            self.restarts += 1
+        self._pid = pid
+        sample = {"elapsed_s": elapsed, "pid": pid}
+        for name, (_, extract) in SERIES.items():
+            sample[name] = extract(diagnostics)
+        if self.server_pid:
+            rss = backend_metrics.process_tree_rss(self.server_pid)
+            sample[TREE_RSS_SERIES] = rss / MB if rss is not None else None
+        self.samples.append(sample)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+# ============ TRENDS ============
+
+def compute_trends(samples, warmup, max_slopes):
+    """
+    Per-series growth per hour over the samples taken after warmup seconds
+    (startup, JIT and cache fill look like leaks otherwise). Returns
+    {name: {...}} with first/last/max, the slope and whether it broke its limit.
+    """
+    steady = [sample for sample in samples if sample["elapsed_s"] >= warmup]
+    names = list(SERIES) + ([TREE_RSS_SERIES] if any(TREE_RSS_SERIES in s for s in samples) else [])
+    trends = {}
+    for name in names:
+        values = [sample.get(name) for sample in steady if sample.get(name) is not None]
+        if not values:
+            continue
+        slope = backend_metrics.linear_slope([(sample["elapsed_s"], sample.get(name)) for sample in steady])
+        per_hour = slope * 3600 if slope is not None else None
+        limit = max_slopes.get(name)
+        trends[name] = {
+            "first": values[0],
+            "last": values[-1],
+            "max": max(values),
+            "slope_per_hour": per_hour,
+            "max_slope_per_hour": limit,
+            "leak": limit is not None and per_hour is not None and per_hour > limit,
+        }
+    return trends
+
+def print_trends(trends, samples_used, hours):
+    units = {name: unit for name, (unit, _) in SERIES.items()} | {TREE_RSS_SERIES: "MB"}
+    print(f"\n📉 Resource trends over {samples_used} samples ({hours:.2f}h after warmup)")
+    print(f"{'Series':<20}{'First':>10}{'Last':>10}{'Max':>10}{'Slope/h':>11}{'Limit/h':>10}")
+    for name, trend in trends.items():
+        slope = trend["slope_per_hour"]
+        limit = trend["max_slope_per_hour"]
+        status = "❌" if trend["leak"] else "✅" if limit is not None else "  "
+        print(f"{name:<20}{trend['first']:>10.1f}{trend['last']:>10.1f}{trend['max']:>10.1f}"
+              f"{slope if slope is not None else float('nan'):>+11.2f}"
+              f"{limit if limit is not None else float('nan'):>10.1f} {status} {units[name]}")
+
+# ============ DRIVER ============
+
+def parse_duration(value):
+    """'90', '90s', '30m' or '4h' -> seconds"""
+    scale = {"s": 1, "m": 60, "h": 3600}.get(value[-1:].lower())
+    try:
+        return float(value[:-1]) * scale if scale else float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid duration: {value}")
+
+def parse_slopes(value):
+    """Parse 'rss_mb=10,open_fds=5' into limits layered over DEFAULT_MAX_SLOPES"""
+    slopes = dict(DEFAULT_MAX_SLOPES)
+    for part in value.split(","):
+        name, _, limit = part.partition("=")
+        name = name.strip()
+        if name not in SERIES and name != TREE_RSS_SERIES:
+            raise argparse.ArgumentTypeError(f"Unknown series: {name}")
+        slopes[name] = float(limit)
+    return slopes
+
+def run_soak(duration, interval, sample_interval, warmup, max_slopes, concurrent=False):
+    """
+    Closed-loop soak: a suite run starts every interval seconds (straight away
+    if the previous one overran) until duration has passed. Returns
+    (iterations, failed iterations, sampler, trends).
+    """
+    print(f"🧪 Soak: suite every {interval:g}s for {duration / 3600:.2f}h, "
+          f"diagnostics every {sample_interval:g}s, {warmup:g}s warmup")
+    if scrape_diagnostics() is None:
+        print("⚠️  GET /diagnostics unavailable (needs BRAITE_METRICS_TOKEN); only client-side results will be reported")
+
+    iterations = failed = late = 0
+    with DiagnosticsSampler(sample_interval, bt.SERVER_PID) as sampler:
+        start = time.perf_counter()
+        next_at = start
+        while next_at < start + duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -1:
+                late += 1
+            iteration_start = time.perf_counter()
+            if concurrent:
+                results = asyncio.run(bt.run_tests_concurrent(bt.TESTS, bt.context))
+            else:
+                results = bt.run_tests_sequential(bt.TESTS, bt.context)
+            iterations += 1
+            passed = sum(1 for _, result in results if result)
+            if passed < len(results):
+                failed += 1
+            latest = sampler.samples[-1] if sampler.samples else {}
+            print(f"🔁 Iteration {iterations}: {passed}/{len(results)} passed in "
+                  f"{time.perf_counter() - iteration_start:.1f}s, "
+                  f"{(time.perf_counter() - start) / 60:.1f}m elapsed, "
+                  f"rss {latest.get('rss_mb') or 0:.0f}MB, fds {latest.get('open_fds') or 0}")
+            next_at += interval
+    elapsed = time.perf_counter() - start
+
+    if late:
+        print(f"⚠️  {late} suite runs started late; the suite takes longer than --interval")
+    if sampler.missed:
+        print(f"⚠️  {sampler.missed} diagnostics samples failed")
+    if sampler.restarts:
+        print(f"⚠️  Server restarted {sampler.restarts} times during the soak; trends span restarts")
+
+    trends = compute_trends(sampler.samples, warmup, max_slopes)
+    used = sum(1 for sample in sampler.samples if sample["elapsed_s"] >= warmup)
+    print_trends(trends, used, max(elapsed - warmup, 0) / 3600)
+    return iterations, failed, sampler, trends
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Espaço Braite API soak test")
+    parser.add_argument("--base-url", help="API host to soak (default: $BRAITE_BASE_URL or the preview host)")
+    parser.add_argument("--local", action="store_true", help="soak the in-process stub server instead")
+    parser.add_argument("--duration", type=parse_duration, default=parse_duration("4h"),
+                        help="how long to run, e.g. 45m or 8h (default 4h)")
+    parser.add_argument("--interval", type=parse_duration, default=60.0,
+                        help="start a suite run every INTERVAL (default 60s)")
+    parser.add_argument("--sample-interval", type=parse_duration, default=30.0,
+                        help="scrape GET /diagnostics every INTERVAL (default 30s)")
+    parser.add_argument("--warmup", type=parse_duration, default=parse_duration("10m"),
+                        help="ignore samples before this for trends (default 10m)")
+    parser.add_argument("--max-slope", type=parse_slopes, default=DEFAULT_MAX_SLOPES, metavar="SERIES=PER_HOUR,...",
+                        help="growth per hour that fails the run, e.g. rss_mb=10,open_fds=5")
+    parser.add_argument("--max-failed-iterations", type=int, default=0,
+                        help="suite runs allowed to have failing tests (default 0)")
+    parser.add_argument("--concurrent", action="store_true", help="run each suite as a concurrent dependency graph")
+    parser.add_argument("--json", metavar="PATH", help="write every sample and the fitted trends as JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    stub = None
+    if args.local:
+        import backend_stub_server
+        stub = backend_stub_server.StubServer()
+        bt.set_base_url(stub.start_in_thread())
+        # The stub serves from this process
+        bt.SERVER_PID = bt.SERVER_PID or os.getpid()
+        bt.METRICS_TOKEN = backend_stub_server.METRICS_TOKEN
+    elif args.base_url:
+        bt.set_base_url(args.base_url)
+    try:
+        iterations, failed, sampler, trends = run_soak(args.duration, args.interval, args.sample_interval,
+                                                       args.warmup, args.max_slope, args.concurrent)
+    finally:
+        if stub:
+            stub.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump({"samples": sampler.samples, "trends": trends}, fh, indent=2, sort_keys=True)
+            fh.write("\n")
+        print(f"📝 Soak samples written to {args.json}")
+
+    leaks = [name for name, trend in trends.items() if trend["leak"]]
+    print(f"\n🎯 {iterations} suite runs, {failed} with failures")
+    for name in leaks:
+        print(f"❌ {name} grows {trends[name]['slope_per_hour']:+.2f}/h "
+              f"(limit {trends[name]['max_slope_per_hour']:.2f}/h): likely leak")
+    if not trends:
+        print("⚠️  No diagnostics samples after warmup; nothing to judge leaks by")
+    elif not leaks:
+        print("✅ No resource grows faster than its limit")
+    raise SystemExit(1 if leaks or failed > args.max_failed_iterations else 0)
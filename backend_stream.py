@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Streaming helpers for large Espaço Braite API responses
+Incremental JSON decoding, keyset-paginated iteration and order export
+downloads, all with flat memory use
+"""
+
+import codecs
+import json
+import time
+
+import backend_test as bt
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_PAGE_LIMIT = 200
+
+_WHITESPACE = " \t\r\n"
+
+class JsonArrayStream:
+    """
+    Incrementally decode a top-level JSON object from byte chunks, yielding the
+    elements of one array field (e.g. "orders") as soon as each is complete.
+
+    Other top-level fields are decoded whole and collected in self.fields, so
+    small siblings like "nextCursor" are available once the stream is drained.
+    Only the element being decoded is held in memory, never the whole array.
+    """
+
+    def __init__(self, array_key):
+        self.array_key = array_key
+        self.fields = {}
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.chunks = None
+
+    def _fill(self):
+        """Append the next chunk to the buffer; False once the input is exhausted"""
+        for chunk in self.chunks:
+            if chunk:
+                # Drop consumed text so the buffer only holds the current token
+                self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk)
+                self.pos = 0
+                return True
+        tail = self.text_decoder.decode(b"", final=True)
+        if tail:
+            self.buffer = self.buffer[self.pos:] + tail
+            self.pos = 0
+            return True
+        return False
+
+    def _peek(self):
+        """Next non-whitespace character, reading more input as needed"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON stream")
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected {char!r} at offset {self.pos}, got {self.buffer[self.pos]!r}")
+        self.pos += 1
+
+    def _value(self):
+        """Decode one complete JSON value, reading more input until it parses"""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number could be cut mid-digits at the buffer edge; make sure it ended
+            if end == len(self.buffer) and isinstance(value, (int, float)) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _array_items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' in array, got {separator!r}")
+
+    def items(self, chunks):
+        """Yield elements of the array field from an iterable of byte chunks"""
+        self.chunks = iter(chunks)
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            if key == self.array_key and self._peek() == "[":
+                yield from self._array_items()
+            else:
+                self.fields[key] = self._value()
+            separator = self._peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or '}}' in object, got {separator!r}")
+
+# ============ PAGINATION ============
+
+def iter_pages(endpoint, key, limit=DEFAULT_PAGE_LIMIT, params=None, ctx=None):
+    """
+    Yield one generator of rows per page of a keyset-paginated listing
+    (GET /orders, GET /clients). Each page is streamed and decoded incrementally;
+    a page is drained automatically if the caller moves on before finishing it.
+    ctx is the backend_test.RunContext to authenticate as (default: the shared one).
+    """
+    cursor = None
+    while True:
+        page_params = {**bt.get_tenant_params(ctx), **(params or {}), "limit": limit}
+        if cursor:
+            page_params["after"] = cursor
+        response = bt.make_request("GET", endpoint, headers=bt.get_auth_headers(ctx),
+                                   params=page_params, stream=True)
+        if response is None or response.status_code != 200:
+            status = response.status_code if response is not None else "No response"
+            raise RuntimeError(f"GET {endpoint} page failed: {status}")
+
+        stream = JsonArrayStream(key)
+        rows = stream.items(response.iter_content(chunk_size=CHUNK_SIZE))
+        try:
+            yield rows
+            for _ in rows:
+                pass
+        finally:
+            response.close()
+
+        cursor = stream.fields.get("nextCursor")
+        if not cursor:
+            return
+
+def iter_items(endpoint, key, limit=DEFAULT_PAGE_LIMIT, params=None, ctx=None):
+    """Yield every row of a paginated listing, one at a time"""
+    for page in iter_pages(endpoint, key, limit, params, ctx):
+        yield from page
+
+# ============ EXPORT ============
+
+def download_export(path, export_format="csv", paid_from=None, paid_to=None, ctx=None,
+                    chunk_size=CHUNK_SIZE, retries=3):
+    """
+    Stream GET /orders/export into the file at path one chunk at a time, so
+    only a single chunk is ever held in memory. A 429 (all export slots busy)
+    is retried after its Retry-After, up to `retries` times.
+
+    Returns {"status", "bytes", "lines", "ttfb_s", "elapsed_s"} ("error" holds
+    the body of a refused export), or None without a response. A transfer the
+    server cuts short raises requests' ChunkedEncodingError, leaving a partial file.
+    """
+    params = {**bt.get_tenant_params(ctx), "format": export_format}
+    if paid_from:
+        params["paid_from"] = paid_from
+    if paid_to:
+        params["paid_to"] = paid_to
+
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        response = bt.make_request("GET", "/orders/export", headers=bt.get_auth_headers(ctx),
+                                   params=params, stream=True)
+        if response is None:
+            return None
+        if response.status_code != 429 or attempt == retries:
+            break
+        response.close()
+        time.sleep(float(response.headers.get("Retry-After", "1")))
+
+    result = {"status": response.status_code, "bytes": 0, "lines": 0, "ttfb_s": None, "elapsed_s": None}
+    try:
+        if response.status_code != 200:
+            result["error"] = response.text[:200]
+            return result
+        with open(path, "wb") as fh:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if result["ttfb_s"] is None:
+                    result["ttfb_s"] = time.perf_counter() - start
+                fh.write(chunk)
+                result["bytes"] += len(chunk)
+                result["lines"] += chunk.count(b"\n")
+    finally:
+        response.close()
+    result["elapsed_s"] = time.perf_counter() - start
+    return result
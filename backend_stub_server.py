@@ -0,0 +1,1273 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Espaço Braite API
+Asyncio HTTP/1.1 server implementing the contract backend_test.py asserts on,
+with in-memory per-tenant storage and configurable latency/failure injection
+"""
+
+import argparse
+import asyncio
+import base64
+import contextvars
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import re
+import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import brotli
+except ImportError:  # optional: without it the stub only offers gzip
+    brotli = None
+
+JWT_SECRET = b"dev-secret-change-in-production"
+JWT_REFRESH_SECRET = b"dev-refresh-secret-change-in-production"
+# Bearer token of the operator routes (route.js: METRICS_TOKEN); tenant logins don't open them
+METRICS_TOKEN = "dev-metrics-token"
+OPERATOR_ROUTES = ("metrics", "diagnostics")
+# Headers of the request being handled, for the few handlers that read one
+request_headers = contextvars.ContextVar("request_headers", default={})
+ACCESS_TOKEN_TTL = 15 * 60
+REFRESH_TOKEN_TTL = 7 * 24 * 60 * 60
+
+# America/Sao_Paulo has had no DST since 2019
+SAO_PAULO = timezone(timedelta(hours=-3))
+
+PERMISSIONS = {
+    "owner": {"create", "read", "update", "delete", "manage_team", "manage_settings"},
+    "manager": {"create", "read", "update", "delete", "manage_team"},
+    "attendant": {"create", "read", "update"},
+    "viewer": {"read"},
+}
+
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+# Same threshold and brotli quality as lib/compression.js
+COMPRESSION_MIN_BYTES = 1024
+BROTLI_QUALITY = 4
+
+# Columns GET /orders, /dashboard (recentOrders) and /clients accept in ?fields=, like route.js
+ORDER_LIST_FIELDS = {"id", "tenant_id", "client_id", "order_number", "status", "total_amount", "payment_method",
+                     "paid_at", "notes", "created_by", "created_at", "updated_at", "client_name", "vehicle_plate"}
+CLIENT_LIST_FIELDS = {"id", "tenant_id", "name", "phone", "email", "vehicle_plate", "vehicle_model", "notes",
+                      "created_at", "updated_at"}
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Email outbox, same defaults as lib/email.js
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE = 10.0
+OUTBOX_RETRY_MAX = 3600.0
+SMTP_FROM = "noreply@espacobraite.com"
+
+# Login token buckets, same defaults as route.js: (burst, refills per minute)
+LOGIN_IP_LIMIT = (20, 10)
+LOGIN_USER_LIMIT = (5, 5)
+
+# Order export, same defaults and columns as lib/export.js
+EXPORT_FORMATS = ("csv", "ndjson")
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CONCURRENCY = 2
+EXPORT_ORDER_COLUMNS = ("order_number", "status", "created_at", "paid_at", "payment_method", "total_amount",
+                        "client_name", "client_phone", "vehicle_plate", "vehicle_model", "notes")
+EXPORT_ITEM_COLUMNS = ("service_name", "price", "quantity")
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+# ============ TOKENS ============
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64url_decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def sign_token(payload, secret, ttl):
+    """HS256 JWT, same claims shape as jsonwebtoken.sign in lib/auth.js"""
+    now = int(time.time())
+    header = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    body = _b64url(json.dumps({**payload, "iat": now, "exp": now + ttl}).encode())
+    signature = hmac.new(secret, f"{header}.{body}".encode(), hashlib.sha256).digest()
+    return f"{header}.{body}.{_b64url(signature)}"
+
+def verify_token(token, secret):
+    try:
+        header, body, signature = token.split(".")
+        expected = hmac.new(secret, f"{header}.{body}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(_b64url_decode(signature), expected):
+            return None
+        payload = json.loads(_b64url_decode(body))
+    except (ValueError, json.JSONDecodeError):
+        return None
+    if payload.get("exp", 0) < time.time():
+        return None
+    return payload
+
+# ============ RATE LIMITING ============
+
+class TokenBucketLimiter:
+    """Per-key token buckets like lib/ratelimit.js; take()/peek() return seconds to wait (0 = allowed)"""
+
+    def __init__(self, burst, per_minute):
+        self.burst = burst
+        self.rate = per_minute / 60
+        self.buckets = {}  # key -> (tokens, updated monotonic)
+        self.limited = 0
+
+    def refill(self, key):
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        self.buckets[key] = (tokens, now)
+        return tokens
+
+    def peek(self, key):
+        if self.burst <= 0 or self.rate <= 0:
+            return 0
+        tokens = self.refill(key)
+        if tokens >= 1:
+            return 0
+        self.limited += 1
+        return math.ceil((1 - tokens) / self.rate)
+
+    def take(self, key):
+        wait = self.peek(key)
+        if wait == 0 and key in self.buckets:
+            tokens, updated = self.buckets[key]
+            self.buckets[key] = (tokens - 1, updated)
+        return wait
+
+    def give_back(self, key):
+        """Return a token taken for key (the attempt turned out not to count)"""
+        if self.burst <= 0 or self.rate <= 0:
+            return
+        tokens = self.refill(key)
+        self.buckets[key] = (min(self.burst, tokens + 1), self.buckets[key][1])
+
+    def stats(self):
+        return {"keys": len(self.buckets), "limited": self.limited}
+
+# ============ EMAIL OUTBOX ============
+
+class EmailOutbox:
+    """
+    Background delivery like lib/email.js: handlers only enqueue, and a worker
+    thread sends due emails in batches over one SMTP connection, retrying
+    failures with exponential backoff. Without an SMTP (host, port) emails are
+    marked sent straight away (the server falls back to Ethereal instead).
+    """
+
+    def __init__(self, smtp=None):
+        self.smtp = smtp
+        self.emails = OrderedDict()  # id -> email_outbox row
+        # One SMTP connection per batch here; the server's single pooled transporter shows as transportersCreated
+        self.counters = {"transportersCreated": 1 if smtp else 0, "connections": 0, "batches": 0,
+                         "sent": 0, "retried": 0, "failed": 0}
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, name="stub-outbox", daemon=True)
+        self.thread.start()
+
+    def enqueue(self, tenant_id, to, subject, html):
+        email_id = str(uuid.uuid4())
+        with self.condition:
+            self.emails[email_id] = {
+                "id": email_id, "tenant_id": tenant_id, "to_address": to, "from_address": SMTP_FROM,
+                "subject": subject, "html": html, "status": "pending", "attempts": 0,
+                "next_attempt_at": time.monotonic(), "last_error": None, "sent_at": None,
+            }
+            self.condition.notify()
+        return email_id
+
+    def due(self):
+        now = time.monotonic()
+        batch = [email for email in self.emails.values()
+                 if email["status"] == "pending" and email["next_attempt_at"] <= now]
+        return batch[:OUTBOX_BATCH_SIZE]
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped and not self.due():
+                    pending = [email["next_attempt_at"] for email in self.emails.values()
+                               if email["status"] == "pending"]
+                    self.condition.wait(max(min(pending) - time.monotonic(), 0) if pending else None)
+                if self.stopped:
+                    return
+                batch = self.due()
+                for email in batch:
+                    email["attempts"] += 1
+                    # Claimed: not due again until delivered or rescheduled
+                    email["next_attempt_at"] = float("inf")
+            self.send_batch(batch)
+
+    def send_batch(self, batch):
+        self.counters["batches"] += 1
+        try:
+            connection = smtplib.SMTP(*self.smtp, timeout=10) if self.smtp else None
+        except (OSError, smtplib.SMTPException) as e:
+            for email in batch:
+                self.record_failure(email, e)
+            return
+        self.counters["connections"] += connection is not None
+        try:
+            for email in batch:
+                try:
+                    if connection:
+                        message = EmailMessage()
+                        message["From"], message["To"] = email["from_address"], email["to_address"]
+                        message["Subject"] = email["subject"]
+                        message.set_content(email["html"], subtype="html")
+                        connection.send_message(message)
+                except (OSError, smtplib.SMTPException) as e:
+                    self.record_failure(email, e)
+                    continue
+                with self.condition:
+                    email.update(status="sent", sent_at=now_iso(), last_error=None)
+                    self.counters["sent"] += 1
+        finally:
+            if connection:
+                try:
+                    connection.quit()
+                except (OSError, smtplib.SMTPException):
+                    pass
+
+    def record_failure(self, email, error):
+        with self.condition:
+            failed = email["attempts"] >= OUTBOX_MAX_ATTEMPTS
+            email["status"] = "failed" if failed else "pending"
+            email["last_error"] = str(error)
+            email["next_attempt_at"] = time.monotonic() + min(OUTBOX_RETRY_BASE * 2 ** (email["attempts"] - 1),
+                                                              OUTBOX_RETRY_MAX)
+            self.counters["failed" if failed else "retried"] += 1
+
+    def stats(self):
+        with self.condition:
+            return {**self.counters, "pending": sum(1 for email in self.emails.values()
+                                                    if email["status"] == "pending")}
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join(timeout=5)
+
+# ============ STORAGE ============
+
+def csv_field(value):
+    """One CSV cell, like csvField() in lib/export.js (formula-looking text gets a leading quote)"""
+    if value is None:
+        return ""
+    text = str(value)
+    if text[:1] in ("=", "+", "-", "@", "\t", "\r") and not re.fullmatch(r"[+-]?[\d\s().-]+", text):
+        text = "'" + text
+    if any(char in text for char in '",\r\n'):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def valid_date(value):
+    if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+        return False
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return False
+    return True
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def money(value):
+    """Postgres DECIMAL columns come back from pg as strings"""
+    return f"{float(value):.2f}"
+
+class TenantData:
+    """Rows for one tenant, indexed by id (dicts keep insertion = created_at order)"""
+
+    def __init__(self, row):
+        self.row = row
+        self.members = {}  # user_id -> {"role", "created_at"}
+        self.clients = {}
+        self.services = {}
+        self.orders = {}
+        self.order_items = {}  # order_id -> [items]
+        self.invites = []
+        self.last_order_number = 0  # order_counters.last_number
+        self.versions = {"catalog": 0, "team": 0}  # resource_versions
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {}
+        self.users_by_login = {}
+        self.tenants = {}
+
+    def add_tenant(self, name, slug, primary_color="#0071CE", logo_url="/assets/logo/teste.png"):
+        tenant_id = str(uuid.uuid4())
+        self.tenants[tenant_id] = TenantData({
+            "id": tenant_id, "name": name, "slug": slug,
+            "primary_color": primary_color, "logo_url": logo_url,
+        })
+        return tenant_id
+
+    def add_user(self, username, email, password, full_name, memberships):
+        user_id = str(uuid.uuid4())
+        self.users[user_id] = {
+            "id": user_id, "email": email, "username": username,
+            "full_name": full_name, "password": password,
+        }
+        self.users_by_login[username] = user_id
+        self.users_by_login[email] = user_id
+        for tenant_id, role in memberships:
+            self.tenants[tenant_id].members[user_id] = {"role": role, "created_at": now_iso()}
+        return user_id
+
+    def user_with_tenants(self, user_id):
+        """Mirror of getUserWithTenants in lib/auth.js"""
+        user = self.users.get(user_id)
+        if not user:
+            return None
+        tenants = [
+            {
+                "tenant_id": tenant.row["id"], "tenant_name": tenant.row["name"],
+                "tenant_slug": tenant.row["slug"], "role": tenant.members[user_id]["role"],
+                "primary_color": tenant.row["primary_color"], "logo_url": tenant.row["logo_url"],
+            }
+            for tenant in self.tenants.values() if user_id in tenant.members
+        ]
+        return {key: user[key] for key in ("id", "email", "username", "full_name")} | {"tenants": tenants}
+
+def seed_store(tenant_count=1):
+    """Same demo data as lib/seed.js; extra tenants get their own owner users"""
+    store = Store()
+    for index in range(tenant_count):
+        suffix = "" if index == 0 else f"-{index + 1}"
+        tenant_id = store.add_tenant(f"Espaço Braite Demo{suffix}", f"espaco-braite-demo{suffix}")
+        tenant = store.tenants[tenant_id]
+        username = f"admin{index + 1}"
+        user_id = store.add_user(username, f"{username}@braite.test", "123", "Admin Braite",
+                                 [(tenant_id, "owner")])
+        for name, description, price, duration in [
+            ("Lavagem Completa", "Lavagem externa e interna", 50.00, 60),
+            ("Lavagem Simples", "Lavagem externa", 30.00, 30),
+            ("Polimento", "Polimento e cristalização", 150.00, 180),
+            ("Enceramento", "Enceramento com cera premium", 80.00, 90),
+            ("Higienização Interna", "Limpeza profunda dos estofados", 120.00, 120),
+        ]:
+            service_id = str(uuid.uuid4())
+            tenant.services[service_id] = {
+                "id": service_id, "tenant_id": tenant_id, "name": name, "description": description,
+                "price": money(price), "duration_minutes": duration, "active": True,
+                "created_at": now_iso(), "updated_at": now_iso(),
+            }
+        client_id = str(uuid.uuid4())
+        tenant.clients[client_id] = {
+            "id": client_id, "tenant_id": tenant_id, "name": "João Silva", "phone": "(11) 98765-4321",
+            "email": "joao@example.com", "vehicle_plate": "ABC-1234", "vehicle_model": "Honda Civic 2020",
+            "notes": None, "created_at": now_iso(), "updated_at": now_iso(),
+        }
+        order_id = str(uuid.uuid4())
+        tenant.orders[order_id] = {
+            "id": order_id, "tenant_id": tenant_id, "client_id": client_id,
+            "order_number": f"OS-{int(time.time() * 1000)}-{index}", "status": "paid",
+            "total_amount": money(80), "payment_method": "Dinheiro", "paid_at": now_iso(),
+            "notes": None, "created_by": user_id, "created_at": now_iso(), "updated_at": now_iso(),
+        }
+        tenant.order_items[order_id] = [
+            {"id": str(uuid.uuid4()), "order_id": order_id, "catalog_item_id": None,
+             "service_name": "Lavagem Completa", "price": money(50), "quantity": 1, "created_at": now_iso()},
+            {"id": str(uuid.uuid4()), "order_id": order_id, "catalog_item_id": None,
+             "service_name": "Lavagem Simples", "price": money(30), "quantity": 1, "created_at": now_iso()},
+        ]
+    return store
+
+# ============ PDF ============
+
+def render_pdf(order, items):
+    """Minimal single-page PDF so clients can assert on content type and size"""
+    lines = [f"Ordem de Servico #{order['order_number']}", f"Status: {order['status']}"]
+    lines += [f"{item['service_name']} x{item['quantity']} R$ {item['price']}" for item in items]
+    lines.append(f"TOTAL: R$ {order['total_amount']}")
+    text = "BT /F1 12 Tf 40 800 Td 16 TL " + " ".join(
+        "(" + line.encode("latin-1", "replace").decode("latin-1").replace("(", "[").replace(")", "]") + ") '"
+        for line in lines
+    ) + " ET"
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(text) + text.encode("latin-1") + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+# ============ API ============
+
+class StubApi:
+    """Request handlers mirroring app/api/[[...path]]/route.js"""
+
+    # Rendered PDFs kept per content hash, like lib/pdf.js (entries, not bytes: stub PDFs are tiny)
+    PDF_CACHE_MAX_ENTRIES = 256
+
+    def __init__(self, store, smtp=None):
+        self.store = store
+        self.outbox = EmailOutbox(smtp)
+        self.pdf_cache = OrderedDict()  # content hash -> (pdf, order_id, client_id)
+        self.started_at = now_iso()
+        self.started_monotonic = time.monotonic()
+        self.login_ip_limiter = TokenBucketLimiter(*LOGIN_IP_LIMIT)
+        self.login_user_limiter = TokenBucketLimiter(*LOGIN_USER_LIMIT)
+        self.export_lock = threading.Lock()
+        self.exports_running = 0
+
+    def handle(self, method, path, query, headers, body, client_ip="unknown", timings=None):
+        """
+        Return (status, payload, extra headers); payload is a dict or bytes.
+        Phase durations (ms) for Server-Timing are added to timings if given.
+        """
+        timings = {} if timings is None else timings
+        if path.startswith("/api"):
+            path = path[len("/api"):]
+        parts = [part for part in path.split("/") if part]
+
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "timestamp": now_iso()}, {}
+        if method == "POST" and path == "/auth/login":
+            return self.login(self.parse_json(body), self.client_ip(headers, client_ip))
+        if method == "POST" and path == "/auth/refresh":
+            return self.refresh(self.parse_json(body))
+        if method == "GET" and parts and parts[0] in OPERATOR_ROUTES:
+            self.authenticate_operator(headers)
+            with self.store.lock:
+                return getattr(self, f"get_{parts[0]}")()
+
+        auth_start = time.perf_counter()
+        try:
+            user = self.authenticate(headers)
+        finally:
+            timings["auth"] = (time.perf_counter() - auth_start) * 1000
+        # Like route.js, GET/DELETE handlers read their parameters from the query string
+        data = self.parse_json(body) if method in ("POST", "PUT") else query
+        tenant = self.tenant_for(user, data.get("tenant_id") or query.get("tenant_id"))
+        role = tenant.members[user["id"]]["role"]
+
+        with self.store.lock:
+            handler = getattr(self, f"{method.lower()}_{parts[0] if parts else ''}", None)
+            if handler is None:
+                raise HttpError(404, "Route not found")
+            request_headers.set(headers)
+            status, payload, extra = handler(user, tenant, role, parts[1:], data)
+        etag = extra.get("ETag")
+        if method == "GET" and status == 200 and etag and self.etag_matches(headers.get("if-none-match"), etag):
+            return 304, b"", {key: value for key, value in extra.items() if key in ("ETag", "Cache-Control")}
+        return status, payload, extra
+
+    # ---- helpers ----
+
+    @staticmethod
+    def etag_matches(if_none_match, etag):
+        """Weak comparison, like etagMatches() in route.js"""
+        if not if_none_match:
+            return False
+        opaque = etag.removeprefix("W/")
+        return any(tag.strip() == "*" or tag.strip().removeprefix("W/") == opaque
+                   for tag in if_none_match.split(","))
+
+    def cached_pdf(self, tenant, order, items, bypass=False):
+        """
+        (pdf, etag, cache status) for an order, rendering only on a content-hash
+        miss or with bypass, like getOrRenderPdf() in lib/pdf.js. Requests run one
+        at a time under the store lock, so there is never a render to share.
+        """
+        client = tenant.clients.get(order["client_id"]) or {}
+        content = [order, items, {key: client.get(key) for key in ("name", "phone", "vehicle_plate", "vehicle_model")},
+                   {key: tenant.row.get(key) for key in ("name", "logo_url", "primary_color")}]
+        key = hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+        if key in self.pdf_cache and not bypass:
+            self.pdf_cache.move_to_end(key)
+            return self.pdf_cache[key][0], f'"{key}"', "HIT"
+        pdf = render_pdf(order, items)
+        self.pdf_cache[key] = (pdf, order["id"], order["client_id"])
+        self.pdf_cache.move_to_end(key)
+        while len(self.pdf_cache) > self.PDF_CACHE_MAX_ENTRIES:
+            self.pdf_cache.popitem(last=False)
+        return pdf, f'"{key}"', "BYPASS" if bypass else "MISS"
+
+    def invalidate_pdfs(self, order_id=None, client_id=None):
+        for key, (_, cached_order, cached_client) in list(self.pdf_cache.items()):
+            if (order_id and cached_order == order_id) or (client_id and cached_client == client_id):
+                del self.pdf_cache[key]
+
+    @staticmethod
+    def client_ip(headers, peer):
+        """Last X-Forwarded-For hop (one trusted proxy, like route.js), else the socket peer"""
+        forwarded = [hop.strip() for hop in headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        return forwarded[-1] if forwarded else headers.get("x-real-ip") or peer
+
+    @staticmethod
+    def parse_json(body):
+        if not body:
+            return {}
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError:
+            raise HttpError(400, "Invalid JSON body")
+
+    def authenticate(self, headers):
+        auth = headers.get("authorization", "")
+        if not auth.startswith("Bearer "):
+            raise HttpError(401, "No authentication token provided")
+        decoded = verify_token(auth[7:], JWT_SECRET)
+        if not decoded:
+            raise HttpError(401, "Invalid or expired token")
+        user = self.store.user_with_tenants(decoded["userId"])
+        if not user:
+            raise HttpError(404, "User not found")
+        return user
+
+    @staticmethod
+    def authenticate_operator(headers):
+        given = headers.get("authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(given.encode(), METRICS_TOKEN.encode()):
+            raise HttpError(401, "Invalid operator token")
+
+    def tenant_for(self, user, tenant_id):
+        tenants = user["tenants"]
+        if not tenant_id:
+            match = tenants[0] if tenants else None
+        else:
+            match = next((t for t in tenants if t["tenant_id"] == tenant_id), None)
+        if not match:
+            raise HttpError(403, "No tenant access")
+        return self.store.tenants[match["tenant_id"]]
+
+    @staticmethod
+    def require(role, action):
+        if action not in PERMISSIONS.get(role, ()):
+            raise HttpError(403, "Permission denied")
+
+    @staticmethod
+    def with_client(order, tenant, *columns):
+        client = tenant.clients.get(order["client_id"]) or {}
+        extra = {f"client_{column}" if column in ("name", "phone") else column: client.get(column)
+                 for column in columns}
+        return {**order, **extra}
+
+    @staticmethod
+    def projection(params, allowed):
+        """Requested ?fields= (id first, the rest sorted like route.js), or None for every column"""
+        if "fields" not in params:
+            return None
+        requested = {field.strip() for field in params["fields"].split(",") if field.strip()} - {"id"}
+        fields = ["id"] + sorted(requested)
+        unknown = [field for field in fields if field not in allowed]
+        if unknown:
+            raise HttpError(400, f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    @staticmethod
+    def project(rows, fields):
+        if fields is None:
+            return rows
+        return [{field: row.get(field) for field in fields} for row in rows]
+
+    @staticmethod
+    def paginate(rows, params, key):
+        """Keyset pagination on (created_at, id) DESC, same cursor format as route.js"""
+        if "limit" not in params and "after" not in params:
+            return 200, {key: list(reversed(rows))}, {}
+        try:
+            limit = min(max(int(params.get("limit") or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            limit = DEFAULT_PAGE_SIZE
+        ordered = sorted(rows, key=lambda row: (row["created_at"], row["id"]), reverse=True)
+        if params.get("after"):
+            try:
+                created_at, row_id = json.loads(_b64url_decode(params["after"]))
+            except (ValueError, TypeError):
+                raise HttpError(400, "Invalid cursor")
+            ordered = [row for row in ordered if (row["created_at"], row["id"]) < (created_at, row_id)]
+        page = ordered[:limit]
+        next_cursor = None
+        if len(ordered) > limit:
+            next_cursor = _b64url(json.dumps([page[-1]["created_at"], page[-1]["id"]]).encode())
+        return 200, {"nextCursor": next_cursor, key: page}, {}
+
+    # ---- auth ----
+
+    def login(self, data, client_ip):
+        username, password = data.get("username"), data.get("password")
+        if not username or not password:
+            raise HttpError(400, "Username and password required")
+        # Every attempt counts against the IP, only failures against the account
+        # (keyed by user id, so username and email share it), as in route.js
+        wait = self.login_ip_limiter.take(client_ip)
+        if wait:
+            raise HttpError(429, "Too many login attempts, try again later", {"Retry-After": str(wait)})
+        user_id = self.store.users_by_login.get(username)
+        user_key = f"user:{user_id}" if user_id else f"login:{str(username).lower()}"
+        # Reserve the guess before checking it; a correct password gives it back.
+        # An empty bucket refuses the correct password too, as in route.js
+        wait = self.login_user_limiter.take(user_key)
+        if wait:
+            raise HttpError(429, "Too many failed login attempts for this user, try again later",
+                            {"Retry-After": str(wait)})
+        if not user_id or self.store.users[user_id]["password"] != password:
+            raise HttpError(401, "Invalid credentials")
+        self.login_user_limiter.give_back(user_key)
+        return 200, {
+            "user": self.store.user_with_tenants(user_id),
+            "accessToken": sign_token({"userId": user_id}, JWT_SECRET, ACCESS_TOKEN_TTL),
+            "refreshToken": sign_token({"userId": user_id}, JWT_REFRESH_SECRET, REFRESH_TOKEN_TTL),
+        }, {}
+
+    def refresh(self, data):
+        if not data.get("refreshToken"):
+            raise HttpError(400, "Refresh token required")
+        decoded = verify_token(data["refreshToken"], JWT_REFRESH_SECRET)
+        if not decoded:
+            raise HttpError(401, "Invalid refresh token")
+        return 200, {"accessToken": sign_token({"userId": decoded["userId"]}, JWT_SECRET, ACCESS_TOKEN_TTL)}, {}
+
+    # ---- GET ----
+
+    def get_metrics(self):
+        # Same shape as route.js; the stub runs no SQL, so there are no statements to report
+        return 200, {
+            "queries": {"since": self.started_at, "sampleRate": 0, "slowMs": 200,
+                        "prepared": {"enabled": False, "registered": 0, "max": 200, "maxPerFamily": 16,
+                                     "overflow": 0},
+                        "statements": []},
+            "pdf": {"cache": {"size": len(self.pdf_cache), "max": self.PDF_CACHE_MAX_ENTRIES}},
+            "login": {"ipLimiter": self.login_ip_limiter.stats(), "userLimiter": self.login_user_limiter.stats()},
+        }, {}
+
+    def get_diagnostics(self):
+        # Same shape as route.js, describing this process; there is no pg pool or browser here
+        try:
+            with open("/proc/self/statm") as f:
+                rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            open_fds = len(os.listdir("/proc/self/fd"))
+        except OSError:
+            rss, open_fds = None, None
+        return 200, {
+            "sampledAt": now_iso(),
+            "process": {"pid": os.getpid(), "uptimeSec": time.monotonic() - self.started_monotonic,
+                        "rss": rss, "openFds": open_fds},
+            "db": None,
+            "pdf": {"active": 0, "queued": 0, "openBrowsers": 0},
+            "email": self.outbox.stats(),
+        }, {}
+
+    def get_me(self, user, tenant, role, rest, data):
+        return 200, {"user": user}, {}
+
+    def get_dashboard(self, user, tenant, role, rest, data):
+        now = datetime.now(timezone.utc)
+        today = now.astimezone(SAO_PAULO).date()
+        revenue = {"today": 0.0, "last15Days": 0.0, "last30Days": 0.0}
+        for order in tenant.orders.values():
+            if order["status"] != "paid" or not order["paid_at"]:
+                continue
+            # Calendar-day windows in local time, like the daily_revenue rollup
+            age = (today - datetime.fromisoformat(order["paid_at"]).astimezone(SAO_PAULO).date()).days
+            amount = float(order["total_amount"])
+            if age == 0:
+                revenue["today"] += amount
+            if 0 <= age < 15:
+                revenue["last15Days"] += amount
+            if 0 <= age < 30:
+                revenue["last30Days"] += amount
+        recent = [self.with_client(order, tenant, "name", "vehicle_plate")
+                  for order in list(reversed(tenant.orders.values()))[:10]]
+        fields = self.projection(data, ORDER_LIST_FIELDS)
+        return 200, {"revenue": revenue, "recentOrders": self.project(recent, fields)}, {}
+
+    def get_clients(self, user, tenant, role, rest, data):
+        fields = self.projection(data, CLIENT_LIST_FIELDS)
+        status, payload, extra = self.paginate(list(tenant.clients.values()), data, "clients")
+        payload["clients"] = self.project(payload["clients"], fields)
+        return status, payload, extra
+
+    @staticmethod
+    def version_headers(tenant, resource):
+        """ETag from the tenant's resource version, like versionETag() in route.js"""
+        return {"ETag": f'W/"{resource}-{tenant.row["id"]}-{tenant.versions[resource]}"',
+                "Cache-Control": "private, no-cache"}
+
+    def get_services(self, user, tenant, role, rest, data):
+        services = sorted(tenant.services.values(), key=lambda row: row["name"])
+        return 200, {"services": services}, self.version_headers(tenant, "catalog")
+
+    def get_orders(self, user, tenant, role, rest, data):
+        if not rest:
+            fields = self.projection(data, ORDER_LIST_FIELDS)
+            orders = [self.with_client(order, tenant, "name", "vehicle_plate")
+                      for order in tenant.orders.values()]
+            status, payload, extra = self.paginate(orders, data, "orders")
+            payload["orders"] = self.project(payload["orders"], fields)
+            return status, payload, extra
+        if rest == ["export"]:
+            return self.export_orders(tenant, data)
+        order = tenant.orders.get(rest[0])
+        if not order:
+            raise HttpError(404, "Order not found")
+        items = tenant.order_items.get(order["id"], [])
+        if rest[1:] == ["pdf"]:
+            start = time.perf_counter()
+            bypass = request_headers.get().get("x-pdf-cache") == "bypass"
+            pdf, etag, cache_status = self.cached_pdf(tenant, order, items, bypass)
+            return 200, pdf, {
+                "ETag": etag,
+                "Cache-Control": "private, no-cache",
+                "Content-Type": "application/pdf",
+                "Content-Disposition": f'attachment; filename="OS-{order["id"]}.pdf"',
+                "X-Cache": cache_status,
+                "X-Render-Time": f"{(time.perf_counter() - start) * 1000:.1f}",
+            }
+        detailed = self.with_client(order, tenant, "name", "phone", "vehicle_plate", "vehicle_model")
+        return 200, {"order": {**detailed, "items": items}}, {}
+
+    def export_orders(self, tenant, params):
+        """GET /orders/export, like openOrderExport() in lib/export.js"""
+        export_format = params.get("format") or "csv"
+        paid_from, paid_to = params.get("paid_from"), params.get("paid_to")
+        if export_format not in EXPORT_FORMATS:
+            raise HttpError(400, f"Unknown format: {export_format} (use {' or '.join(EXPORT_FORMATS)})")
+        for name, value in (("paid_from", paid_from), ("paid_to", paid_to)):
+            if value is not None and not valid_date(value):
+                raise HttpError(400, f"{name} must be a date (YYYY-MM-DD)")
+        if paid_from and paid_to and paid_from > paid_to:
+            raise HttpError(400, "paid_from must not be after paid_to")
+        with self.export_lock:
+            if self.exports_running >= EXPORT_CONCURRENCY:
+                raise HttpError(429, "Too many exports in progress, try again later", {"Retry-After": "1"})
+            self.exports_running += 1
+
+        # Snapshot the order list under the store lock, like the cursor's transaction
+        # snapshot (clients and items are read as the rows stream out)
+        orders = list(tenant.orders.values())
+        if paid_from is not None or paid_to is not None:
+            def paid_day(order):
+                return datetime.fromisoformat(order["paid_at"]).astimezone(SAO_PAULO).date().isoformat()
+            orders = sorted((order for order in orders
+                             if order["status"] == "paid" and order["paid_at"]
+                             and (paid_from or "") <= paid_day(order) <= (paid_to or "9999-12-31")),
+                            key=lambda order: (order["paid_at"], order["id"]))
+        clients, items = tenant.clients, tenant.order_items
+
+        def rows():
+            for order in orders:
+                client = clients.get(order["client_id"]) or {}
+                yield {
+                    **{key: order[key] for key in ("id", "order_number", "status", "total_amount", "payment_method",
+                                                   "paid_at", "created_at", "notes")},
+                    "client_name": client.get("name"), "client_phone": client.get("phone"),
+                    "vehicle_plate": client.get("vehicle_plate"), "vehicle_model": client.get("vehicle_model"),
+                    "items": [{key: item[key] for key in EXPORT_ITEM_COLUMNS} for item in items.get(order["id"], [])],
+                }
+
+        def encode(batch):
+            if export_format == "ndjson":
+                return "".join(json.dumps(row) + "\n" for row in batch)
+            lines = []
+            for row in batch:
+                head = ",".join(csv_field(row[column]) for column in EXPORT_ORDER_COLUMNS)
+                for item in row["items"] or [{}]:
+                    lines.append(head + "," + ",".join(csv_field(item.get(column)) for column in EXPORT_ITEM_COLUMNS))
+            return "".join(line + "\r\n" for line in lines)
+
+        def chunks():
+            try:
+                if export_format == "csv":
+                    yield ("\ufeff" + ",".join(EXPORT_ORDER_COLUMNS + EXPORT_ITEM_COLUMNS) + "\r\n").encode()
+                batch = []
+                for row in rows():
+                    batch.append(row)
+                    if len(batch) == EXPORT_BATCH_SIZE:
+                        yield encode(batch).encode()
+                        batch = []
+                if batch:
+                    yield encode(batch).encode()
+            finally:
+                with self.export_lock:
+                    self.exports_running -= 1
+
+        period = (f"-from-{paid_from}" if paid_from else "") + (f"-to-{paid_to}" if paid_to else "")
+        content_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson; charset=utf-8"
+        return 200, StreamBody(chunks()), {
+            "Content-Type": content_type,
+            "Content-Disposition": f'attachment; filename="orders{period}.{export_format}"',
+            "Cache-Control": "no-store",
+        }
+
+    def get_team(self, user, tenant, role, rest, data):
+        team = [
+            {**{key: self.store.users[user_id][key] for key in ("id", "email", "username", "full_name")},
+             "role": member["role"], "created_at": member["created_at"]}
+            for user_id, member in reversed(tenant.members.items())
+        ]
+        return 200, {"team": team}, self.version_headers(tenant, "team")
+
+    # ---- POST ----
+
+    def post_clients(self, user, tenant, role, rest, data):
+        self.require(role, "create")
+        if not data.get("name"):
+            raise HttpError(400, "Name is required")
+        client_id = str(uuid.uuid4())
+        row = {"id": client_id, "tenant_id": tenant.row["id"], "created_at": now_iso(), "updated_at": now_iso()}
+        for column in ("name", "phone", "email", "vehicle_plate", "vehicle_model", "notes"):
+            row[column] = data.get(column)
+        tenant.clients[client_id] = row
+        return 201, {"client": row}, {}
+
+    def post_services(self, user, tenant, role, rest, data):
+        self.require(role, "create")
+        if not data.get("name") or not data.get("price"):
+            raise HttpError(400, "Name and price are required")
+        service_id = str(uuid.uuid4())
+        row = {
+            "id": service_id, "tenant_id": tenant.row["id"], "name": data["name"],
+            "description": data.get("description"), "price": money(data["price"]),
+            "duration_minutes": data.get("duration_minutes"), "active": True,
+            "created_at": now_iso(), "updated_at": now_iso(),
+        }
+        tenant.services[service_id] = row
+        tenant.versions["catalog"] += 1
+        return 201, {"service": row}, {}
+
+    MAX_BATCH_ORDERS = 500
+    ORDER_STATUSES = ("pending", "in_progress", "completed", "paid", "cancelled")
+    MAX_ITEM_QUANTITY = 2 ** 31 - 1
+
+    @classmethod
+    def validate_order(cls, data):
+        """Same rules and messages as validateOrder() in lib/orders.js"""
+        if not isinstance(data, dict):
+            return "Order must be an object"
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return "Order must have at least one item"
+        if data.get("status") and data["status"] not in cls.ORDER_STATUSES:
+            return f"Invalid status: {data['status']}"
+        for item in items:
+            price = item.get("price") if isinstance(item, dict) else None
+            try:
+                if isinstance(price, bool) or not isinstance(price, (int, float, str)):
+                    raise TypeError(price)
+                price = float(price)
+            except (TypeError, ValueError):
+                return "Each item needs a service_name and a price"
+            if not item.get("service_name") or not math.isfinite(price):
+                return "Each item needs a service_name and a price"
+            if price < 0:
+                return "Item price cannot be negative"
+            quantity = item.get("quantity")
+            if quantity is not None and not (
+                    isinstance(quantity, (int, float)) and not isinstance(quantity, bool)
+                    and float(quantity).is_integer() and 1 <= quantity <= cls.MAX_ITEM_QUANTITY):
+                return "Item quantity must be a positive integer"
+        return None
+
+    def create_order(self, user, tenant, data):
+        tenant.last_order_number += 1
+        items = data["items"]
+        order_id = str(uuid.uuid4())
+        status = data.get("status") or "pending"
+        row = {
+            "id": order_id, "tenant_id": tenant.row["id"], "client_id": data.get("client_id"),
+            "order_number": f"OS-{tenant.last_order_number:06d}", "status": status,
+            "total_amount": money(sum(float(item["price"]) * (item.get("quantity") or 1) for item in items)),
+            "payment_method": data.get("payment_method"), "notes": data.get("notes"),
+            "paid_at": now_iso() if status == "paid" else None, "created_by": user["id"],
+            "created_at": now_iso(), "updated_at": now_iso(),
+        }
+        tenant.orders[order_id] = row
+        tenant.order_items[order_id] = [
+            {"id": str(uuid.uuid4()), "order_id": order_id, "catalog_item_id": item.get("catalog_item_id"),
+             "service_name": item.get("service_name"), "price": money(item["price"]),
+             "quantity": item.get("quantity") or 1, "created_at": now_iso()}
+            for item in items
+        ]
+        return row
+
+    def post_orders(self, user, tenant, role, rest, data):
+        self.require(role, "create")
+        if rest == ["batch"]:
+            orders = data.get("orders")
+            if not isinstance(orders, list) or not orders:
+                raise HttpError(400, "Batch must contain at least one order")
+            if len(orders) > self.MAX_BATCH_ORDERS:
+                raise HttpError(413, f"Batch exceeds {self.MAX_BATCH_ORDERS} orders")
+            for index, order in enumerate(orders):
+                error = self.validate_order(order)
+                if error:
+                    raise HttpError(400, f"Order {index}: {error}")
+            return 201, {"orders": [self.create_order(user, tenant, order) for order in orders]}, {}
+        if rest:
+            raise HttpError(404, "Route not found")
+        error = self.validate_order(data)
+        if error:
+            raise HttpError(400, error)
+        return 201, {"order": self.create_order(user, tenant, data)}, {}
+
+    def post_team(self, user, tenant, role, rest, data):
+        if rest != ["invite"]:
+            raise HttpError(404, "Route not found")
+        self.require(role, "manage_team")
+        if not data.get("email") or not data.get("role"):
+            raise HttpError(400, "Email and role are required")
+        if data["role"] not in ("manager", "attendant", "viewer"):
+            raise HttpError(400, "Invalid role")
+        if data["email"] in self.store.users_by_login:
+            raise HttpError(400, "User already exists")
+        token = str(uuid.uuid4())
+        tenant.invites.append({"token": token, "email": data["email"], "role": data["role"]})
+        invite_url = f"http://localhost:3000/accept-invite?token={token}"
+        # Queued, not sent: delivery happens on the outbox thread, like lib/email.js
+        email_id = self.outbox.enqueue(tenant.row["id"], data["email"], f"Convite para {tenant.row['name']}",
+                                       f'<h2>Você foi convidado!</h2><a href="{invite_url}">{invite_url}</a>')
+        return 201, {"message": "Invite created, email queued", "emailId": email_id}, {}
+
+    # ---- PUT ----
+
+    @staticmethod
+    def coalesce(row, data, columns):
+        for column in columns:
+            if data.get(column) is not None:
+                row[column] = data[column]
+        row["updated_at"] = now_iso()
+
+    def put_orders(self, user, tenant, role, rest, data):
+        self.require(role, "update")
+        order = tenant.orders.get(rest[0]) if rest else None
+        if not order:
+            raise HttpError(404, "Order not found")
+        self.coalesce(order, data, ("status", "payment_method", "notes"))
+        if data.get("status") == "paid":
+            order["paid_at"] = now_iso()
+        self.invalidate_pdfs(order_id=order["id"])
+        return 200, {"order": order}, {}
+
+    def put_clients(self, user, tenant, role, rest, data):
+        self.require(role, "update")
+        client = tenant.clients.get(rest[0]) if rest else None
+        if not client:
+            raise HttpError(404, "Client not found")
+        self.coalesce(client, data, ("name", "phone", "email", "vehicle_plate", "vehicle_model", "notes"))
+        self.invalidate_pdfs(client_id=client["id"])
+        return 200, {"client": client}, {}
+
+    # ---- DELETE ----
+
+    def delete_orders(self, user, tenant, role, rest, data):
+        self.require(role, "delete")
+        if not rest or tenant.orders.pop(rest[0], None) is None:
+            raise HttpError(404, "Order not found")
+        tenant.order_items.pop(rest[0], None)
+        self.invalidate_pdfs(order_id=rest[0])
+        return 200, {"message": "Order deleted successfully"}, {}
+
+    def delete_clients(self, user, tenant, role, rest, data):
+        self.require(role, "delete")
+        if not rest or tenant.clients.pop(rest[0], None) is None:
+            raise HttpError(404, "Client not found")
+        for order in tenant.orders.values():
+            if order["client_id"] == rest[0]:
+                order["client_id"] = None
+        self.invalidate_pdfs(client_id=rest[0])
+        return 200, {"message": "Client deleted successfully"}, {}
+
+    def delete_services(self, user, tenant, role, rest, data):
+        self.require(role, "delete")
+        if not rest or tenant.services.pop(rest[0], None) is None:
+            raise HttpError(404, "Service not found")
+        tenant.versions["catalog"] += 1
+        for items in tenant.order_items.values():
+            for item in items:
+                if item["catalog_item_id"] == rest[0]:
+                    item["catalog_item_id"] = None
+        return 200, {"message": "Service deleted successfully"}, {}
+
+# ============ HTTP SERVER ============
+
+class StubServer:
+    """
+    Minimal keep-alive HTTP/1.1 server around StubApi.
+
+    latency_ms/jitter_ms delay every response; failure_rate answers that share
+    of requests with a 503. Both draw from a seeded RNG so runs are repeatable.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0,
+                 failure_rate=0.0, seed=0, tenants=1, smtp=None):
+        self.host = host
+        self.port = port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.api = StubApi(seed_store(tenants), smtp)
+        self.server = None
+        self.loop = None
+        self.thread = None
+        self.requests_served = 0
+        self.connections = set()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"🧪 Stub API listening on {self.base_url}/api")
+        async with self.server:
+            await self.server.serve_forever()
+
+    def start_in_thread(self):
+        """Run on a private event loop in a daemon thread; returns the base URL"""
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start())
+            ready.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, name="stub-api", daemon=True)
+        self.thread.start()
+        ready.wait()
+        return self.base_url
+
+    async def shutdown(self):
+        """Close the listener and any idle keep-alive connections"""
+        self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        handlers = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        if handlers:
+            await asyncio.wait(handlers, timeout=1)
+
+    def stop(self):
+        if self.loop:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+            self.loop.close()
+            self.loop = None
+        self.api.outbox.stop()
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        peer = (writer.get_extra_info("peername") or ("unknown",))[0]
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload, extra = await self.dispatch(method, target, headers, body, peer)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if isinstance(payload, StreamBody):
+                    await self.write_stream(writer, status, payload, extra, keep_alive)
+                else:
+                    writer.write(self.encode_response(status, payload, extra, keep_alive,
+                                                      headers.get("accept-encoding")))
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = lines[0].split(" ", 2)
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            raise ConnectionError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def dispatch(self, method, target, headers, body, peer="unknown"):
+        self.requests_served += 1
+        delay = self.latency_ms + (self.rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            return 503, {"error": "Injected failure"}, {}
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        timings = {}
+        start = time.perf_counter()
+        try:
+            status, payload, extra = self.api.handle(method, url.path, query, headers, body, peer, timings)
+        except HttpError as e:
+            status, payload, extra = e.status, {"error": e.message}, e.headers
+        except Exception as e:
+            status, payload, extra = 500, {"error": str(e)}, {}
+        if not isinstance(payload, (bytes, StreamBody)):
+            # Inside "total", like jsonResponse() in route.js
+            serialize_start = time.perf_counter()
+            payload = JsonBody(json.dumps(payload).encode())
+            timings["serialize"] = (time.perf_counter() - serialize_start) * 1000
+        # Same metrics and headers as withInstrumentation() in route.js; the stub runs no SQL
+        entries = [server_timing_entry(name, duration) for name, duration in timings.items()]
+        entries.append(server_timing_entry("db", 0.0, "0 queries"))
+        entries.append(server_timing_entry("total", (time.perf_counter() - start) * 1000))
+        return status, payload, {**extra, "X-Query-Count": "0", "Server-Timing": ", ".join(entries)}
+
+    @staticmethod
+    def encode_response(status, payload, extra_headers, keep_alive, accept_encoding=None):
+        headers = {"Content-Type": "application/json"}
+        headers.update(extra_headers)
+        body = payload if isinstance(payload, bytes) else JsonBody(json.dumps(payload).encode())
+        # JSON only, like lib/compression.js (PDFs are already compressed)
+        if isinstance(body, JsonBody):
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate_encoding(accept_encoding)
+            if encoding and len(body) >= COMPRESSION_MIN_BYTES:
+                start = time.perf_counter()
+                body = brotli.compress(body, quality=BROTLI_QUALITY) if encoding == "br" else gzip.compress(body, 6)
+                headers["Content-Encoding"] = encoding
+                # After the handler's "total", like compressResponse() in lib/compression.js
+                compress = server_timing_entry("compress", (time.perf_counter() - start) * 1000, encoding)
+                headers["Server-Timing"] = ", ".join(filter(None, [headers.get("Server-Timing"), compress]))
+        headers["Content-Length"] = str(len(body))
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        return encode_head(status, headers) + body
+
+    @staticmethod
+    async def write_stream(writer, status, body, extra_headers, keep_alive):
+        """Send a StreamBody with chunked transfer encoding, waiting for the client after each chunk"""
+        headers = {**extra_headers, "Transfer-Encoding": "chunked",
+                   "Connection": "keep-alive" if keep_alive else "close"}
+        writer.write(encode_head(status, headers))
+        try:
+            for chunk in body.chunks:
+                if chunk:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+        except ConnectionError:
+            body.chunks.close()
+            raise
+        except Exception as e:
+            # Status is already sent: cut the transfer short, like a failed cursor in lib/export.js
+            body.chunks.close()
+            raise ConnectionError(f"Stream failed: {e}") from e
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+def encode_head(status, headers):
+    head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+    head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    return head.encode("latin-1") + b"\r\n"
+
+class JsonBody(bytes):
+    """A serialized JSON payload (compressible), as opposed to raw bytes like a PDF"""
+
+class StreamBody:
+    """A response body produced chunk by chunk (a generator of bytes), sent chunked and uncompressed"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+def server_timing_entry(name, duration_ms, description=None):
+    """One Server-Timing metric, formatted like serverTimingEntry() in lib/timing.js"""
+    desc = f';desc="{description}"' if description else ""
+    return f"{name}{desc};dur={duration_ms:.1f}"
+
+def negotiate_encoding(accept_encoding):
+    """Best of br/gzip the client accepts (br first on ties), or None; see lib/compression.js"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, *params = part.strip().lower().split(";")
+        q = next((param.strip()[2:] for param in params if param.strip().startswith("q=")), "1")
+        try:
+            accepted[name] = float(q)
+        except ValueError:
+            accepted[name] = 0.0
+    best, best_q = None, 0.0
+    for encoding in ("br", "gzip") if brotli else ("gzip",):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def parse_smtp(value):
+    """'host:port' -> (host, port)"""
+    host, _, port = value.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid SMTP address: {value}")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Espaço Braite API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra uniform random delay")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered 503")
+    parser.add_argument("--seed", type=int, default=0, help="seed for jitter and failure injection")
+    parser.add_argument("--tenants", type=int, default=1, help="demo tenants to seed (admin1..adminN)")
+    parser.add_argument("--smtp", type=parse_smtp, metavar="HOST:PORT",
+                        help="deliver queued emails to this SMTP server (e.g. backend_smtp.py)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = StubServer(args.host, args.port, args.latency_ms, args.jitter_ms,
+                        args.failure_rate, args.seed, args.tenants, args.smtp)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
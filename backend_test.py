@@ -4,72 +4,302 @@ Comprehensive Backend API Tests for Espaço Braite
 Multi-tenant lava-rápido system with PostgreSQL, JWT auth, and RBAC
 """
 
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import csv
 import requests
 import json
 import os
-from datetime import datetime
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import backend_auth
+import backend_cassette
+import backend_metrics
+import backend_smtp
+
+# Helper modules import this one as `backend_test`; when run as a script make
+# sure they share this module's state instead of importing a second copy.
+# (__mp_main__ is this script re-imported in a spawned --sessions worker.)
+if __name__ in ("__main__", "__mp_main__"):
+    sys.modules.setdefault("backend_test", sys.modules[__name__])
 
 # Configuration
-BASE_URL = "https://braite-manager.preview.emergentagent.com"
+BASE_URL = os.environ.get("BRAITE_BASE_URL", "https://braite-manager.preview.emergentagent.com")
 API_BASE = f"{BASE_URL}/api"
 
 # Test credentials
 TEST_USERNAME = "admin1"
 TEST_PASSWORD = "123"
 
-# Global variables for test state
-access_token = None
-refresh_token = None
-tenant_id = None
-user_data = None
-created_client_id = None
-created_service_id = None
-created_order_id = None
+# Connection pool configuration
+POOL_CONNECTIONS = int(os.environ.get("BRAITE_POOL_CONNECTIONS", "4"))  # hosts kept alive
+POOL_MAXSIZE = int(os.environ.get("BRAITE_POOL_MAXSIZE", "10"))  # connections per host
+MAX_RETRIES = int(os.environ.get("BRAITE_MAX_RETRIES", "3"))
+RETRY_BACKOFF = float(os.environ.get("BRAITE_RETRY_BACKOFF", "0.3"))
+REQUEST_TIMEOUT = 30
+# The dashboard reads the daily_revenue rollup, so it should stay fast however many orders a tenant has
+DASHBOARD_MAX_MS = float(os.environ.get("BRAITE_DASHBOARD_MAX_MS", "1500"))
+# PDF benchmark: requests fired at once against the server's browser pool
+PDF_REQUESTS = int(os.environ.get("BRAITE_PDF_REQUESTS", "20"))
+PDF_CONCURRENCY = int(os.environ.get("BRAITE_PDF_CONCURRENCY", "5"))
+# Sent with those requests (and the load generator's) so each one renders instead of hitting
+# the server's receipt cache; route.js and the stub answer them with X-Cache: BYPASS
+PDF_CACHE_BYPASS = {"X-PDF-Cache": "bypass"}
+# Orders per POST /orders/batch call, and orders the batch test creates (and
+# deletes again) each way; the same under --local, so its cassettes replay as recorded
+BATCH_ORDER_SIZE = int(os.environ.get("BRAITE_BATCH_ORDER_SIZE", "100"))
+BATCH_TEST_ORDERS = int(os.environ.get("BRAITE_BATCH_TEST_ORDERS", "5"))
+# Tests at least this slow get a Server-Timing breakdown in the summary (0 = every test)
+SLOW_TEST_MS = float(os.environ.get("BRAITE_SLOW_TEST_MS", "500"))
+# POST /team/invite only queues the email, so it should answer without waiting on SMTP
+# (judged on the server's Server-Timing total, not client-side latency)
+INVITE_MAX_MS = float(os.environ.get("BRAITE_INVITE_MAX_MS", "300"))
+# How long the invite email may take to reach the SMTP sink
+EMAIL_DELIVERY_TIMEOUT = float(os.environ.get("BRAITE_EMAIL_DELIVERY_TIMEOUT", "30"))
+# host:port to run the SMTP sink on for a remote server whose SMTP_HOST/SMTP_PORT point
+# here (--local wires one up itself); without a sink invite delivery isn't checked
+SMTP_SINK = os.environ.get("BRAITE_SMTP_SINK")
+# Full fetches and If-None-Match revalidations timed per versioned listing
+REVALIDATION_SAMPLES = int(os.environ.get("BRAITE_REVALIDATION_SAMPLES", "5"))
+# Operator secret (the server's METRICS_TOKEN) for GET /metrics and /diagnostics; --local uses the stub's
+METRICS_TOKEN = os.environ.get("BRAITE_METRICS_TOKEN")
+# Server process to watch for peak RSS (its Chromium children included); local runs only
+SERVER_PID = int(os.environ["BRAITE_SERVER_PID"]) if os.environ.get("BRAITE_SERVER_PID") else None
+
+class RunContext:
+    """
+    State of one run of the suite: who is logged in, to which tenant, and the
+    rows the CRUD tests created. Separate contexts (one per user/tenant) can run
+    side by side without seeing each other's state.
+    """
+
+    def __init__(self, username=TEST_USERNAME, password=TEST_PASSWORD, label=None):
+        self.username = username
+        self.password = password
+        self.label = label or username
+        self.access_token = None
+        self.refresh_token = None
+        self.tenant_id = None
+        self.user_data = None
+        self.created_client_id = None
+        self.created_service_id = None
+        self.created_order_id = None
+        self.services_etag = None
+
+# Context used by the CLI and by helper modules that don't pass their own
+context = RunContext()
+
+# Prepended to every log line; set per worker process in --sessions runs
+log_prefix = ""
+
+# backend_smtp.SmtpSink receiving the server's outbox emails, if there is one (see SMTP_SINK)
+smtp_sink = None
 
 def log_test(test_name, status, details=""):
     """Log test results with timestamp"""
     timestamp = datetime.now().strftime("%H:%M:%S")
     status_symbol = "✅" if status == "PASS" else "❌" if status == "FAIL" else "⚠️"
-    print(f"[{timestamp}] {status_symbol} {test_name}")
+    line = f"[{timestamp}] {log_prefix}{status_symbol} {test_name}"
     if details:
-        print(f"    {details}")
+        line += f"\n    {details}"
+    # Single print so lines from concurrently running tests don't interleave
+    print(line)
+
+# ============ CONNECTION POOL ============
+
+class ConnectionStats:
+    """Accumulate handshake (TCP+TLS connect) and request timings"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.handshakes = 0
+        self.handshake_time = 0.0
+        self.requests = 0
+        self.request_time = 0.0
+
+    def record_handshake(self, elapsed):
+        with self.lock:
+            self.handshakes += 1
+            self.handshake_time += elapsed
+
+    def record_request(self, elapsed):
+        with self.lock:
+            self.requests += 1
+            self.request_time += elapsed
+
+    def export_state(self):
+        with self.lock:
+            return {"handshakes": self.handshakes, "handshake_time": self.handshake_time,
+                    "requests": self.requests, "request_time": self.request_time}
+
+    def merge_state(self, state):
+        with self.lock:
+            self.handshakes += state["handshakes"]
+            self.handshake_time += state["handshake_time"]
+            self.requests += state["requests"]
+            self.request_time += state["request_time"]
+
+    def summary(self):
+        reused = max(self.requests - self.handshakes, 0)
+        return (f"{self.requests} requests in {self.request_time * 1000:.0f}ms, "
+                f"{self.handshakes} handshakes in {self.handshake_time * 1000:.0f}ms, "
+                f"{reused} reused connections")
+
+connection_stats = ConnectionStats()
+
+# Per-endpoint latency histograms for every make_request call
+latency_recorder = backend_metrics.LatencyRecorder()
+
+# Server-Timing phases per test for requests made inside run_test (current_test)
+server_timings = backend_metrics.ServerTimingRecorder()
+current_test = contextvars.ContextVar("current_test", default=None)
+
+# SO_KEEPALIVE so idle pooled sockets survive NATs/load balancers between tests
+KEEP_ALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connection_stats.record_handshake(time.perf_counter() - start)
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        connection_stats.record_handshake(time.perf_counter() - start)
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with keep-alive sockets and connect-time instrumentation"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = KEEP_ALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool,
+            "https": TimedHTTPSConnectionPool,
+        }
+
+def create_session(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                   max_retries=MAX_RETRIES, backoff_factor=RETRY_BACKOFF):
+    """Create a pooled session; POST is never retried since it is not idempotent"""
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "PUT", "DELETE"}),
+        raise_on_status=False,
+    )
+    adapter = PooledAdapter(pool_connections=pool_connections,
+                            pool_maxsize=pool_maxsize, max_retries=retry)
+    if cassette_player is not None:
+        adapter = backend_cassette.ReplayAdapter(cassette_player)
+    elif cassette_recorder is not None:
+        adapter = backend_cassette.RecordingAdapter(adapter, cassette_recorder)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
-def make_request(method, endpoint, data=None, headers=None, params=None):
-    """Make HTTP request with error handling"""
+http_session = None
+
+# Traffic cassette being written (--record) or served from (--replay); sessions
+# created while one is set record through it or never touch the network
+cassette_recorder = None
+cassette_player = None
+
+def get_session():
+    """Return the shared pooled session, creating it on first use"""
+    global http_session
+    if http_session is None:
+        http_session = create_session()
+    return http_session
+
+def make_request(method, endpoint, data=None, headers=None, params=None, stream=False):
+    """Make HTTP request with error handling (stream=True leaves the body unread)"""
     url = f"{API_BASE}{endpoint}"
+    method = method.upper()
     
     try:
-        if method.upper() == "GET":
-            response = requests.get(url, headers=headers, params=params, timeout=30)
-        elif method.upper() == "POST":
-            response = requests.post(url, json=data, headers=headers, params=params, timeout=30)
-        elif method.upper() == "PUT":
-            response = requests.put(url, json=data, headers=headers, params=params, timeout=30)
-        elif method.upper() == "DELETE":
-            response = requests.delete(url, headers=headers, params=params, timeout=30)
-        else:
+        if method in ("GET", "DELETE"):
+            data = None
+        elif method not in ("POST", "PUT"):
             raise ValueError(f"Unsupported method: {method}")
+        
+        # perf_counter is monotonic, so wall-clock adjustments can't skew samples
+        start = time.perf_counter()
+        response = get_session().request(method, url, json=data, headers=headers,
+                                         params=params, timeout=REQUEST_TIMEOUT, stream=stream)
+        elapsed = time.perf_counter() - start
+        connection_stats.record_request(elapsed)
+        latency_recorder.record(backend_metrics.endpoint_key(method, endpoint), elapsed,
+                                ok=response.status_code < 500)
+        test_name = current_test.get()
+        if test_name:
+            server_timings.record(test_name, elapsed, response.headers.get("Server-Timing"))
             
         return response
     except requests.exceptions.RequestException as e:
+        latency_recorder.record_error(backend_metrics.endpoint_key(method, endpoint))
         print(f"Request failed: {e}")
         return None
 
-def get_auth_headers():
-    """Get authorization headers with token"""
-    if not access_token:
+# Shared, proactively refreshed access tokens keyed by (username, tenant_id)
+token_manager = backend_auth.TokenManager(lambda *args, **kwargs: make_request(*args, **kwargs))
+
+def token_key(ctx=None):
+    ctx = ctx or context
+    return (ctx.username, ctx.tenant_id)
+
+def set_base_url(base_url):
+    """Point the harness at another deployment (or the local stub server)"""
+    global BASE_URL, API_BASE
+    BASE_URL = base_url.rstrip("/")
+    API_BASE = f"{BASE_URL}/api"
+
+def get_auth_headers(ctx=None):
+    """Get authorization headers with a token that is refreshed before it expires"""
+    ctx = ctx or context
+    if not ctx.access_token:
         return {}
-    return {"Authorization": f"Bearer {access_token}"}
+    ctx.access_token = token_manager.get(token_key(ctx))
+    return {"Authorization": f"Bearer {ctx.access_token}"}
 
-def get_tenant_params():
+def get_tenant_params(ctx=None):
     """Get tenant_id parameter"""
-    if not tenant_id:
+    ctx = ctx or context
+    if not ctx.tenant_id:
         return {}
-    return {"tenant_id": tenant_id}
+    return {"tenant_id": ctx.tenant_id}
 
 # ============ TEST FUNCTIONS ============
 
-def test_health_check():
+def test_health_check(ctx):
     """Test health endpoint"""
     try:
         response = make_request("GET", "/health")
@@ -88,14 +318,12 @@ def test_health_check():
         log_test("Health Check", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_login():
+def test_login(ctx):
     """Test authentication login"""
-    global access_token, refresh_token, tenant_id, user_data
-    
     try:
         data = {
-            "username": TEST_USERNAME,
-            "password": TEST_PASSWORD
+            "username": ctx.username,
+            "password": ctx.password
         }
         
         response = make_request("POST", "/auth/login", data=data)
@@ -104,15 +332,17 @@ def test_login():
             result = response.json()
             
             if "accessToken" in result and "user" in result:
-                access_token = result["accessToken"]
-                refresh_token = result.get("refreshToken")
-                user_data = result["user"]
+                ctx.access_token = result["accessToken"]
+                ctx.refresh_token = result.get("refreshToken")
+                ctx.user_data = result["user"]
                 
                 # Extract tenant_id from user tenants
-                if user_data.get("tenants") and len(user_data["tenants"]) > 0:
-                    tenant_id = user_data["tenants"][0]["tenant_id"]
+                if ctx.user_data.get("tenants") and len(ctx.user_data["tenants"]) > 0:
+                    ctx.tenant_id = ctx.user_data["tenants"][0]["tenant_id"]
+                    token_manager.register(token_key(ctx), ctx.username, ctx.password,
+                                           ctx.access_token, ctx.refresh_token, ctx.user_data)
                     log_test("Authentication Login", "PASS", 
-                           f"User: {user_data.get('username')}, Tenant: {tenant_id}")
+                           f"User: {ctx.user_data.get('username')}, Tenant: {ctx.tenant_id}")
                     return True
                 else:
                     log_test("Authentication Login", "FAIL", "No tenants found for user")
@@ -128,20 +358,25 @@ def test_login():
         log_test("Authentication Login", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_token_refresh():
+def test_token_refresh(ctx):
     """Test token refresh"""
     try:
-        if not refresh_token:
+        if not ctx.refresh_token:
             log_test("Token Refresh", "SKIP", "No refresh token available")
             return False
             
-        data = {"refreshToken": refresh_token}
+        data = {"refreshToken": ctx.refresh_token}
         response = make_request("POST", "/auth/refresh", data=data)
         
         if response and response.status_code == 200:
             result = response.json()
             if "accessToken" in result:
-                log_test("Token Refresh", "PASS", "New access token received")
+                # Keep using the refreshed token instead of throwing it away
+                ctx.access_token = result["accessToken"]
+                token_manager.register(token_key(ctx), ctx.username, ctx.password,
+                                       ctx.access_token, ctx.refresh_token, ctx.user_data)
+                expires_in = backend_auth.token_expiry(ctx.access_token) - time.time()
+                log_test("Token Refresh", "PASS", f"New access token received (expires in {expires_in:.0f}s)")
                 return True
             else:
                 log_test("Token Refresh", "FAIL", f"No access token in response: {result}")
@@ -154,10 +389,10 @@ def test_token_refresh():
         log_test("Token Refresh", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_me_endpoint():
+def test_me_endpoint(ctx):
     """Test /me endpoint"""
     try:
-        response = make_request("GET", "/me", headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", "/me", headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -175,10 +410,13 @@ def test_me_endpoint():
         log_test("Get Current User (/me)", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_dashboard():
+def test_dashboard(ctx):
     """Test dashboard analytics"""
     try:
-        response = make_request("GET", "/dashboard", headers=get_auth_headers(), params=get_tenant_params())
+        headers = get_auth_headers(ctx)
+        start = time.perf_counter()
+        response = make_request("GET", "/dashboard", headers=headers, params=get_tenant_params(ctx))
+        elapsed_ms = (time.perf_counter() - start) * 1000
         
         if response and response.status_code == 200:
             result = response.json()
@@ -187,8 +425,13 @@ def test_dashboard():
             if "revenue" in result and "recentOrders" in result:
                 revenue = result["revenue"]
                 if all(key in revenue for key in ["today", "last15Days", "last30Days"]):
+                    if elapsed_ms > DASHBOARD_MAX_MS:
+                        log_test("Dashboard Analytics", "FAIL",
+                               f"Took {elapsed_ms:.0f}ms (limit {DASHBOARD_MAX_MS:.0f}ms)")
+                        return False
                     log_test("Dashboard Analytics", "PASS", 
-                           f"Today: R${revenue['today']}, 15d: R${revenue['last15Days']}, 30d: R${revenue['last30Days']}")
+                           f"Today: R${revenue['today']}, 15d: R${revenue['last15Days']}, 30d: R${revenue['last30Days']} "
+                           f"in {elapsed_ms:.0f}ms")
                     return True
                 else:
                     log_test("Dashboard Analytics", "FAIL", f"Missing revenue fields: {revenue}")
@@ -204,10 +447,10 @@ def test_dashboard():
         log_test("Dashboard Analytics", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_clients_list():
+def test_clients_list(ctx):
     """Test list clients"""
     try:
-        response = make_request("GET", "/clients", headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", "/clients", headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -225,10 +468,59 @@ def test_clients_list():
         log_test("List Clients", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_create_client():
-    """Test create client"""
-    global created_client_id
+# One row per page so pagination tests cross page boundaries on the demo data,
+# and at most this many pages walked, however many rows the tenant has
+PAGINATION_TEST_LIMIT = 1
+PAGINATION_TEST_PAGES = 5
+
+def check_pagination(test_name, endpoint, key, ctx):
+    """
+    Walk the first PAGINATION_TEST_PAGES pages of a keyset-paginated listing
+    and compare them with the same rows fetched as a single ?limit= page
+    """
+    import backend_stream
     
+    try:
+        seen = []
+        pages = 0
+        with contextlib.closing(backend_stream.iter_pages(endpoint, key, limit=PAGINATION_TEST_LIMIT,
+                                                          ctx=ctx)) as page_iter:
+            for page in page_iter:
+                pages += 1
+                seen.extend((row["created_at"], row["id"]) for row in page)
+                if pages == PAGINATION_TEST_PAGES:
+                    break
+        
+        if len(seen) != len(set(seen)):
+            log_test(test_name, "FAIL", "Duplicate rows across pages")
+            return False
+        if seen != sorted(seen, reverse=True):
+            log_test(test_name, "FAIL", "Rows not ordered by created_at DESC")
+            return False
+        
+        response = make_request("GET", endpoint, headers=get_auth_headers(ctx),
+                              params={**get_tenant_params(ctx), "limit": max(len(seen), 1)})
+        if not response or response.status_code != 200:
+            log_test(test_name, "FAIL", f"Status: {response.status_code if response else 'No response'}")
+            return False
+        
+        expected = [(row["created_at"], row["id"]) for row in response.json()[key]][:len(seen)]
+        if expected != seen:
+            log_test(test_name, "FAIL", f"Paginated {len(seen)} rows differ from the first {len(expected)} in one page")
+            return False
+        
+        log_test(test_name, "PASS", f"{len(seen)} {key} across {pages} pages")
+        return True
+    except Exception as e:
+        log_test(test_name, "FAIL", f"Exception: {str(e)}")
+        return False
+
+def test_clients_pagination(ctx):
+    """Test keyset pagination of clients"""
+    return check_pagination("Paginate Clients", "/clients", "clients", ctx)
+
+def test_create_client(ctx):
+    """Test create client"""
     try:
         data = {
             "name": "João Silva",
@@ -238,13 +530,13 @@ def test_create_client():
         }
         
         response = make_request("POST", "/clients", data=data, 
-                              headers=get_auth_headers(), params=get_tenant_params())
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 201:
             result = response.json()
             if "client" in result and "id" in result["client"]:
-                created_client_id = result["client"]["id"]
-                log_test("Create Client", "PASS", f"Client ID: {created_client_id}")
+                ctx.created_client_id = result["client"]["id"]
+                log_test("Create Client", "PASS", f"Client ID: {ctx.created_client_id}")
                 return True
             else:
                 log_test("Create Client", "FAIL", f"No client ID in response: {result}")
@@ -257,10 +549,10 @@ def test_create_client():
         log_test("Create Client", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_update_client():
+def test_update_client(ctx):
     """Test update client"""
     try:
-        if not created_client_id:
+        if not ctx.created_client_id:
             log_test("Update Client", "SKIP", "No client ID available")
             return False
             
@@ -270,8 +562,8 @@ def test_update_client():
             "vehicle_model": "Honda Civic 2021"
         }
         
-        response = make_request("PUT", f"/clients/{created_client_id}", data=data,
-                              headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("PUT", f"/clients/{ctx.created_client_id}", data=data,
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -289,16 +581,49 @@ def test_update_client():
         log_test("Update Client", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_services_list():
-    """Test list services"""
+def check_revalidation(endpoint, response, ctx):
+    """
+    Revalidate a versioned listing with its ETag: every If-None-Match request
+    must come back 304 with the same ETag. Returns (ok, details), details
+    comparing mean full-fetch and revalidation latency.
+    """
+    etag = response.headers.get("ETag")
+    if not etag:
+        return False, "No ETag header"
+    full, revalidated = [], []
+    for _ in range(REVALIDATION_SAMPLES):
+        start = time.perf_counter()
+        refetch = make_request("GET", endpoint, headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
+        full.append(time.perf_counter() - start)
+        if refetch is None or refetch.status_code != 200:
+            return False, f"Refetch status: {refetch.status_code if refetch is not None else 'No response'}"
+        
+        start = time.perf_counter()
+        conditional = make_request("GET", endpoint, headers={**get_auth_headers(ctx), "If-None-Match": etag},
+                                   params=get_tenant_params(ctx))
+        revalidated.append(time.perf_counter() - start)
+        if conditional is None or conditional.status_code != 304:
+            return False, f"Revalidation status: {conditional.status_code if conditional is not None else 'No response'}, expected 304"
+        if conditional.headers.get("ETag") != etag:
+            return False, f"ETag changed on 304: {etag} -> {conditional.headers.get('ETag')}"
+    full_ms = sum(full) / len(full) * 1000
+    revalidated_ms = sum(revalidated) / len(revalidated) * 1000
+    return True, (f"304 revalidation {revalidated_ms:.1f}ms vs {full_ms:.1f}ms full "
+                  f"({full_ms - revalidated_ms:+.1f}ms, {len(response.content)} bytes not resent)")
+
+def test_services_list(ctx):
+    """Test list services, and 304 revalidation of its ETag"""
     try:
-        response = make_request("GET", "/services", headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", "/services", headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
             if "services" in result:
-                log_test("List Services", "PASS", f"Found {len(result['services'])} services")
-                return True
+                ctx.services_etag = response.headers.get("ETag")
+                ok, details = check_revalidation("/services", response, ctx)
+                log_test("List Services", "PASS" if ok else "FAIL",
+                         f"Found {len(result['services'])} services; {details}")
+                return ok
             else:
                 log_test("List Services", "FAIL", f"No services field in response: {result}")
                 return False
@@ -310,10 +635,8 @@ def test_services_list():
         log_test("List Services", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_create_service():
+def test_create_service(ctx):
     """Test create service"""
-    global created_service_id
-    
     try:
         data = {
             "name": "Lavagem Completa Premium",
@@ -323,13 +646,21 @@ def test_create_service():
         }
         
         response = make_request("POST", "/services", data=data,
-                              headers=get_auth_headers(), params=get_tenant_params())
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 201:
             result = response.json()
             if "service" in result and "id" in result["service"]:
-                created_service_id = result["service"]["id"]
-                log_test("Create Service", "PASS", f"Service ID: {created_service_id}")
+                ctx.created_service_id = result["service"]["id"]
+                # The write bumps the catalog version, so the listing's old ETag must no longer match
+                if ctx.services_etag:
+                    stale = make_request("GET", "/services", params=get_tenant_params(ctx),
+                                         headers={**get_auth_headers(ctx), "If-None-Match": ctx.services_etag})
+                    if stale is None or stale.status_code != 200:
+                        log_test("Create Service", "FAIL",
+                               f"Catalog ETag not invalidated: {stale.status_code if stale is not None else 'No response'}")
+                        return False
+                log_test("Create Service", "PASS", f"Service ID: {ctx.created_service_id}")
                 return True
             else:
                 log_test("Create Service", "FAIL", f"No service ID in response: {result}")
@@ -342,10 +673,10 @@ def test_create_service():
         log_test("Create Service", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_orders_list():
+def test_orders_list(ctx):
     """Test list orders"""
     try:
-        response = make_request("GET", "/orders", headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", "/orders", headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -363,37 +694,119 @@ def test_orders_list():
         log_test("List Orders", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_create_order():
+# Columns the orders list view renders (app/page.js)
+ORDER_LIST_FIELDS = "order_number,status,client_name,vehicle_plate,total_amount,created_at"
+
+def test_orders_projection(ctx):
+    """Test GET /orders?fields= returns only the requested columns (plus id)"""
+    try:
+        params = {**get_tenant_params(ctx), "fields": ORDER_LIST_FIELDS}
+        response = make_request("GET", "/orders", headers=get_auth_headers(ctx), params=params)
+        if not response or response.status_code != 200:
+            log_test("Project Orders", "FAIL",
+                   f"Status: {response.status_code if response else 'No response'}")
+            return False
+        
+        orders = response.json().get("orders", [])
+        expected = set(ORDER_LIST_FIELDS.split(",")) | {"id"}
+        extra = [order["id"] for order in orders if set(order) != expected]
+        if not orders or extra:
+            log_test("Project Orders", "FAIL",
+                   f"{len(orders)} orders, {len(extra)} with other columns than {sorted(expected)}")
+            return False
+        
+        params["fields"] = "order_number,password_hash"
+        rejected = make_request("GET", "/orders", headers=get_auth_headers(ctx), params=params)
+        if rejected is None or rejected.status_code != 400:
+            log_test("Project Orders", "FAIL",
+                   f"Unknown field not rejected: {rejected.status_code if rejected is not None else 'No response'}")
+            return False
+        
+        log_test("Project Orders", "PASS",
+                 f"{len(orders)} orders with {len(expected)} columns, "
+                 f"{response.headers.get('Content-Encoding', 'identity')} encoded")
+        return True
+    except Exception as e:
+        log_test("Project Orders", "FAIL", f"Exception: {str(e)}")
+        return False
+
+def build_order_payload(client_id, service_id):
+    """Request body used by test_create_order (and replayed by the load generator)"""
+    return {
+        "client_id": client_id,
+        "items": [
+            {
+                "catalog_item_id": service_id,
+                "service_name": "Lavagem Completa Premium",
+                "price": 85.00,
+                "quantity": 1
+            }
+        ],
+        "status": "pending",
+        "notes": "Cliente preferencial"
+    }
+
+def create_orders_batch(orders, batch_size=None, headers=None, params=None):
+    """
+    Create orders through POST /orders/batch, batch_size per call (each call is
+    one server transaction). Returns the created rows in input order; raises
+    RuntimeError on the first rejected batch.
+    """
+    batch_size = batch_size or BATCH_ORDER_SIZE
+    headers = headers or get_auth_headers()
+    params = params or get_tenant_params()
+    created = []
+    for offset in range(0, len(orders), batch_size):
+        response = make_request("POST", "/orders/batch", data={"orders": orders[offset:offset + batch_size]},
+                                headers=headers, params=params)
+        if response is None or response.status_code != 201:
+            status = response.status_code if response is not None else "No response"
+            detail = response.text[:200] if response is not None else ""
+            raise RuntimeError(f"Batch at offset {offset} failed: {status} {detail}")
+        created += response.json()["orders"]
+    return created
+
+def delete_rows(resource, ids, headers=None, params=None):
+    """
+    DELETE /{resource}/:id for each id, to remove rows a test or benchmark
+    created from the shared tenant. Returns how many deletes failed.
+    """
+    headers = headers or get_auth_headers()
+    params = params or get_tenant_params()
+    failed = 0
+    for row_id in ids:
+        response = make_request("DELETE", f"/{resource}/{row_id}", headers=headers, params=params)
+        if response is None or response.status_code != 200:
+            failed += 1
+    return failed
+
+def test_create_order(ctx):
     """Test create order"""
-    global created_order_id
-    
     try:
-        if not created_client_id or not created_service_id:
+        if not ctx.created_client_id or not ctx.created_service_id:
             log_test("Create Order", "SKIP", "Missing client or service ID")
             return False
             
-        data = {
-            "client_id": created_client_id,
-            "items": [
-                {
-                    "catalog_item_id": created_service_id,
-                    "service_name": "Lavagem Completa Premium",
-                    "price": 85.00,
-                    "quantity": 1
-                }
-            ],
-            "status": "pending",
-            "notes": "Cliente preferencial"
-        }
+        data = build_order_payload(ctx.created_client_id, ctx.created_service_id)
+        
+        # Quantities the int column can't take and negative prices are refused with 400, not a 500
+        for bad_item in ({"quantity": "2x"}, {"quantity": 1.5}, {"quantity": 0}, {"price": -5}, {"price": "85abc"}):
+            bad = {**data, "items": [{**data["items"][0], **bad_item}]}
+            rejected = make_request("POST", "/orders", data=bad,
+                                  headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
+            if rejected is None or rejected.status_code != 400:
+                log_test("Create Order", "FAIL",
+                       f"Item {bad_item} not rejected: {rejected.status_code if rejected is not None else 'No response'}")
+                return False
         
         response = make_request("POST", "/orders", data=data,
-                              headers=get_auth_headers(), params=get_tenant_params())
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 201:
             result = response.json()
             if "order" in result and "id" in result["order"]:
-                created_order_id = result["order"]["id"]
-                log_test("Create Order", "PASS", f"Order ID: {created_order_id}")
+                ctx.created_order_id = result["order"]["id"]
+                log_test("Create Order", "PASS", f"Order ID: {ctx.created_order_id}")
                 return True
             else:
                 log_test("Create Order", "FAIL", f"No order ID in response: {result}")
@@ -406,10 +819,63 @@ def test_create_order():
         log_test("Create Order", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_update_order():
+def test_create_orders_batch(ctx):
+    """Test batch order creation and compare its throughput with one POST /orders per order"""
+    try:
+        if not ctx.created_client_id or not ctx.created_service_id:
+            log_test("Batch Create Orders", "SKIP", "Missing client or service ID")
+            return False
+        
+        headers, params = get_auth_headers(ctx), get_tenant_params(ctx)
+        payload = build_order_payload(ctx.created_client_id, ctx.created_service_id)
+        
+        # Every order created here is deleted again, so runs don't grow the tenant
+        created_ids = []
+        try:
+            start = time.perf_counter()
+            for _ in range(BATCH_TEST_ORDERS):
+                response = make_request("POST", "/orders", data=payload, headers=headers, params=params)
+                if not response or response.status_code != 201:
+                    log_test("Batch Create Orders", "FAIL",
+                           f"Single create status: {response.status_code if response else 'No response'}")
+                    return False
+                created_ids.append(response.json()["order"]["id"])
+            single_s = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            created = create_orders_batch([payload] * BATCH_TEST_ORDERS, headers=headers, params=params)
+            batch_s = time.perf_counter() - start
+            created_ids += [order["id"] for order in created]
+            
+            numbers = [order["order_number"] for order in created]
+            if len(created) != BATCH_TEST_ORDERS or len(set(numbers)) != len(numbers):
+                log_test("Batch Create Orders", "FAIL",
+                       f"Expected {BATCH_TEST_ORDERS} distinct order numbers, got {len(set(numbers))}/{len(created)}")
+                return False
+        finally:
+            leftover = delete_rows("orders", created_ids, headers, params)
+        if leftover:
+            log_test("Batch Create Orders", "FAIL", f"{leftover}/{len(created_ids)} created orders could not be deleted")
+            return False
+        
+        single_rate = BATCH_TEST_ORDERS / single_s if single_s else 0
+        batch_rate = BATCH_TEST_ORDERS / batch_s if batch_s else 0
+        log_test("Batch Create Orders", "PASS",
+               f"{BATCH_TEST_ORDERS} orders: one-at-a-time {single_rate:.0f}/s, "
+               f"batch {batch_rate:.0f}/s ({numbers[0]}..{numbers[-1]})")
+        return True
+    except Exception as e:
+        log_test("Batch Create Orders", "FAIL", f"Exception: {str(e)}")
+        return False
+
+def test_orders_pagination(ctx):
+    """Test keyset pagination of orders"""
+    return check_pagination("Paginate Orders", "/orders", "orders", ctx)
+
+def test_update_order(ctx):
     """Test update order status"""
     try:
-        if not created_order_id:
+        if not ctx.created_order_id:
             log_test("Update Order", "SKIP", "No order ID available")
             return False
             
@@ -418,8 +884,8 @@ def test_update_order():
             "payment_method": "PIX"
         }
         
-        response = make_request("PUT", f"/orders/{created_order_id}", data=data,
-                              headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("PUT", f"/orders/{ctx.created_order_id}", data=data,
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -437,15 +903,15 @@ def test_update_order():
         log_test("Update Order", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_get_single_order():
+def test_get_single_order(ctx):
     """Test get single order with items"""
     try:
-        if not created_order_id:
+        if not ctx.created_order_id:
             log_test("Get Single Order", "SKIP", "No order ID available")
             return False
             
-        response = make_request("GET", f"/orders/{created_order_id}",
-                              headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", f"/orders/{ctx.created_order_id}",
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -464,42 +930,217 @@ def test_get_single_order():
         log_test("Get Single Order", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_pdf_generation():
-    """Test PDF generation"""
+# CSV header of GET /orders/export (lib/export.js), one line per order item
+EXPORT_CSV_COLUMNS = ["order_number", "status", "created_at", "paid_at", "payment_method", "total_amount",
+                      "client_name", "client_phone", "vehicle_plate", "vehicle_model", "notes",
+                      "service_name", "price", "quantity"]
+# paid_from/paid_to are business calendar days (America/Sao_Paulo, no DST since 2019)
+BUSINESS_TZ = timezone(timedelta(hours=-3))
+
+def test_order_export(ctx):
+    """Test streaming CSV/NDJSON order export, its paid_at range filter and parameter validation"""
+    import backend_stream
     try:
-        if not created_order_id:
-            log_test("PDF Generation", "SKIP", "No order ID available")
+        if not ctx.created_order_id:
+            log_test("Export Orders", "SKIP", "No order ID available")
             return False
-            
-        response = make_request("GET", f"/orders/{created_order_id}/pdf",
-                              headers=get_auth_headers(), params=get_tenant_params())
         
-        if response and response.status_code == 200:
-            content_type = response.headers.get('content-type', '')
-            if 'application/pdf' in content_type:
-                log_test("PDF Generation", "PASS", f"PDF size: {len(response.content)} bytes")
-                return True
-            else:
-                log_test("PDF Generation", "FAIL", f"Wrong content type: {content_type}")
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path, ndjson_path = os.path.join(tmp, "orders.csv"), os.path.join(tmp, "orders.ndjson")
+            csv_result = backend_stream.download_export(csv_path, "csv", ctx=ctx)
+            ndjson_result = backend_stream.download_export(ndjson_path, "ndjson", ctx=ctx)
+            for name, result in (("CSV", csv_result), ("NDJSON", ndjson_result)):
+                if result is None or result["status"] != 200:
+                    log_test("Export Orders", "FAIL",
+                           f"{name} export status: {result['status'] if result else 'No response'}")
+                    return False
+            
+            # utf-8-sig drops the BOM the export starts with
+            with open(csv_path, newline="", encoding="utf-8-sig") as fh:
+                reader = csv.reader(fh)
+                header = next(reader, [])
+                csv_rows = list(reader)
+            with open(ndjson_path, encoding="utf-8") as fh:
+                orders = [json.loads(line) for line in fh]
+            
+            if header != EXPORT_CSV_COLUMNS:
+                log_test("Export Orders", "FAIL", f"Unexpected CSV header: {header}")
                 return False
-        else:
-            log_test("PDF Generation", "FAIL", 
-                   f"Status: {response.status_code if response else 'No response'}")
+            exported = next((order for order in orders if order["id"] == ctx.created_order_id), None)
+            if exported is None or not exported.get("items"):
+                log_test("Export Orders", "FAIL", f"Order {ctx.created_order_id} missing from NDJSON or has no items")
+                return False
+            csv_lines = [row for row in csv_rows if row[0] == exported["order_number"]]
+            if len(csv_lines) != len(exported["items"]):
+                log_test("Export Orders", "FAIL",
+                       f"{exported['order_number']}: {len(csv_lines)} CSV lines for {len(exported['items'])} items")
+                return False
+            
+            # Update Order marked it paid today; a same-day range must include it, a future one nothing
+            today = datetime.now(BUSINESS_TZ).date().isoformat()
+            paid_path = os.path.join(tmp, "paid.ndjson")
+            paid_result = backend_stream.download_export(paid_path, "ndjson", today, today, ctx=ctx)
+            with open(paid_path, encoding="utf-8") as fh:
+                paid = [json.loads(line) for line in fh]
+            if any(order["status"] != "paid" for order in paid) or (
+                    exported["status"] == "paid" and exported["id"] not in {order["id"] for order in paid}):
+                log_test("Export Orders", "FAIL", f"paid_from/paid_to={today} returned {len(paid)} wrong orders")
+                return False
+            future = backend_stream.download_export(os.path.join(tmp, "future.csv"), "csv", "2099-01-01", ctx=ctx)
+            if future["lines"] != 1:
+                log_test("Export Orders", "FAIL", f"Future paid_from exported {future['lines'] - 1} lines")
+                return False
+        
+        params = {**get_tenant_params(ctx), "format": "xml"}
+        rejected = make_request("GET", "/orders/export", headers=get_auth_headers(ctx), params=params)
+        if rejected is None or rejected.status_code != 400:
+            log_test("Export Orders", "FAIL",
+                   f"Unknown format not rejected: {rejected.status_code if rejected is not None else 'No response'}")
+            return False
+        
+        log_test("Export Orders", "PASS",
+                 f"{len(orders)} orders / {len(csv_rows)} CSV lines ({csv_result['bytes'] / 1024:.0f} KiB), "
+                 f"{len(paid)} paid today (TTFB {paid_result['ttfb_s'] * 1000:.0f}ms)")
+        return True
+    except Exception as e:
+        log_test("Export Orders", "FAIL", f"Exception: {str(e)}")
+        return False
+
+def fetch_order_pdf(order_id, headers, params):
+    """One PDF download: (response, client latency s, server X-Render-Time ms or None)"""
+    start = time.perf_counter()
+    response = make_request("GET", f"/orders/{order_id}/pdf", headers=headers, params=params)
+    elapsed = time.perf_counter() - start
+    render_ms = response.headers.get("X-Render-Time") if response is not None else None
+    return response, elapsed, float(render_ms) if render_ms is not None else None
+
+def test_pdf_generation(ctx):
+    """Test PDF generation, then benchmark concurrent renders against the browser pool"""
+    try:
+        if not ctx.created_order_id:
+            log_test("PDF Generation", "SKIP", "No order ID available")
+            return False
+        
+        headers, params = {**get_auth_headers(ctx), **PDF_CACHE_BYPASS}, get_tenant_params(ctx)
+        latency = backend_metrics.LatencyHistogram()
+        render = backend_metrics.LatencyHistogram()
+        cache_statuses = Counter()
+        failures = []
+        
+        rss = backend_metrics.RssSampler(SERVER_PID) if SERVER_PID else contextlib.nullcontext()
+        with rss as sampler, ThreadPoolExecutor(max_workers=PDF_CONCURRENCY) as executor:
+            # A context copy per request keeps them attributed to this test in server_timings
+            futures = [executor.submit(contextvars.copy_context().run, fetch_order_pdf,
+                                       ctx.created_order_id, headers, params)
+                       for _ in range(PDF_REQUESTS)]
+            for future in futures:
+                response, elapsed, render_ms = future.result()
+                if response is None or response.status_code != 200:
+                    failures.append(response.status_code if response is not None else "No response")
+                    continue
+                content_type = response.headers.get('content-type', '')
+                if 'application/pdf' not in content_type:
+                    failures.append(f"content type {content_type}")
+                    continue
+                latency.record(elapsed)
+                cache_statuses[response.headers.get("X-Cache", "none")] += 1
+                if render_ms is not None:
+                    render.record(render_ms / 1000)
+        
+        if failures:
+            log_test("PDF Generation", "FAIL",
+                   f"{len(failures)}/{PDF_REQUESTS} requests failed: {failures[:5]}")
             return False
+        
+        summary = latency.summary()
+        details = (f"{PDF_REQUESTS} PDFs x{PDF_CONCURRENCY} concurrent, "
+                   f"size: {len(backend_cassette.body_view(response))} bytes, "
+                   f"p50 {summary['p50_ms']:.0f}ms, p95 {summary['p95_ms']:.0f}ms")
+        if render.count:
+            details += f", server render p95 {render.summary()['p95_ms']:.0f}ms"
+        # Say what was measured: fresh renders, or a server that ignored the bypass and served its cache
+        renders = cache_statuses["BYPASS"] + cache_statuses["MISS"]
+        details += f", {renders}/{PDF_REQUESTS} rendered (X-Cache {dict(sorted(cache_statuses.items()))})"
+        if renders < PDF_REQUESTS:
+            details += "; cache hits included, so this is not a browser pool measurement"
+        if sampler and sampler.peak is not None:
+            details += f", peak RSS {sampler.peak / 1024 / 1024:.0f}MB"
+        log_test("PDF Generation", "PASS", details)
+        return True
     except Exception as e:
         log_test("PDF Generation", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_team_list():
-    """Test list team members"""
+def test_pdf_cache(ctx):
+    """Test the PDF cache: invalidated by an order update, then a faster hit and a 304 revalidation"""
+    try:
+        if not ctx.created_order_id:
+            log_test("PDF Cache", "SKIP", "No order ID available")
+            return False
+        
+        headers, params = get_auth_headers(ctx), get_tenant_params(ctx)
+        
+        # Any order change must produce a new receipt, so start from a guaranteed miss
+        response = make_request("PUT", f"/orders/{ctx.created_order_id}", headers=headers, params=params,
+                              data={"notes": f"PDF cache check {datetime.now().isoformat()}"})
+        if not response or response.status_code != 200:
+            log_test("PDF Cache", "FAIL",
+                   f"Order update status: {response.status_code if response else 'No response'}")
+            return False
+        
+        downloads = []
+        for _ in range(2):
+            response, elapsed, render_ms = fetch_order_pdf(ctx.created_order_id, headers, params)
+            if not response or response.status_code != 200:
+                log_test("PDF Cache", "FAIL",
+                       f"Status: {response.status_code if response else 'No response'}")
+                return False
+            downloads.append((response, elapsed, render_ms))
+        (first, first_s, first_render), (second, second_s, second_render) = downloads
+        
+        etag = second.headers.get("ETag")
+        cache_status = (first.headers.get("X-Cache"), second.headers.get("X-Cache"))
+        if not etag or etag != first.headers.get("ETag"):
+            log_test("PDF Cache", "FAIL", f"ETag missing or unstable: {first.headers.get('ETag')} -> {etag}")
+            return False
+        if cache_status != ("MISS", "HIT"):
+            log_test("PDF Cache", "FAIL", f"Expected MISS then HIT, got {cache_status}")
+            return False
+        if backend_cassette.body_view(second) != backend_cassette.body_view(first):
+            log_test("PDF Cache", "FAIL", "Cached PDF differs from the rendered one")
+            return False
+        if first_render is not None and second_render is not None and second_render > first_render:
+            log_test("PDF Cache", "FAIL",
+                   f"Cache hit took {second_render:.1f}ms server-side vs {first_render:.1f}ms to render")
+            return False
+        
+        response = make_request("GET", f"/orders/{ctx.created_order_id}/pdf",
+                              headers={**headers, "If-None-Match": etag}, params=params)
+        if not response or response.status_code != 304:
+            log_test("PDF Cache", "FAIL",
+                   f"Conditional GET status: {response.status_code if response else 'No response'} (expected 304)")
+            return False
+        
+        log_test("PDF Cache", "PASS",
+               f"miss {first_s * 1000:.0f}ms -> hit {second_s * 1000:.0f}ms "
+               f"({first_s / max(second_s, 1e-6):.1f}x), If-None-Match -> 304")
+        return True
+    except Exception as e:
+        log_test("PDF Cache", "FAIL", f"Exception: {str(e)}")
+        return False
+
+def test_team_list(ctx):
+    """Test list team members, and 304 revalidation of its ETag"""
     try:
-        response = make_request("GET", "/team", headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("GET", "/team", headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
             if "team" in result:
-                log_test("List Team Members", "PASS", f"Found {len(result['team'])} members")
-                return True
+                ok, details = check_revalidation("/team", response, ctx)
+                log_test("List Team Members", "PASS" if ok else "FAIL",
+                         f"Found {len(result['team'])} members; {details}")
+                return ok
             else:
                 log_test("List Team Members", "FAIL", f"No team field in response: {result}")
                 return False
@@ -511,25 +1152,54 @@ def test_team_list():
         log_test("List Team Members", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_team_invite():
-    """Test team invite"""
+def test_team_invite(ctx):
+    """Test team invite: a fast 201 from the outbox, then delivery to the SMTP sink"""
     try:
+        # Unique per run so the sink can tell this invite from earlier ones
+        email = f"invite-{uuid.uuid4().hex[:12]}@example.com"
         data = {
-            "email": "test@example.com",
+            "email": email,
             "role": "attendant"
         }
         
+        start = time.perf_counter()
         response = make_request("POST", "/team/invite", data=data,
-                              headers=get_auth_headers(), params=get_tenant_params())
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
+        elapsed_ms = (time.perf_counter() - start) * 1000
         
         if response and response.status_code == 201:
             result = response.json()
-            if "message" in result:
-                log_test("Team Invite", "PASS", f"Message: {result['message']}")
-                return True
-            else:
+            if "message" not in result:
                 log_test("Team Invite", "FAIL", f"No message in response: {result}")
                 return False
+            # Judged on the server's own time, so network and a busy client don't count;
+            # servers without Server-Timing fall back to the client-side latency
+            server_total = backend_metrics.parse_server_timing(response.headers.get("Server-Timing")).get("total")
+            handled_ms = server_total["dur"] if server_total else elapsed_ms
+            if handled_ms > INVITE_MAX_MS:
+                log_test("Team Invite", "FAIL",
+                       f"Server took {handled_ms:.0f}ms (limit {INVITE_MAX_MS:.0f}ms); is the email still sent inline?")
+                return False
+            if smtp_sink is None:
+                log_test("Team Invite", "PASS",
+                       f"Message: {result['message']} in {handled_ms:.0f}ms server-side "
+                       f"(delivery not checked, no SMTP sink)")
+                return True
+            
+            delivery_start = time.perf_counter()
+            delivered = smtp_sink.wait_for(lambda message: email in message["rcpt_to"], EMAIL_DELIVERY_TIMEOUT)
+            if delivered is None:
+                log_test("Team Invite", "FAIL", f"Invite email not delivered within {EMAIL_DELIVERY_TIMEOUT:.0f}s")
+                return False
+            body = delivered["message"].get_body(("html", "plain")).get_content()
+            if "accept-invite?token=" not in body:
+                log_test("Team Invite", "FAIL", f"Delivered email has no invite link: {delivered['message']['Subject']}")
+                return False
+            log_test("Team Invite", "PASS",
+                   f"201 in {handled_ms:.0f}ms server-side, "
+                   f"delivered {(time.perf_counter() - delivery_start) * 1000:.0f}ms later: "
+                   f"{delivered['message']['Subject']}")
+            return True
         else:
             log_test("Team Invite", "FAIL", 
                    f"Status: {response.status_code if response else 'No response'}")
@@ -538,15 +1208,15 @@ def test_team_invite():
         log_test("Team Invite", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_delete_service():
+def test_delete_service(ctx):
     """Test delete service"""
     try:
-        if not created_service_id:
+        if not ctx.created_service_id:
             log_test("Delete Service", "SKIP", "No service ID available")
             return False
             
-        response = make_request("DELETE", f"/services/{created_service_id}",
-                              headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("DELETE", f"/services/{ctx.created_service_id}",
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -564,15 +1234,41 @@ def test_delete_service():
         log_test("Delete Service", "FAIL", f"Exception: {str(e)}")
         return False
 
-def test_delete_client():
+def test_delete_order(ctx):
+    """Test delete order (the one Create Order made, so runs don't grow the tenant)"""
+    try:
+        if not ctx.created_order_id:
+            log_test("Delete Order", "SKIP", "No order ID available")
+            return False
+        
+        headers, params = get_auth_headers(ctx), get_tenant_params(ctx)
+        response = make_request("DELETE", f"/orders/{ctx.created_order_id}", headers=headers, params=params)
+        if not response or response.status_code != 200:
+            log_test("Delete Order", "FAIL",
+                   f"Status: {response.status_code if response else 'No response'}")
+            return False
+        
+        response = make_request("GET", f"/orders/{ctx.created_order_id}", headers=headers, params=params)
+        if response is None or response.status_code != 404:
+            log_test("Delete Order", "FAIL",
+                   f"Deleted order still readable: {response.status_code if response is not None else 'No response'}")
+            return False
+        
+        log_test("Delete Order", "PASS", f"Order {ctx.created_order_id} deleted, GET now 404")
+        return True
+    except Exception as e:
+        log_test("Delete Order", "FAIL", f"Exception: {str(e)}")
+        return False
+
+def test_delete_client(ctx):
     """Test delete client"""
     try:
-        if not created_client_id:
+        if not ctx.created_client_id:
             log_test("Delete Client", "SKIP", "No client ID available")
             return False
             
-        response = make_request("DELETE", f"/clients/{created_client_id}",
-                              headers=get_auth_headers(), params=get_tenant_params())
+        response = make_request("DELETE", f"/clients/{ctx.created_client_id}",
+                              headers=get_auth_headers(ctx), params=get_tenant_params(ctx))
         
         if response and response.status_code == 200:
             result = response.json()
@@ -592,46 +1288,144 @@ def test_delete_client():
 
 # ============ MAIN TEST EXECUTION ============
 
-def run_all_tests():
-    """Run all backend tests in sequence"""
-    print("=" * 80)
-    print("🚀 ESPAÇO BRAITE BACKEND API TESTS")
-    print("=" * 80)
-    
-    test_results = []
-    
-    # Test sequence
-    tests = [
-        ("Health Check", test_health_check),
-        ("Authentication Login", test_login),
-        ("Token Refresh", test_token_refresh),
-        ("Get Current User", test_me_endpoint),
-        ("Dashboard Analytics", test_dashboard),
-        ("List Clients", test_clients_list),
-        ("Create Client", test_create_client),
-        ("Update Client", test_update_client),
-        ("List Services", test_services_list),
-        ("Create Service", test_create_service),
-        ("List Orders", test_orders_list),
-        ("Create Order", test_create_order),
-        ("Update Order", test_update_order),
-        ("Get Single Order", test_get_single_order),
-        ("PDF Generation", test_pdf_generation),
-        ("List Team Members", test_team_list),
-        ("Team Invite", test_team_invite),
-        ("Delete Service", test_delete_service),
-        ("Delete Client", test_delete_client),
-    ]
-    
+# Test sequence
+TESTS = [
+    ("Health Check", test_health_check),
+    ("Authentication Login", test_login),
+    ("Token Refresh", test_token_refresh),
+    ("Get Current User", test_me_endpoint),
+    ("Dashboard Analytics", test_dashboard),
+    ("List Clients", test_clients_list),
+    ("Create Client", test_create_client),
+    ("Update Client", test_update_client),
+    ("Paginate Clients", test_clients_pagination),
+    ("List Services", test_services_list),
+    ("Create Service", test_create_service),
+    ("List Orders", test_orders_list),
+    ("Create Order", test_create_order),
+    ("Batch Create Orders", test_create_orders_batch),
+    ("Project Orders", test_orders_projection),
+    ("Paginate Orders", test_orders_pagination),
+    ("Update Order", test_update_order),
+    ("Get Single Order", test_get_single_order),
+    ("Export Orders", test_order_export),
+    ("PDF Generation", test_pdf_generation),
+    ("PDF Cache", test_pdf_cache),
+    ("List Team Members", test_team_list),
+    ("Team Invite", test_team_invite),
+    ("Delete Order", test_delete_order),
+    ("Delete Service", test_delete_service),
+    ("Delete Client", test_delete_client),
+]
+
+# Data dependencies between tests, used by the concurrent runner. A test starts
+# as soon as everything it depends on has finished (pass or fail, like the
+# sequential runner, so dependents still report SKIP/FAIL themselves).
+TEST_DEPENDENCIES = {
+    "Health Check": [],
+    "Authentication Login": [],
+    "Token Refresh": ["Authentication Login"],
+    "Get Current User": ["Authentication Login"],
+    "Dashboard Analytics": ["Authentication Login"],
+    "List Clients": ["Authentication Login"],
+    "Create Client": ["Authentication Login"],
+    "Update Client": ["Create Client"],
+    "Paginate Clients": ["Create Client"],
+    "List Services": ["Authentication Login"],
+    # Revalidates the catalog ETag, which creating a service changes
+    "Create Service": ["List Services"],
+    "List Orders": ["Authentication Login"],
+    "Create Order": ["Create Client", "Create Service"],
+    "Batch Create Orders": ["Create Client", "Create Service"],
+    "Paginate Orders": ["Create Order", "Batch Create Orders"],
+    "Project Orders": ["Create Order"],
+    "Update Order": ["Create Order"],
+    "Get Single Order": ["Create Order"],
+    # Expects the order paid today
+    "Export Orders": ["Update Order"],
+    "PDF Generation": ["Create Order"],
+    # Updates the order and expects nothing else to change it between downloads
+    "PDF Cache": ["Update Order", "Update Client", "PDF Generation"],
+    "List Team Members": ["Authentication Login"],
+    "Team Invite": ["Authentication Login"],
+    "Delete Order": ["Project Orders", "Paginate Orders", "Update Order", "Get Single Order",
+                     "Export Orders", "PDF Generation", "PDF Cache"],
+    "Delete Service": ["Batch Create Orders", "Update Order", "Get Single Order", "PDF Generation", "PDF Cache"],
+    "Delete Client": ["Update Client", "Paginate Clients", "Paginate Orders", "Batch Create Orders",
+                      "Update Order", "Get Single Order", "Export Orders", "PDF Generation", "PDF Cache"],
+}
+
+# Wall time per test name, filled in by run_test
+test_durations = {}
+
+# Server-side query deltas per test (or per run when concurrent), from GET /metrics
+query_costs = {}
+
+def run_test(test_name, test_func, ctx):
+    """Run a single test, converting unexpected errors into a FAIL"""
+    start = time.perf_counter()
+    token = current_test.set(test_name)
+    try:
+        return test_func(ctx)
+    except Exception as e:
+        log_test(test_name, "FAIL", f"Unexpected error: {str(e)}")
+        return False
+    finally:
+        current_test.reset(token)
+        test_durations[test_name] = time.perf_counter() - start
+
+def scrape_query_stats():
+    """Server query aggregates from GET /metrics, or None without METRICS_TOKEN or if the server refuses"""
+    if not METRICS_TOKEN:
+        return None
+    try:
+        # Straight through the session so scrapes don't show up in the latency report
+        response = get_session().get(f"{API_BASE}/metrics", headers={"Authorization": f"Bearer {METRICS_TOKEN}"},
+                                     timeout=REQUEST_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.json().get("queries")
+
+def run_tests_sequential(tests, ctx, query_metrics=False):
+    results = []
     for test_name, test_func in tests:
-        try:
-            result = test_func()
-            test_results.append((test_name, result))
-        except Exception as e:
-            log_test(test_name, "FAIL", f"Unexpected error: {str(e)}")
-            test_results.append((test_name, False))
-    
-    # Summary
+        before = scrape_query_stats() if query_metrics else None
+        results.append((test_name, run_test(test_name, test_func, ctx)))
+        if before is not None:
+            after = scrape_query_stats()
+            if after is not None:
+                query_costs[test_name] = backend_metrics.diff_query_stats(before, after)
+    return results
+
+async def run_tests_concurrent(tests, ctx, dependencies=TEST_DEPENDENCIES):
+    """Run tests as an asyncio task graph; blocking requests calls run in worker threads"""
+    tasks = {}
+    # The default executor is sized by CPU count; give every test its own worker
+    executor = ThreadPoolExecutor(max_workers=len(tests))
+    loop = asyncio.get_running_loop()
+
+    async def run_node(test_name, test_func):
+        deps = [tasks[dep] for dep in dependencies.get(test_name, [])]
+        if deps:
+            await asyncio.wait(deps)
+        return await loop.run_in_executor(executor, run_test, test_name, test_func, ctx)
+
+    # Tests are listed in execution order, so dependencies always exist first
+    for test_name, test_func in tests:
+        missing = [dep for dep in dependencies.get(test_name, []) if dep not in tasks]
+        if missing:
+            raise ValueError(f"{test_name} depends on unscheduled tests: {missing}")
+        tasks[test_name] = asyncio.create_task(run_node(test_name, test_func))
+
+    try:
+        await asyncio.wait(tasks.values())
+    finally:
+        executor.shutdown(wait=False)
+    return [(test_name, tasks[test_name].result()) for test_name, _ in tests]
+
+def print_summary(test_results):
     print("\n" + "=" * 80)
     print("📊 TEST SUMMARY")
     print("=" * 80)
@@ -643,14 +1437,250 @@ def run_all_tests():
         status = "✅ PASS" if result else "❌ FAIL"
         print(f"{status} {test_name}")
     
+    backend_metrics.print_timing_breakdown(server_timings.summaries(), test_durations, SLOW_TEST_MS / 1000)
+    
     print(f"\n🎯 Results: {passed}/{total} tests passed ({passed/total*100:.1f}%)")
+    print(f"🔌 Connections: {connection_stats.summary()}")
     
     if passed == total:
         print("🎉 All tests passed! Backend API is working correctly.")
     else:
         print(f"⚠️  {total - passed} tests failed. Check the logs above for details.")
+
+def export_results(test_results, json_path=None, csv_path=None, junit_path=None,
+                   baseline_path=None, max_p95_regression=20.0):
+    """Write machine-readable results; returns False if p95 regressed past the baseline"""
+    report = backend_metrics.build_report(latency_recorder, test_results, test_durations,
+                                          server_timings.summaries())
+    backend_metrics.print_latency_table(report)
+    
+    if json_path:
+        backend_metrics.write_json(report, json_path)
+        print(f"📝 JSON results written to {json_path}")
+    if csv_path:
+        backend_metrics.write_csv(report, csv_path)
+        print(f"📝 CSV results written to {csv_path}")
+    if junit_path:
+        backend_metrics.write_junit(report, junit_path)
+        print(f"📝 JUnit results written to {junit_path}")
+    
+    if baseline_path:
+        regressions = backend_metrics.compare_to_baseline(report, baseline_path, max_p95_regression)
+        for endpoint, before, after in regressions:
+            print(f"❌ p95 regression on {endpoint}: {before:.1f}ms → {after:.1f}ms")
+        if regressions:
+            return False
+        print(f"✅ No p95 regressions beyond {max_p95_regression:.0f}% of {baseline_path}")
+    return True
+
+def run_all_tests(concurrent=False, query_metrics=False, ctx=None):
+    """
+    Run all backend tests as ctx (default: the shared context), in sequence or
+    as a concurrent dependency graph. With query_metrics, GET /metrics is
+    scraped around every test (around the whole run when concurrent, where
+    queries can't be told apart per test).
+    """
+    ctx = ctx or context
+    print("=" * 80)
+    print("🚀 ESPAÇO BRAITE BACKEND API TESTS")
+    print("=" * 80)
+    
+    query_costs.clear()
+    before = scrape_query_stats() if query_metrics else None
+    start = time.perf_counter()
+    if concurrent:
+        test_results = asyncio.run(run_tests_concurrent(TESTS, ctx))
+    else:
+        test_results = run_tests_sequential(TESTS, ctx, query_metrics)
+    elapsed = time.perf_counter() - start
+    
+    print_summary(test_results)
+    print(f"⏱️  Wall time: {elapsed:.2f}s ({'concurrent' if concurrent else 'sequential'})")
+    
+    if query_metrics:
+        after = scrape_query_stats()
+        if before is None or after is None:
+            print("⚠️  Server query stats unavailable (GET /metrics needs BRAITE_METRICS_TOKEN)")
+        else:
+            if concurrent:
+                query_costs["(whole run)"] = backend_metrics.diff_query_stats(before, after)
+            backend_metrics.print_query_report(query_costs)
     
     return test_results
 
+# ============ PARALLEL SESSIONS ============
+
+def run_session(base_url, username, password, concurrent=False):
+    """
+    Process pool worker: run the whole suite as one user (and so one tenant)
+    with its own context, HTTP session and recorders. Returns what the parent
+    needs to merge, all picklable.
+    """
+    global log_prefix, http_session, smtp_sink
+    log_prefix = f"[{username}] "
+    set_base_url(base_url)
+    # A forked worker starts with the parent's state; none of it belongs to this session
+    http_session = None
+    # The sink's messages arrive in the parent process, out of this worker's sight
+    smtp_sink = None
+    connection_stats.reset()
+    latency_recorder.reset()
+    server_timings.reset()
+    test_durations.clear()
+    
+    ctx = RunContext(username, password)
+    start = time.perf_counter()
+    if concurrent:
+        test_results = asyncio.run(run_tests_concurrent(TESTS, ctx))
+    else:
+        test_results = run_tests_sequential(TESTS, ctx)
+    return {
+        "label": ctx.label,
+        "tenant_id": ctx.tenant_id,
+        "results": test_results,
+        "durations": dict(test_durations),
+        "elapsed": time.perf_counter() - start,
+        "latency": latency_recorder.export_state(),
+        "server_timings": server_timings.export_state(),
+        "connections": connection_stats.export_state(),
+    }
+
+def run_parallel_sessions(credentials, concurrent=False):
+    """
+    Run the full CRUD flow once per (username, password), each in its own
+    process, all at the same time. Each user should own a different tenant;
+    results come back prefixed with the user's label.
+    """
+    print("=" * 80)
+    print(f"🚀 ESPAÇO BRAITE BACKEND API TESTS ({len(credentials)} PARALLEL SESSIONS)")
+    print("=" * 80)
+    
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(credentials)) as pool:
+        futures = [pool.submit(run_session, BASE_URL, username, password, concurrent)
+                   for username, password in credentials]
+        sessions = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    
+    test_results = []
+    for session in sessions:
+        latency_recorder.merge_state(session["latency"])
+        server_timings.merge_state(session["server_timings"], prefix=f"[{session['label']}] ")
+        connection_stats.merge_state(session["connections"])
+        for test_name, duration in session["durations"].items():
+            test_durations[f"[{session['label']}] {test_name}"] = duration
+        test_results.extend((f"[{session['label']}] {test_name}", result)
+                            for test_name, result in session["results"])
+    
+    print_summary(test_results)
+    print("\n👥 Sessions:")
+    for session in sessions:
+        passed = sum(1 for _, result in session["results"] if result)
+        print(f"   {session['label']:<12} tenant {session['tenant_id']}  "
+              f"{passed}/{len(session['results'])} passed in {session['elapsed']:.2f}s")
+    tenants = [session["tenant_id"] for session in sessions]
+    if len(set(tenants)) < len(tenants):
+        print("⚠️  Some sessions share a tenant; their CRUD tests may see each other's rows")
+    print(f"⏱️  Wall time: {elapsed:.2f}s ({len(sessions)} parallel sessions)")
+    
+    return test_results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Espaço Braite backend API tests")
+    parser.add_argument("--base-url", help="API host to test (default: $BRAITE_BASE_URL or the preview host)")
+    parser.add_argument("--local", action="store_true",
+                        help="start the in-process stub server and test against it (no network)")
+    parser.add_argument("--iterations", type=int, default=1, help="repeat the whole suite N times (every run is exported)")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="run independent tests concurrently following TEST_DEPENDENCIES")
+    parser.add_argument("--query-metrics", action="store_true",
+                        help="scrape GET /metrics around each test and print the server queries it ran")
+    parser.add_argument("--sessions", type=int, default=1, metavar="N",
+                        help="run the suite as N users (admin1..adminN, one tenant each) in parallel processes")
+    parser.add_argument("--users", metavar="USER[:PASS],...",
+                        help=f"comma-separated logins for --sessions instead of adminN (password default {TEST_PASSWORD})")
+    parser.add_argument("--record", metavar="PATH",
+                        help="append every request/response pair (PDFs included) to a traffic cassette")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="serve every response from a recorded cassette instead of the network")
+    parser.add_argument("--json", metavar="PATH", help="write latency/test results as JSON")
+    parser.add_argument("--csv", metavar="PATH", help="write per-endpoint latency as CSV")
+    parser.add_argument("--junit", metavar="PATH", help="write test results as JUnit XML")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON results to compare p95 against")
+    parser.add_argument("--max-p95-regression", type=float, default=20.0, metavar="PCT",
+                        help="fail when an endpoint's p95 grows by more than PCT%% (default 20)")
+    args = parser.parse_args(argv)
+    if args.replay and (args.local or args.record):
+        parser.error("--replay needs no server and records nothing; drop --local/--record")
+    if (args.record or args.replay) and (args.sessions > 1 or "," in (args.users or "")):
+        parser.error("a cassette holds a single session; drop --sessions/--users")
+    return args
+
 if __name__ == "__main__":
-    run_all_tests()
\ No newline at end of file
+    args = parse_args()
+    if args.users:
+        credentials = [(user.partition(":")[0], user.partition(":")[2] or TEST_PASSWORD)
+                       for user in args.users.split(",")]
+    else:
+        credentials = [(f"admin{n}", TEST_PASSWORD) for n in range(1, args.sessions + 1)]
+    stub = None
+    if args.local:
+        import backend_stub_server
+        smtp_sink = backend_smtp.SmtpSink()
+        stub = backend_stub_server.StubServer(tenants=len(credentials), smtp=smtp_sink.start_in_thread())
+        set_base_url(stub.start_in_thread())
+        # The stub serves from this process
+        SERVER_PID = SERVER_PID or os.getpid()
+        METRICS_TOKEN = backend_stub_server.METRICS_TOKEN
+    elif args.base_url:
+        set_base_url(args.base_url)
+    if args.replay:
+        cassette_player = backend_cassette.CassettePlayer(args.replay, scope=current_test.get)
+        # The recorded tokens expired long ago by the wall clock; by the recording's they are fresh
+        token_manager.clock = cassette_player.clock
+    elif args.record:
+        cassette_recorder = backend_cassette.CassetteWriter(args.record, scope=current_test.get)
+    if SMTP_SINK and not args.local and not args.replay:
+        host, _, port = SMTP_SINK.rpartition(":")
+        smtp_sink = backend_smtp.SmtpSink(host or "0.0.0.0", int(port))
+        smtp_sink.start_in_thread()
+    
+    # Every iteration is exported; with more than one, its tests are named "[run N] ..."
+    results = []
+    kept_durations, kept_timings = {}, []
+    try:
+        for iteration in range(1, args.iterations + 1):
+            if cassette_player:
+                cassette_player.rewind()
+            if len(credentials) > 1:
+                iteration_results = run_parallel_sessions(credentials, concurrent=args.concurrent)
+            else:
+                context = RunContext(*credentials[0])
+                iteration_results = run_all_tests(concurrent=args.concurrent, query_metrics=args.query_metrics)
+            prefix = f"[run {iteration}] " if args.iterations > 1 else ""
+            results += [(prefix + test_name, result) for test_name, result in iteration_results]
+            kept_durations.update((prefix + test_name, duration) for test_name, duration in test_durations.items())
+            kept_timings.append((prefix, server_timings.export_state()))
+            # The next iteration's summary covers its own tests only
+            test_durations.clear()
+            server_timings.reset()
+    finally:
+        if stub:
+            stub.stop()
+        if smtp_sink:
+            smtp_sink.stop()
+        if cassette_recorder:
+            cassette_recorder.close()
+            print(f"📼 Recorded {cassette_recorder.recorded} responses "
+                  f"({cassette_recorder.body_bytes / 1024 / 1024:.1f}MB of bodies) to {args.record}")
+        if cassette_player:
+            print(f"📼 Replayed {cassette_player.replayed} responses from {args.replay}"
+                  + (f", {cassette_player.misses} requests not in the cassette" if cassette_player.misses else ""))
+            cassette_player.close()
+    
+    test_durations.update(kept_durations)
+    for prefix, state in kept_timings:
+        server_timings.merge_state(state, prefix)
+    ok = export_results(results, args.json, args.csv, args.junit,
+                        args.baseline, args.max_p95_regression)
+    raise SystemExit(0 if ok else 1)
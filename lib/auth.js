@@ -1,10 +1,37 @@
 import jwt from 'jsonwebtoken';
 import bcrypt from 'bcryptjs';
-import { query } from './db.js';
+import { query, prepared } from './db.js';
+import { LRUCache } from './cache.js';
+import { Semaphore } from './ratelimit.js';
 
 const JWT_SECRET = process.env.JWT_SECRET || 'dev-secret-change-in-production';
 const JWT_REFRESH_SECRET = process.env.JWT_REFRESH_SECRET || 'dev-refresh-secret-change-in-production';
 
+// authenticate() needs the user + tenant memberships on every request; keep
+// them briefly in memory instead of re-running the three-table aggregate.
+// AUTH_CACHE_TTL_MS=0 disables the cache.
+const AUTH_CACHE_TTL_MS = parseInt(process.env.AUTH_CACHE_TTL_MS || '30000', 10);
+const AUTH_CACHE_MAX = parseInt(process.env.AUTH_CACHE_MAX || '1000', 10);
+
+// bcrypt at cost 10 is tens of ms of CPU on the event loop per call; cap how
+// many run at once so a login burst can't starve every other route. Calls
+// beyond the queue are refused with a RateLimitError (429).
+const AUTH_HASH_CONCURRENCY = parseInt(process.env.AUTH_HASH_CONCURRENCY || '2', 10);
+const AUTH_HASH_QUEUE_MAX = parseInt(process.env.AUTH_HASH_QUEUE_MAX || '20', 10);
+
+const passwordHashing = new Semaphore({
+  max: AUTH_HASH_CONCURRENCY,
+  maxQueue: AUTH_HASH_QUEUE_MAX,
+  message: 'Too many logins in progress, try again shortly'
+});
+
+const userCache = new LRUCache({
+  max: AUTH_CACHE_TTL_MS > 0 ? AUTH_CACHE_MAX : 0,
+  ttl: AUTH_CACHE_TTL_MS
+});
+const pendingUserLookups = new Map();
+let userCacheGeneration = 0;
+
 export function generateAccessToken(payload) {
   return jwt.sign(payload, JWT_SECRET, { expiresIn: '15m' });
 }
@@ -30,37 +57,91 @@ export function verifyRefreshToken(token) {
 }
 
 export async function hashPassword(password) {
-  return bcrypt.hash(password, 10);
+  return passwordHashing.run(() => bcrypt.hash(password, 10));
 }
 
 export async function comparePassword(password, hash) {
-  return bcrypt.compare(password, hash);
+  return passwordHashing.run(() => bcrypt.compare(password, hash));
+}
+
+export function getPasswordHashingStats() {
+  return passwordHashing.stats();
 }
 
+// Runs on every authenticated request that misses the cache
+const USER_WITH_TENANTS = prepared('user_with_tenants', `
+  SELECT 
+    u.id, u.email, u.username, u.full_name,
+    json_agg(
+      json_build_object(
+        'tenant_id', t.id,
+        'tenant_name', t.name,
+        'tenant_slug', t.slug,
+        'role', ut.role,
+        'primary_color', t.primary_color,
+        'logo_url', t.logo_url
+      )
+    ) as tenants
+  FROM users u
+  LEFT JOIN user_tenants ut ON u.id = ut.user_id
+  LEFT JOIN tenants t ON ut.tenant_id = t.id
+  WHERE u.id = $1
+  GROUP BY u.id, u.email, u.username, u.full_name
+`);
+
 export async function getUserWithTenants(userId) {
-  const result = await query(`
-    SELECT 
-      u.id, u.email, u.username, u.full_name,
-      json_agg(
-        json_build_object(
-          'tenant_id', t.id,
-          'tenant_name', t.name,
-          'tenant_slug', t.slug,
-          'role', ut.role,
-          'primary_color', t.primary_color,
-          'logo_url', t.logo_url
-        )
-      ) as tenants
-    FROM users u
-    LEFT JOIN user_tenants ut ON u.id = ut.user_id
-    LEFT JOIN tenants t ON ut.tenant_id = t.id
-    WHERE u.id = $1
-    GROUP BY u.id, u.email, u.username, u.full_name
-  `, [userId]);
+  const result = await query(USER_WITH_TENANTS, [userId]);
   
   return result.rows[0] || null;
 }
 
+// Cached getUserWithTenants. Concurrent misses for the same user share one
+// query, and a lookup that raced with an invalidation is not cached.
+export async function getCachedUserWithTenants(userId) {
+  const cached = userCache.get(userId);
+  if (cached) return cached;
+  
+  let pending = pendingUserLookups.get(userId);
+  if (!pending) {
+    const generation = userCacheGeneration;
+    pending = getUserWithTenants(userId)
+      .then(user => {
+        if (user && generation === userCacheGeneration) {
+          userCache.set(userId, user);
+        }
+        return user;
+      })
+      .finally(() => pendingUserLookups.delete(userId));
+    pendingUserLookups.set(userId, pending);
+  }
+  
+  return pending;
+}
+
+// Call when a user's memberships or roles change (invite accepted, role updated)
+export function invalidateUserCache(userId) {
+  userCacheGeneration++;
+  pendingUserLookups.delete(userId);
+  userCache.delete(userId);
+}
+
+// Call when a tenant changes (name, branding, membership list)
+export function invalidateTenantUserCache(tenantId) {
+  userCacheGeneration++;
+  pendingUserLookups.clear();
+  userCache.deleteWhere(user => user.tenants?.some(t => t.tenant_id === tenantId));
+}
+
+export function clearUserCache() {
+  userCacheGeneration++;
+  pendingUserLookups.clear();
+  userCache.clear();
+}
+
+export function getUserCacheStats() {
+  return userCache.stats();
+}
+
 export function hasPermission(role, action) {
   const permissions = {
     owner: ['create', 'read', 'update', 'delete', 'manage_team', 'manage_settings'],
@@ -0,0 +1,92 @@
+// Small in-process LRU cache with optional per-entry TTL.
+// Map iteration order is insertion order, so re-inserting on read keeps the
+// least recently used entry first in line for eviction.
+// Bounded by entry count (`max`) and, when `sizeOf` is given, by the summed
+// size of the values (`maxSize`, e.g. bytes).
+export class LRUCache {
+  constructor({ max = 1000, ttl = 0, maxSize = 0, sizeOf = null } = {}) {
+    this.max = max;
+    this.ttl = ttl;
+    this.maxSize = maxSize;
+    this.sizeOf = sizeOf;
+    this.map = new Map();
+    this.totalSize = 0;
+    this.hits = 0;
+    this.misses = 0;
+  }
+
+  get(key) {
+    const entry = this.map.get(key);
+
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt && entry.expiresAt <= Date.now()) {
+      this.delete(key);
+      this.misses++;
+      return undefined;
+    }
+
+    this.map.delete(key);
+    this.map.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  set(key, value, ttl = this.ttl) {
+    if (this.max <= 0) return;
+
+    const size = this.sizeOf ? this.sizeOf(value) : 0;
+
+    // A value larger than the whole budget would only evict everything else
+    if (this.maxSize > 0 && size > this.maxSize) return;
+
+    this.delete(key);
+    this.map.set(key, { value, size, expiresAt: ttl > 0 ? Date.now() + ttl : 0 });
+    this.totalSize += size;
+
+    while (this.map.size > this.max || (this.maxSize > 0 && this.totalSize > this.maxSize)) {
+      this.delete(this.map.keys().next().value);
+    }
+  }
+
+  delete(key) {
+    const entry = this.map.get(key);
+
+    if (!entry) return false;
+
+    this.totalSize -= entry.size;
+    return this.map.delete(key);
+  }
+
+  // Remove every entry whose value matches, e.g. all users of one tenant
+  deleteWhere(predicate) {
+    for (const [key, entry] of this.map) {
+      if (predicate(entry.value, key)) {
+        this.delete(key);
+      }
+    }
+  }
+
+  clear() {
+    this.map.clear();
+    this.totalSize = 0;
+  }
+
+  get size() {
+    return this.map.size;
+  }
+
+  stats() {
+    return {
+      size: this.map.size,
+      max: this.max,
+      totalSize: this.totalSize,
+      maxSize: this.maxSize,
+      hits: this.hits,
+      misses: this.misses
+    };
+  }
+}
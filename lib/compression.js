@@ -0,0 +1,96 @@
+import zlib from 'zlib';
+import { promisify } from 'util';
+import { serverTimingEntry } from './timing.js';
+
+// JSON responses smaller than this go out as-is; framing overhead eats the gain
+export const COMPRESSION_MIN_BYTES = parseInt(process.env.COMPRESSION_MIN_BYTES || '1024', 10);
+// Brotli's default (11) is meant for static assets; 4 compresses JSON better
+// than gzip at a similar CPU cost
+const BROTLI_QUALITY = parseInt(process.env.COMPRESSION_BROTLI_QUALITY || '4', 10);
+
+const brotliCompress = promisify(zlib.brotliCompress);
+const gzip = promisify(zlib.gzip);
+
+// Preferred first when the client accepts both with the same q-value
+const SUPPORTED_ENCODINGS = ['br', 'gzip'];
+
+// Pick the response encoding from an Accept-Encoding header, or null for identity
+export function negotiateEncoding(acceptEncoding) {
+  if (!acceptEncoding) return null;
+
+  const accepted = new Map();
+
+  for (const part of acceptEncoding.split(',')) {
+    const [name, ...params] = part.trim().toLowerCase().split(';');
+    const qParam = params.map((param) => param.trim()).find((param) => param.startsWith('q='));
+    const q = qParam ? parseFloat(qParam.slice(2)) : 1;
+
+    if (name) {
+      accepted.set(name, isNaN(q) ? 0 : q);
+    }
+  }
+
+  let best = null;
+  let bestQ = 0;
+
+  for (const encoding of SUPPORTED_ENCODINGS) {
+    const q = accepted.has(encoding) ? accepted.get(encoding) : (accepted.get('*') ?? 0);
+
+    if (q > bestQ) {
+      best = encoding;
+      bestQ = q;
+    }
+  }
+
+  return best;
+}
+
+async function encode(body, encoding) {
+  if (encoding === 'br') {
+    return brotliCompress(body, {
+      params: {
+        [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT,
+        [zlib.constants.BROTLI_PARAM_QUALITY]: BROTLI_QUALITY,
+        [zlib.constants.BROTLI_PARAM_SIZE_HINT]: body.length
+      }
+    });
+  }
+
+  return gzip(body);
+}
+
+// Re-encode a JSON response with the best encoding the client accepts. Other
+// content types (PDFs are already compressed), bodiless and already encoded
+// responses pass through untouched.
+export async function compressResponse(request, response) {
+  const contentType = response.headers.get('content-type') || '';
+
+  if (!contentType.includes('application/json') || response.headers.has('content-encoding') || !response.body) {
+    return response;
+  }
+
+  // Caches must keep identity and encoded copies apart
+  response.headers.append('Vary', 'Accept-Encoding');
+
+  const encoding = negotiateEncoding(request.headers.get('accept-encoding'));
+
+  if (!encoding) {
+    return response;
+  }
+
+  const body = Buffer.from(await response.arrayBuffer());
+
+  if (body.length < COMPRESSION_MIN_BYTES) {
+    return new Response(body, { status: response.status, headers: response.headers });
+  }
+
+  const start = performance.now();
+  const compressed = await encode(body, encoding);
+  const headers = new Headers(response.headers);
+  headers.set('Content-Encoding', encoding);
+  // Runs after the handler, so it adds its own entry to the handler's Server-Timing
+  headers.append('Server-Timing', serverTimingEntry('compress', performance.now() - start, encoding));
+  headers.set('Content-Length', String(compressed.length));
+
+  return new Response(compressed, { status: response.status, headers });
+}
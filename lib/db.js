@@ -1,7 +1,38 @@
 import { Pool } from 'pg';
+import { AsyncLocalStorage } from 'async_hooks';
+import { createHash } from 'crypto';
 
 let pool = null;
 
+// Per-request query counters; see trackQueries()
+const queryStatsStorage = new AsyncLocalStorage();
+
+// Process-wide per-statement aggregates; see getQueryStats()
+// QUERY_LOG_SAMPLE_RATE: share of queries logged to stdout (0 = none)
+// QUERY_SLOW_MS: queries at least this slow are always logged and counted
+const QUERY_LOG_SAMPLE_RATE = parseFloat(process.env.QUERY_LOG_SAMPLE_RATE || '0');
+const QUERY_SLOW_MS = parseFloat(process.env.QUERY_SLOW_MS || '200');
+// Distinct statements tracked; anything beyond is folded into one bucket
+const MAX_TRACKED_STATEMENTS = 500;
+const OTHER_STATEMENTS = '<other statements>';
+
+let statementStats = new Map();
+let statsSince = new Date();
+
+// Named (server-side prepared) statements; see prepared().
+// DB_PREPARED_STATEMENTS=false sends every query unnamed, e.g. behind a
+// transaction-mode PgBouncer, where a session's statements aren't kept.
+let preparedEnabled = process.env.DB_PREPARED_STATEMENTS !== 'false';
+// Distinct statements that get a name (each is prepared once per pooled
+// connection); variants beyond this run unnamed. The per-family cap keeps
+// one family's variants (?fields= projections are client-chosen) from
+// using up the registry before other hot statements are first seen.
+const MAX_PREPARED_STATEMENTS = parseInt(process.env.DB_PREPARED_MAX || '200', 10);
+const MAX_PREPARED_PER_FAMILY = parseInt(process.env.DB_PREPARED_PER_FAMILY || '16', 10);
+const preparedNames = new Map();
+const preparedFamilies = new Map();
+let preparedOverflow = 0;
+
 export function getPool() {
   if (!pool) {
     const DATABASE_URL = process.env.DATABASE_URL;
@@ -25,16 +56,220 @@ export function getPool() {
   return pool;
 }
 
-export async function query(text, params) {
-  const pool = getPool();
-  const start = Date.now();
+// Whitespace-collapsed SQL is the aggregation key (parameters never appear in it)
+function normalizeStatement(text) {
+  return text.replace(/\s+/g, ' ').trim();
+}
+
+function recordStatement(text, name, duration, rows, failed) {
+  let key = normalizeStatement(text);
+  let entry = statementStats.get(key);
+  
+  if (!entry) {
+    if (statementStats.size >= MAX_TRACKED_STATEMENTS) {
+      key = OTHER_STATEMENTS;
+      entry = statementStats.get(key);
+    }
+    if (!entry) {
+      entry = { calls: 0, errors: 0, slow: 0, totalMs: 0, maxMs: 0, rows: 0, prepared: null };
+      statementStats.set(key, entry);
+    }
+  }
+  
+  if (name && key !== OTHER_STATEMENTS) {
+    entry.prepared = name;
+  }
+  
+  entry.calls++;
+  entry.totalMs += duration;
+  entry.maxMs = Math.max(entry.maxMs, duration);
+  entry.rows += rows;
+  if (failed) entry.errors++;
+  if (duration >= QUERY_SLOW_MS) entry.slow++;
+}
+
+// Register a hot statement for server-side preparation. Returns a statement
+// to pass to query()/tx.query() in place of the SQL text: pg then parses and
+// plans it once per pooled connection and only binds and executes it after.
+// Names come from a hash of the SQL, so variants of one statement (e.g. per
+// ?fields= projection) get their own; `family` just makes them readable in
+// pg_stat_activity and GET /metrics.
+export function prepared(family, text) {
+  let name = preparedNames.get(text);
+  
+  if (name === undefined) {
+    const familySize = preparedFamilies.get(family) || 0;
+    
+    if (preparedNames.size >= MAX_PREPARED_STATEMENTS || familySize >= MAX_PREPARED_PER_FAMILY) {
+      preparedOverflow++;
+      return { name: null, text };
+    }
+    name = `${family}_${createHash('sha1').update(text).digest('hex').slice(0, 12)}`;
+    preparedNames.set(text, name);
+    preparedFamilies.set(family, familySize + 1);
+  }
+  
+  return { name, text };
+}
+
+// Turn preparation on or off at runtime (benchmarks compare both)
+export function setPreparedStatements(enabled) {
+  preparedEnabled = enabled;
+}
+
+export function getPreparedStatementStats() {
+  return {
+    enabled: preparedEnabled,
+    registered: preparedNames.size,
+    max: MAX_PREPARED_STATEMENTS,
+    maxPerFamily: MAX_PREPARED_PER_FAMILY,
+    overflow: preparedOverflow
+  };
+}
+
+async function runQuery(executor, statement, params) {
+  const start = performance.now();
+  const text = typeof statement === 'string' ? statement : statement.text;
+  const name = preparedEnabled && typeof statement !== 'string' ? statement.name : null;
+  let rows = 0;
+  let failed = false;
+  
   try {
-    const res = await pool.query(text, params);
-    const duration = Date.now() - start;
-    console.log('Executed query', { text, duration, rows: res.rowCount });
+    const res = await executor.query(name ? { name, text, values: params } : text, params);
+    rows = res.rowCount || 0;
     return res;
   } catch (error) {
+    failed = true;
     console.error('Database query error:', error);
     throw error;
+  } finally {
+    const duration = performance.now() - start;
+    recordStatement(text, name, duration, rows, failed);
+    
+    if (duration >= QUERY_SLOW_MS) {
+      console.warn('Slow query', { text, duration: Math.round(duration), rows });
+    } else if (QUERY_LOG_SAMPLE_RATE > 0 && Math.random() < QUERY_LOG_SAMPLE_RATE) {
+      console.log('Executed query', { text, duration: Math.round(duration), rows });
+    }
+    
+    const stats = queryStatsStorage.getStore();
+    if (stats) {
+      stats.count++;
+      stats.duration += duration;
+    }
+  }
+}
+
+// Connection counts of the pg pool, or null before the first query
+export function getPoolStats() {
+  if (!pool) return null;
+  
+  return {
+    total: pool.totalCount,
+    idle: pool.idleCount,
+    waiting: pool.waitingCount,
+    max: pool.options.max
+  };
+}
+
+// `statement` is SQL text or a prepared() statement
+export async function query(statement, params) {
+  return runQuery(getPool(), statement, params);
+}
+
+// Run fn inside BEGIN/COMMIT on one pooled client. fn receives a
+// { query(statement, params) } handle; any throw rolls the transaction back.
+export async function withTransaction(fn) {
+  const client = await getPool().connect();
+  const tx = { query: (statement, params) => runQuery(client, statement, params) };
+  // Set when ROLLBACK itself fails: the connection's state is unknown, and
+  // release(error) makes pg destroy it instead of pooling it again
+  let rollbackError;
+  
+  try {
+    await tx.query('BEGIN');
+    const result = await fn(tx);
+    await tx.query('COMMIT');
+    return result;
+  } catch (error) {
+    await client.query('ROLLBACK').catch((failure) => {
+      rollbackError = failure;
+    });
+    throw error;
+  } finally {
+    client.release(rollbackError);
   }
 }
+
+// Iterate a large result `batchSize` rows at a time through a server-side
+// cursor, so memory stays flat however many rows match. One pooled
+// connection stays in a READ ONLY transaction (a single snapshot) until the
+// iteration ends; stopping early (break, or return() from a cancelled
+// stream) closes the cursor and hands the connection back.
+export async function* cursorQuery(text, params, batchSize = 1000) {
+  const client = await getPool().connect();
+  let finished = false;
+  // As in withTransaction(): a connection whose ROLLBACK failed is destroyed
+  let rollbackError;
+  
+  try {
+    await runQuery(client, 'BEGIN READ ONLY');
+    await runQuery(client, `DECLARE batch_cursor NO SCROLL CURSOR FOR ${text}`, params);
+    
+    while (true) {
+      const result = await runQuery(client, `FETCH ${batchSize} FROM batch_cursor`);
+      if (result.rows.length > 0) {
+        yield result.rows;
+      }
+      if (result.rows.length < batchSize) break;
+    }
+    
+    await runQuery(client, 'COMMIT');
+    finished = true;
+  } finally {
+    if (!finished) {
+      await client.query('ROLLBACK').catch((failure) => {
+        rollbackError = failure;
+      });
+    }
+    client.release(rollbackError);
+  }
+}
+
+// Run fn with a fresh query counter; every query() awaited inside it
+// (however deeply nested) is counted into the returned stats.
+export function trackQueries(fn) {
+  const stats = { count: 0, duration: 0 };
+  return queryStatsStorage.run(stats, async () => ({ result: await fn(), stats }));
+}
+
+// Run fn outside any request's query counter. Background work started from
+// a request (timers, detached promises) would otherwise keep counting into it.
+export function runUntracked(fn) {
+  return queryStatsStorage.exit(fn);
+}
+
+// Snapshot of the per-statement aggregates since start (or the last reset),
+// most expensive first. Totals only ever grow, so two snapshots can be diffed.
+export function getQueryStats() {
+  const statements = [...statementStats].map(([statement, entry]) => ({
+    statement,
+    ...entry,
+    totalMs: Math.round(entry.totalMs * 1000) / 1000,
+    maxMs: Math.round(entry.maxMs * 1000) / 1000
+  }));
+  statements.sort((a, b) => b.totalMs - a.totalMs);
+  
+  return {
+    since: statsSince.toISOString(),
+    sampleRate: QUERY_LOG_SAMPLE_RATE,
+    slowMs: QUERY_SLOW_MS,
+    prepared: getPreparedStatementStats(),
+    statements
+  };
+}
+
+export function resetQueryStats() {
+  statementStats = new Map();
+  statsSince = new Date();
+}
@@ -0,0 +1,239 @@
+import nodemailer from 'nodemailer';
+import { query, runUntracked } from './db.js';
+
+// Transactional outbox: requests only INSERT into email_outbox (inside their
+// own transaction), and a per-process worker delivers in the background, so
+// an API response never waits on SMTP and a crash can't lose a queued email.
+// Workers in several processes claim rows with FOR UPDATE SKIP LOCKED plus a
+// lease, so each email goes to one worker and a dead worker's claim expires.
+
+// Emails claimed and sent per pass over one pooled SMTP connection set
+const OUTBOX_BATCH_SIZE = parseInt(process.env.OUTBOX_BATCH_SIZE || '20', 10);
+// Idle poll for emails queued by other processes or due for a retry
+const OUTBOX_POLL_MS = parseInt(process.env.OUTBOX_POLL_MS || '5000', 10);
+// Delivery attempts before an email is marked failed
+const OUTBOX_MAX_ATTEMPTS = parseInt(process.env.OUTBOX_MAX_ATTEMPTS || '8', 10);
+// Retry delay doubles from this after each failed attempt, up to the max
+const OUTBOX_RETRY_BASE_MS = parseInt(process.env.OUTBOX_RETRY_BASE_MS || '10000', 10);
+const OUTBOX_RETRY_MAX_MS = parseInt(process.env.OUTBOX_RETRY_MAX_MS || String(60 * 60 * 1000), 10);
+// How long a claimed batch stays invisible to other workers
+const OUTBOX_LEASE_MS = 5 * 60 * 1000;
+
+const SMTP_POOL_CONNECTIONS = parseInt(process.env.SMTP_POOL_CONNECTIONS || '2', 10);
+
+// ============ TRANSPORT ============
+// One pooled transporter per process. Concurrent first sends share the
+// pending promise instead of each creating a transporter that is never closed.
+let transporterPromise = null;
+
+const counters = { transportersCreated: 0, batches: 0, sent: 0, retried: 0, failed: 0 };
+
+function getTransporter() {
+  if (!transporterPromise) {
+    transporterPromise = createTransporter().catch((error) => {
+      // Let the next batch try again
+      transporterPromise = null;
+      throw error;
+    });
+  }
+
+  return transporterPromise;
+}
+
+async function createTransporter() {
+  const { SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS } = process.env;
+  const pool = { pool: true, maxConnections: SMTP_POOL_CONNECTIONS };
+  let transporter;
+
+  if (!SMTP_HOST) {
+    // Use Ethereal for dev
+    const testAccount = await nodemailer.createTestAccount();
+    transporter = nodemailer.createTransport({
+      ...pool,
+      host: 'smtp.ethereal.email',
+      port: 587,
+      secure: false,
+      auth: {
+        user: testAccount.user,
+        pass: testAccount.pass,
+      },
+    });
+    console.log('📧 Using Ethereal test email account');
+  } else {
+    transporter = nodemailer.createTransport({
+      ...pool,
+      host: SMTP_HOST,
+      port: parseInt(SMTP_PORT || '587'),
+      secure: SMTP_PORT === '465',
+      // A local sink or relay may not need credentials
+      auth: SMTP_USER ? {
+        user: SMTP_USER,
+        pass: SMTP_PASS,
+      } : undefined,
+    });
+  }
+
+  counters.transportersCreated++;
+  return transporter;
+}
+
+// ============ OUTBOX ============
+
+// Queue an email for delivery. Pass the transaction handle as `db` so the
+// email commits (or rolls back) together with the row it is about.
+export async function enqueueEmail({ tenantId = null, to, subject, html }, db = { query }) {
+  const result = await db.query(`
+    INSERT INTO email_outbox (tenant_id, to_address, from_address, subject, html)
+    VALUES ($1, $2, $3, $4, $5)
+    RETURNING id
+  `, [tenantId, to, process.env.SMTP_FROM || 'noreply@espacobraite.com', subject, html]);
+
+  return result.rows[0].id;
+}
+
+function retryDelay(attempts) {
+  return Math.min(OUTBOX_RETRY_BASE_MS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_MS);
+}
+
+async function claimBatch() {
+  const result = await query(`
+    UPDATE email_outbox
+    SET attempts = attempts + 1,
+        locked_until = NOW() + $2 * INTERVAL '1 millisecond'
+    WHERE id IN (
+      SELECT id FROM email_outbox
+      WHERE status = 'pending'
+        AND next_attempt_at <= NOW()
+        AND (locked_until IS NULL OR locked_until < NOW())
+      ORDER BY next_attempt_at
+      LIMIT $1
+      FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+  `, [OUTBOX_BATCH_SIZE, OUTBOX_LEASE_MS]);
+
+  return result.rows;
+}
+
+async function deliver(transporter, email) {
+  try {
+    const info = await transporter.sendMail({
+      from: email.from_address,
+      to: email.to_address,
+      subject: email.subject,
+      html: email.html
+    });
+
+    await query(`
+      UPDATE email_outbox
+      SET status = 'sent', sent_at = NOW(), message_id = $2, locked_until = NULL, last_error = NULL
+      WHERE id = $1
+    `, [email.id, info.messageId]);
+    counters.sent++;
+
+    if (!process.env.SMTP_HOST) {
+      console.log('📧 Preview URL:', nodemailer.getTestMessageUrl(info));
+    }
+  } catch (error) {
+    await recordFailure(email, error);
+  }
+}
+
+async function recordFailure(email, error) {
+  const failed = email.attempts >= OUTBOX_MAX_ATTEMPTS;
+
+  await query(`
+    UPDATE email_outbox
+    SET status = $2, last_error = $3, locked_until = NULL,
+        next_attempt_at = NOW() + $4 * INTERVAL '1 millisecond'
+    WHERE id = $1
+  `, [email.id, failed ? 'failed' : 'pending', String(error.message || error), retryDelay(email.attempts)]);
+
+  if (failed) {
+    counters.failed++;
+    console.error(`📧 Giving up on email ${email.id} after ${email.attempts} attempts:`, error);
+  } else {
+    counters.retried++;
+    console.warn(`📧 Email ${email.id} attempt ${email.attempts} failed, retrying:`, error.message);
+  }
+}
+
+// ============ WORKER ============
+// Postgres undefined_table: email_outbox doesn't exist until POST /setup
+const UNDEFINED_TABLE = '42P01';
+
+let workerTimer = null;
+let running = false;
+let rerun = false;
+// Set while email_outbox is missing; the poll stays off until kickOutbox()
+let tableMissing = false;
+
+// Drain every due email, a batch at a time. Overlapping calls fold into one
+// extra pass instead of running concurrently.
+async function processOutbox() {
+  if (running) {
+    rerun = true;
+    return;
+  }
+
+  running = true;
+  try {
+    do {
+      rerun = false;
+      const batch = await claimBatch();
+      // A kickOutbox() that arrived during the claim may have queued an email
+      // this claim couldn't see; go round again rather than swallow it
+      if (batch.length === 0) {
+        if (rerun) continue;
+        break;
+      }
+
+      counters.batches++;
+      let transporter;
+      try {
+        transporter = await getTransporter();
+      } catch (error) {
+        await Promise.all(batch.map((email) => recordFailure(email, error)));
+        if (rerun) continue;
+        break;
+      }
+      await Promise.all(batch.map((email) => deliver(transporter, email)));
+      rerun = rerun || batch.length === OUTBOX_BATCH_SIZE;
+    } while (rerun);
+  } catch (error) {
+    if (error.code === UNDEFINED_TABLE) {
+      // Pause instead of failing every poll on a fresh database
+      if (!tableMissing) {
+        console.warn('📧 email_outbox does not exist yet; outbox polling paused until POST /setup');
+      }
+      tableMissing = true;
+      clearInterval(workerTimer);
+      workerTimer = null;
+    } else {
+      console.error('📧 Outbox worker error:', error);
+    }
+  } finally {
+    running = false;
+  }
+}
+
+// Start the background poll (idempotent). The timer is unref'd so it never
+// keeps the process alive on its own.
+export function startOutboxWorker() {
+  if (workerTimer || tableMissing || OUTBOX_POLL_MS <= 0) return;
+
+  workerTimer = runUntracked(() => setInterval(processOutbox, OUTBOX_POLL_MS));
+  workerTimer.unref?.();
+}
+
+// Deliver now instead of at the next poll; call after enqueued emails commit
+// (or after POST /setup creates the table, which resumes a paused poll)
+export function kickOutbox() {
+  tableMissing = false;
+  startOutboxWorker();
+  runUntracked(processOutbox);
+}
+
+export function getEmailStats() {
+  return { ...counters, running };
+}
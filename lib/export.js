@@ -0,0 +1,198 @@
+import { cursorQuery } from './db.js';
+import { Semaphore } from './ratelimit.js';
+import { REVENUE_TIMEZONE } from './revenue.js';
+
+// Streaming order export (GET /orders/export). Rows come off a server-side
+// cursor a batch at a time and each batch is encoded and handed to the
+// response stream only when the client is ready for more, so memory stays
+// flat whether the tenant has a hundred orders or a million.
+
+export const EXPORT_FORMATS = ['csv', 'ndjson'];
+
+// Rows per FETCH (and per response chunk)
+const ORDER_EXPORT_BATCH_SIZE = parseInt(process.env.ORDER_EXPORT_BATCH_SIZE || '1000', 10);
+// Each running export holds a pooled connection for its whole download
+const ORDER_EXPORT_CONCURRENCY = parseInt(process.env.ORDER_EXPORT_CONCURRENCY || '2', 10);
+
+const exportSlots = new Semaphore({
+  max: ORDER_EXPORT_CONCURRENCY,
+  maxQueue: 0,
+  message: 'Too many exports in progress, try again later'
+});
+
+const counters = { started: 0, completed: 0, cancelled: 0, failed: 0, rows: 0 };
+
+const ORDER_EXPORT_COLUMNS = `
+  o.id, o.order_number, o.status, o.total_amount, o.payment_method,
+  o.paid_at, o.created_at, o.notes,
+  c.name as client_name, c.phone as client_phone, c.vehicle_plate, c.vehicle_model,
+  COALESCE((
+    SELECT json_agg(json_build_object(
+      'service_name', oi.service_name,
+      'price', oi.price::text,
+      'quantity', oi.quantity
+    ) ORDER BY oi.created_at, oi.id)
+    FROM order_items oi
+    WHERE oi.order_id = o.id
+  ), '[]') as items
+`;
+
+// Every order, oldest first
+const ALL_ORDERS = `
+  SELECT ${ORDER_EXPORT_COLUMNS}
+  FROM orders o
+  LEFT JOIN clients c ON o.client_id = c.id
+  WHERE o.tenant_id = $1
+  ORDER BY o.created_at, o.id
+`;
+
+// Paid orders by payment day (business calendar days, like daily_revenue);
+// paid_to is inclusive. Either bound may be null. Exported for
+// scripts/explain-check.mjs (the full export reads every row by design).
+export const PAID_ORDERS = `
+  SELECT ${ORDER_EXPORT_COLUMNS}
+  FROM orders o
+  LEFT JOIN clients c ON o.client_id = c.id
+  WHERE o.tenant_id = $1
+    AND o.status = 'paid'
+    AND o.paid_at >= COALESCE($2::date::timestamp AT TIME ZONE '${REVENUE_TIMEZONE}', '-infinity')
+    AND o.paid_at < COALESCE(($3::date + 1)::timestamp AT TIME ZONE '${REVENUE_TIMEZONE}', 'infinity')
+  ORDER BY o.paid_at, o.id
+`;
+
+// One CSV line per order item (order and client columns repeated); orders
+// without items still get a line
+const CSV_ORDER_COLUMNS = [
+  'order_number', 'status', 'created_at', 'paid_at', 'payment_method', 'total_amount',
+  'client_name', 'client_phone', 'vehicle_plate', 'vehicle_model', 'notes'
+];
+const CSV_ITEM_COLUMNS = ['service_name', 'price', 'quantity'];
+
+function csvField(value) {
+  if (value === null || value === undefined) return '';
+
+  let text = value instanceof Date ? value.toISOString() : String(value);
+
+  // Spreadsheets run cells starting with these as formulas (numbers and
+  // phone numbers like +55 11 ... are left alone)
+  if (/^[=+\-@\t\r]/.test(text) && !/^[+-]?[\d\s().-]+$/.test(text)) {
+    text = `'${text}`;
+  }
+
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+}
+
+function csvLines(rows) {
+  let out = '';
+
+  for (const row of rows) {
+    const order = CSV_ORDER_COLUMNS.map((column) => csvField(row[column])).join(',');
+    const items = row.items.length > 0 ? row.items : [{}];
+
+    for (const item of items) {
+      out += order + ',' + CSV_ITEM_COLUMNS.map((column) => csvField(item[column])).join(',') + '\r\n';
+    }
+  }
+
+  return out;
+}
+
+// One JSON object per order, shaped like GET /orders/:id
+function ndjsonLines(rows) {
+  let out = '';
+
+  for (const row of rows) {
+    out += JSON.stringify(row) + '\n';
+  }
+
+  return out;
+}
+
+function isValidDate(value) {
+  const date = new Date(`${value}T00:00:00Z`);
+  return !isNaN(date) && date.toISOString().slice(0, 10) === value;
+}
+
+// Error message for invalid export parameters, or null
+export function validateExportParams({ format, paidFrom, paidTo }) {
+  if (!EXPORT_FORMATS.includes(format)) {
+    return `Unknown format: ${format} (use ${EXPORT_FORMATS.join(' or ')})`;
+  }
+
+  for (const [name, value] of [['paid_from', paidFrom], ['paid_to', paidTo]]) {
+    // Round-trip check, so 2024-02-30 is rejected rather than rolled over
+    if (value !== null && (!/^\d{4}-\d{2}-\d{2}$/.test(value) || !isValidDate(value))) {
+      return `${name} must be a date (YYYY-MM-DD)`;
+    }
+  }
+
+  if (paidFrom && paidTo && paidFrom > paidTo) {
+    return 'paid_from must not be after paid_to';
+  }
+
+  return null;
+}
+
+// Start an export and return its body as a ReadableStream of UTF-8 chunks.
+// Throws RateLimitError when ORDER_EXPORT_CONCURRENCY exports are running.
+// The response status is already sent when rows start flowing, so a database
+// error mid-export aborts the stream (the client sees a truncated transfer).
+export async function openOrderExport(tenantId, { format, paidFrom = null, paidTo = null }) {
+  await exportSlots.acquire();
+  counters.started++;
+
+  const ranged = paidFrom !== null || paidTo !== null;
+  const batches = ranged
+    ? cursorQuery(PAID_ORDERS, [tenantId, paidFrom, paidTo], ORDER_EXPORT_BATCH_SIZE)
+    : cursorQuery(ALL_ORDERS, [tenantId], ORDER_EXPORT_BATCH_SIZE);
+  const encoder = new TextEncoder();
+  let headerSent = false;
+  let released = false;
+
+  function finish(outcome) {
+    if (released) return;
+    released = true;
+    counters[outcome]++;
+    exportSlots.release();
+  }
+
+  return new ReadableStream({
+    async pull(controller) {
+      try {
+        if (!headerSent) {
+          headerSent = true;
+          if (format === 'csv') {
+            // BOM so spreadsheet apps read the accents as UTF-8
+            controller.enqueue(encoder.encode('\uFEFF' + [...CSV_ORDER_COLUMNS, ...CSV_ITEM_COLUMNS].join(',') + '\r\n'));
+            return;
+          }
+        }
+
+        const { value: rows, done } = await batches.next();
+
+        if (done) {
+          finish('completed');
+          controller.close();
+          return;
+        }
+
+        counters.rows += rows.length;
+        controller.enqueue(encoder.encode(format === 'csv' ? csvLines(rows) : ndjsonLines(rows)));
+      } catch (error) {
+        console.error('Order export failed:', error);
+        finish('failed');
+        controller.error(error);
+      }
+    },
+
+    // Client went away: close the cursor and free the connection now
+    async cancel() {
+      finish('cancelled');
+      await batches.return();
+    }
+  }, { highWaterMark: 1 });
+}
+
+export function getExportStats() {
+  return { ...counters, slots: exportSlots.stats() };
+}
@@ -142,15 +142,83 @@ export async function runMigrations() {
     `);
     console.log('✓ Created audit_logs table');
     
+    // Create daily_revenue rollup (paid order totals per tenant per local day)
+    await query(`
+      CREATE TABLE IF NOT EXISTS daily_revenue (
+        tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+        day DATE NOT NULL,
+        total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        order_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (tenant_id, day)
+      )
+    `);
+    console.log('✓ Created daily_revenue table');
+    
+    // Create order_counters (per-tenant order number sequence)
+    await query(`
+      CREATE TABLE IF NOT EXISTS order_counters (
+        tenant_id UUID PRIMARY KEY REFERENCES tenants(id) ON DELETE CASCADE,
+        last_number BIGINT NOT NULL DEFAULT 0
+      )
+    `);
+    console.log('✓ Created order_counters table');
+    
+    // Create resource_versions (per-tenant ETag counters, see lib/versions.js)
+    await query(`
+      CREATE TABLE IF NOT EXISTS resource_versions (
+        tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+        resource VARCHAR(50) NOT NULL,
+        version BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (tenant_id, resource)
+      )
+    `);
+    console.log('✓ Created resource_versions table');
+    
+    // Create email_outbox (emails queued by requests, delivered by lib/email.js)
+    await query(`
+      CREATE TABLE IF NOT EXISTS email_outbox (
+        id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+        tenant_id UUID REFERENCES tenants(id) ON DELETE CASCADE,
+        to_address VARCHAR(255) NOT NULL,
+        from_address VARCHAR(255) NOT NULL,
+        subject TEXT NOT NULL,
+        html TEXT NOT NULL,
+        status VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sent', 'failed')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        locked_until TIMESTAMP WITH TIME ZONE,
+        last_error TEXT,
+        message_id TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+        sent_at TIMESTAMP WITH TIME ZONE
+      )
+    `);
+    console.log('✓ Created email_outbox table');
+    
+    // Order numbers are unique per tenant, not globally
+    await query('ALTER TABLE orders DROP CONSTRAINT IF EXISTS orders_order_number_key');
+    await query('CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_tenant_order_number ON orders(tenant_id, order_number)');
+    
     // Create indexes
-    await query('CREATE INDEX IF NOT EXISTS idx_clients_tenant ON clients(tenant_id)');
     await query('CREATE INDEX IF NOT EXISTS idx_catalog_items_tenant ON catalog_items(tenant_id)');
-    await query('CREATE INDEX IF NOT EXISTS idx_orders_tenant ON orders(tenant_id)');
     await query('CREATE INDEX IF NOT EXISTS idx_orders_paid_at ON orders(paid_at)');
     await query('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)');
     await query('CREATE INDEX IF NOT EXISTS idx_user_tenants_user ON user_tenants(user_id)');
     await query('CREATE INDEX IF NOT EXISTS idx_user_tenants_tenant ON user_tenants(tenant_id)');
     await query('CREATE INDEX IF NOT EXISTS idx_invite_tokens_token ON invite_tokens(token)');
+    
+    // Composite/partial indexes matching the hot access paths: tenant-scoped
+    // listings in keyset order, paid-order revenue ranges and order items by order
+    await query('CREATE INDEX IF NOT EXISTS idx_orders_tenant_created ON orders(tenant_id, created_at DESC, id DESC)');
+    await query('CREATE INDEX IF NOT EXISTS idx_clients_tenant_created ON clients(tenant_id, created_at DESC, id DESC)');
+    await query(`CREATE INDEX IF NOT EXISTS idx_orders_tenant_paid_at ON orders(tenant_id, paid_at) WHERE status = 'paid'`);
+    await query('CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id)');
+    // Outbox worker claims: only undelivered emails, soonest due first
+    await query(`CREATE INDEX IF NOT EXISTS idx_email_outbox_pending ON email_outbox(next_attempt_at) WHERE status = 'pending'`);
+    
+    // Superseded by the composite indexes above (same leading column)
+    await query('DROP INDEX IF EXISTS idx_orders_tenant');
+    await query('DROP INDEX IF EXISTS idx_clients_tenant');
     console.log('✓ Created indexes');
     
     console.log('✅ All migrations completed successfully');
@@ -0,0 +1,202 @@
+import { query, prepared } from './db.js';
+import { recordNewOrdersRevenue } from './revenue.js';
+
+// Largest batch POST /orders/batch accepts in one transaction
+export const MAX_BATCH_ORDERS = parseInt(process.env.MAX_BATCH_ORDERS || '500', 10);
+
+const ORDER_STATUSES = ['pending', 'in_progress', 'completed', 'paid', 'cancelled'];
+
+// Largest value order_items.quantity (a Postgres int) can hold
+const MAX_ITEM_QUANTITY = 2147483647;
+
+// Error message for an invalid order payload, or null when it can be created
+export function validateOrder(order) {
+  if (!order || typeof order !== 'object') {
+    return 'Order must be an object';
+  }
+
+  if (!Array.isArray(order.items) || order.items.length === 0) {
+    return 'Order must have at least one item';
+  }
+
+  if (order.status && !ORDER_STATUSES.includes(order.status)) {
+    return `Invalid status: ${order.status}`;
+  }
+
+  for (const item of order.items) {
+    // Number() rather than parseFloat() so "5abc" is refused here, not by the numeric cast
+    const price = typeof item?.price === 'number' || typeof item?.price === 'string' ? Number(item.price) : NaN;
+    if (!item?.service_name || item.price === '' || !Number.isFinite(price)) {
+      return 'Each item needs a service_name and a price';
+    }
+
+    if (price < 0) {
+      return 'Item price cannot be negative';
+    }
+
+    // order_items.quantity is an int column; a missing quantity means one
+    const { quantity } = item;
+    if (quantity != null && !(Number.isInteger(quantity) && quantity >= 1 && quantity <= MAX_ITEM_QUANTITY)) {
+      return 'Item quantity must be a positive integer';
+    }
+  }
+
+  return null;
+}
+
+function formatOrderNumber(number) {
+  return 'OS-' + String(number).padStart(6, '0');
+}
+
+// Reserve `count` consecutive order numbers for a tenant. The counter row
+// stays locked until the surrounding transaction ends, so concurrent creates
+// can never hand out the same number.
+export async function allocateOrderNumbers(tx, tenantId, count) {
+  const result = await tx.query(`
+    INSERT INTO order_counters (tenant_id, last_number)
+    VALUES ($1, $2)
+    ON CONFLICT (tenant_id) DO UPDATE
+    SET last_number = order_counters.last_number + EXCLUDED.last_number
+    RETURNING last_number
+  `, [tenantId, count]);
+
+  const first = Number(result.rows[0].last_number) - count + 1;
+  return Array.from({ length: count }, (_, index) => formatOrderNumber(first + index));
+}
+
+// Insert validated orders and all their items with one multi-row INSERT
+// each (unnest keeps the parameter count fixed however large the batch).
+// Must run inside withTransaction(); returns the created rows in input order.
+export async function createOrders(tx, tenantId, userId, orders) {
+  const orderNumbers = await allocateOrderNumbers(tx, tenantId, orders.length);
+  const now = new Date();
+
+  const rows = orders.map((order, index) => ({
+    client_id: order.client_id || null,
+    order_number: orderNumbers[index],
+    status: order.status || 'pending',
+    total_amount: order.items.reduce((sum, item) => sum + (parseFloat(item.price) * (item.quantity || 1)), 0),
+    payment_method: order.payment_method || null,
+    notes: order.notes || null,
+    paid_at: order.status === 'paid' ? now : null
+  }));
+
+  const orderResult = await tx.query(`
+    INSERT INTO orders (tenant_id, client_id, order_number, status, total_amount, payment_method, notes, created_by, paid_at)
+    SELECT $1, client_id, order_number, status, total_amount, payment_method, notes, $2, paid_at
+    FROM unnest($3::uuid[], $4::varchar[], $5::varchar[], $6::numeric[], $7::varchar[], $8::text[], $9::timestamptz[])
+      AS input(client_id, order_number, status, total_amount, payment_method, notes, paid_at)
+    RETURNING *
+  `, [
+    tenantId,
+    userId,
+    rows.map((row) => row.client_id),
+    rows.map((row) => row.order_number),
+    rows.map((row) => row.status),
+    rows.map((row) => row.total_amount),
+    rows.map((row) => row.payment_method),
+    rows.map((row) => row.notes),
+    rows.map((row) => row.paid_at)
+  ]);
+
+  // RETURNING order is not guaranteed to follow the input; order numbers are unique per tenant
+  const byNumber = new Map(orderResult.rows.map((row) => [row.order_number, row]));
+  const created = rows.map((row) => byNumber.get(row.order_number));
+
+  const items = orders.flatMap((order, index) => order.items.map((item) => ({
+    order_id: created[index].id,
+    catalog_item_id: item.catalog_item_id || null,
+    service_name: item.service_name,
+    price: item.price,
+    quantity: item.quantity || 1
+  })));
+
+  await tx.query(`
+    INSERT INTO order_items (order_id, catalog_item_id, service_name, price, quantity)
+    SELECT * FROM unnest($1::uuid[], $2::uuid[], $3::varchar[], $4::numeric[], $5::int[])
+  `, [
+    items.map((item) => item.order_id),
+    items.map((item) => item.catalog_item_id),
+    items.map((item) => item.service_name),
+    items.map((item) => item.price),
+    items.map((item) => item.quantity)
+  ]);
+
+  await recordNewOrdersRevenue(tenantId, created, tx);
+
+  return created;
+}
+
+// Columns GET /orders and the dashboard return with ?fields=, mapped to their
+// SQL; `select` below is always built from these or ORDER_LIST_DEFAULT.
+export const ORDER_LIST_FIELDS = {
+  id: 'o.id',
+  tenant_id: 'o.tenant_id',
+  client_id: 'o.client_id',
+  order_number: 'o.order_number',
+  status: 'o.status',
+  total_amount: 'o.total_amount',
+  payment_method: 'o.payment_method',
+  paid_at: 'o.paid_at',
+  notes: 'o.notes',
+  created_by: 'o.created_by',
+  created_at: 'o.created_at',
+  updated_at: 'o.updated_at',
+  client_name: 'c.name',
+  vehicle_plate: 'c.vehicle_plate'
+};
+export const ORDER_LIST_DEFAULT = 'o.*, c.name as client_name, c.vehicle_plate';
+
+// Statement texts of the listings below for a projection; the paged and
+// recent ones are exported so scripts/explain-check.mjs plans what the API runs
+export function ordersPageSql(select) {
+  return `
+    SELECT ${select},
+           o.created_at::text as _cursor_created_at
+    FROM orders o
+    LEFT JOIN clients c ON o.client_id = c.id
+    WHERE o.tenant_id = $1
+      AND ($2::timestamptz IS NULL OR (o.created_at, o.id) < ($2::timestamptz, $3::uuid))
+    ORDER BY o.created_at DESC, o.id DESC
+    LIMIT $4
+  `;
+}
+
+function allOrdersSql(select) {
+  return `
+    SELECT ${select}
+    FROM orders o
+    LEFT JOIN clients c ON o.client_id = c.id
+    WHERE o.tenant_id = $1
+    ORDER BY o.created_at DESC
+  `;
+}
+
+export function recentOrdersSql(select) {
+  return `
+    SELECT ${select}
+    FROM orders o
+    LEFT JOIN clients c ON o.client_id = c.id
+    WHERE o.tenant_id = $1
+    ORDER BY o.created_at DESC
+    LIMIT 10
+  `;
+}
+
+// Orders newest first, with the client's name and plate. With `page`
+// ({ limit, cursor }) fetches one keyset page of limit + 1 rows, the extra
+// row telling whether another page exists; without it, every order.
+// Each projection is its own prepared statement.
+export async function listOrders(tenantId, select, page = null, db = { query }) {
+  if (page) {
+    return db.query(prepared('orders_page', ordersPageSql(select)),
+      [tenantId, page.cursor?.createdAt ?? null, page.cursor?.id ?? null, page.limit + 1]);
+  }
+
+  return db.query(prepared('orders_all', allOrdersSql(select)), [tenantId]);
+}
+
+// The dashboard's ten most recent orders
+export async function listRecentOrders(tenantId, select, db = { query }) {
+  return db.query(prepared('orders_recent', recentOrdersSql(select)), [tenantId]);
+}
@@ -0,0 +1,294 @@
+import { createHash } from 'crypto';
+import puppeteer from 'puppeteer';
+import { LRUCache } from './cache.js';
+import { recordPhase, timePhase } from './timing.js';
+
+// Concurrent renders (= pages open at once) per process
+const PDF_POOL_SIZE = parseInt(process.env.PDF_POOL_SIZE || '4', 10);
+// Requests allowed to wait for a free page before we answer 503
+const PDF_QUEUE_MAX = parseInt(process.env.PDF_QUEUE_MAX || '100', 10);
+// Relaunch Chromium after this many renders to cap its memory growth
+const PDF_BROWSER_MAX_RENDERS = parseInt(process.env.PDF_BROWSER_MAX_RENDERS || '500', 10);
+const PDF_RENDER_TIMEOUT_MS = parseInt(process.env.PDF_RENDER_TIMEOUT_MS || '30000', 10);
+// Rendered PDFs kept in memory, bounded by total bytes (0 disables the cache)
+const PDF_CACHE_MAX_BYTES = parseInt(process.env.PDF_CACHE_MAX_BYTES || String(64 * 1024 * 1024), 10);
+
+// Bump when the receipt template changes so old ETags stop matching
+const PDF_TEMPLATE_VERSION = 1;
+
+const LAUNCH_OPTIONS = {
+  headless: true,
+  args: ['--no-sandbox', '--disable-setuid-sandbox']
+};
+
+export class PdfQueueFullError extends Error {
+  constructor() {
+    super('PDF render queue is full');
+    this.name = 'PdfQueueFullError';
+  }
+}
+
+// One long-lived Chromium with a bounded set of reusable pages. Renders
+// beyond `size` wait in a FIFO queue; beyond `maxQueue` they are rejected.
+// A browser is retired after `maxRenders` renders or when it disconnects
+// (crash); new renders go to a fresh browser while the old one finishes its
+// in-flight pages and is then closed.
+export class BrowserPool {
+  constructor({ size, maxQueue, maxRenders, timeout }) {
+    this.size = size;
+    this.maxQueue = maxQueue;
+    this.maxRenders = maxRenders;
+    this.timeout = timeout;
+    this.current = null;
+    this.launching = null;
+    this.active = 0;
+    // Launched browsers not yet disconnected, retiring ones included
+    this.open = 0;
+    this.waiters = [];
+    this.counters = { renders: 0, failures: 0, rejected: 0, launches: 0, recycles: 0, crashes: 0, peakQueue: 0 };
+  }
+
+  // Time waiting for a page and rendering on it are reported separately in
+  // Server-Timing (pdf-queue, render), so a slow PDF shows which one it was
+  async render(html, pdfOptions) {
+    const queuedAt = performance.now();
+    await this.acquire();
+    recordPhase('pdf-queue', performance.now() - queuedAt);
+    try {
+      return await timePhase('render', () => this.renderOnPage(html, pdfOptions));
+    } finally {
+      this.release();
+    }
+  }
+
+  acquire() {
+    if (this.active < this.size) {
+      this.active++;
+      return Promise.resolve();
+    }
+
+    if (this.waiters.length >= this.maxQueue) {
+      this.counters.rejected++;
+      return Promise.reject(new PdfQueueFullError());
+    }
+
+    const slot = new Promise((resolve) => this.waiters.push(resolve));
+    this.counters.peakQueue = Math.max(this.counters.peakQueue, this.waiters.length);
+    return slot;
+  }
+
+  // Hand the slot straight to the next waiter, so `active` never drops below
+  // the number of renders actually running
+  release() {
+    const next = this.waiters.shift();
+    if (next) {
+      next();
+    } else {
+      this.active--;
+    }
+  }
+
+  async getBrowser() {
+    if (this.current && !this.current.retired) {
+      return this.current;
+    }
+
+    if (!this.launching) {
+      this.launching = this.launch().finally(() => {
+        this.launching = null;
+      });
+    }
+
+    return this.launching;
+  }
+
+  async launch() {
+    const instance = await puppeteer.launch(LAUNCH_OPTIONS);
+    const browser = { instance, renders: 0, active: 0, idlePages: [], retired: false, closing: false };
+
+    instance.on('disconnected', () => {
+      this.open--;
+      if (!browser.closing) {
+        console.error('PDF browser disconnected unexpectedly; relaunching on next render');
+        this.counters.crashes++;
+      }
+      browser.closing = true;
+      this.retire(browser);
+    });
+
+    this.counters.launches++;
+    this.open++;
+    this.current = browser;
+    return browser;
+  }
+
+  retire(browser) {
+    if (browser.retired) return;
+
+    browser.retired = true;
+    if (this.current === browser) {
+      this.current = null;
+    }
+    if (!browser.closing) {
+      this.counters.recycles++;
+    }
+    this.closeIfIdle(browser);
+  }
+
+  closeIfIdle(browser) {
+    if (browser.active > 0 || browser.closing) return;
+
+    browser.closing = true;
+    browser.instance.close().catch(() => {});
+  }
+
+  async renderOnPage(html, pdfOptions) {
+    const browser = await this.getBrowser();
+    browser.active++;
+    let page = null;
+
+    try {
+      page = browser.idlePages.pop() || await browser.instance.newPage();
+      await page.setContent(html, { waitUntil: 'load', timeout: this.timeout });
+      const pdf = await page.pdf({ ...pdfOptions, timeout: this.timeout });
+
+      // Only pages that rendered cleanly go back into the pool
+      browser.idlePages.push(page);
+      page = null;
+      this.counters.renders++;
+      return pdf;
+    } catch (error) {
+      this.counters.failures++;
+      throw error;
+    } finally {
+      if (page) {
+        page.close().catch(() => {});
+      }
+      browser.active--;
+      browser.renders++;
+
+      if (browser.renders >= this.maxRenders) {
+        this.retire(browser);
+      }
+      if (browser.retired) {
+        this.closeIfIdle(browser);
+      }
+    }
+  }
+
+  stats() {
+    return {
+      ...this.counters,
+      size: this.size,
+      active: this.active,
+      queued: this.waiters.length,
+      openBrowsers: this.open,
+      browserRenders: this.current ? this.current.renders : 0
+    };
+  }
+}
+
+let pool = null;
+
+export function getPdfPool() {
+  if (!pool) {
+    pool = new BrowserPool({
+      size: PDF_POOL_SIZE,
+      maxQueue: PDF_QUEUE_MAX,
+      maxRenders: PDF_BROWSER_MAX_RENDERS,
+      timeout: PDF_RENDER_TIMEOUT_MS
+    });
+  }
+
+  return pool;
+}
+
+export async function renderPdf(html, pdfOptions) {
+  return getPdfPool().render(html, pdfOptions);
+}
+
+// ============ RENDERED PDF CACHE ============
+
+// Entries are addressed by a hash of everything the receipt shows, so a
+// stale PDF can never be served: any change to the order, its items, the
+// client or the tenant branding yields a new key. The invalidate* helpers
+// only free memory held by entries that can no longer be hit.
+let pdfCache = null;
+
+function getPdfCache() {
+  if (!pdfCache) {
+    pdfCache = new LRUCache({
+      max: PDF_CACHE_MAX_BYTES > 0 ? 10000 : 0,
+      maxSize: PDF_CACHE_MAX_BYTES,
+      sizeOf: (entry) => entry.pdf.length
+    });
+  }
+
+  return pdfCache;
+}
+
+export function pdfCacheKey(...parts) {
+  return createHash('sha256')
+    .update(JSON.stringify([PDF_TEMPLATE_VERSION, ...parts]))
+    .digest('hex');
+}
+
+export function getCachedPdf(key) {
+  return getPdfCache().get(key)?.pdf;
+}
+
+// `tags` ({ orderId, clientId }) let the invalidate* helpers find the entry
+export function cachePdf(key, pdf, tags) {
+  getPdfCache().set(key, { pdf, ...tags });
+}
+
+// Renders in progress by cache key: concurrent misses for one receipt wait on
+// the first request's render instead of each taking a pool page
+const inflightRenders = new Map();
+
+// { pdf, status } for `key`: HIT from the cache, MISS after render() (whose
+// result is cached with `tags`), or SHARED when another request's render of
+// the same key was already in flight. With bypass the cache is neither read
+// nor joined, so every call renders (status BYPASS); the result still
+// replaces the cached entry, as it is the same receipt.
+export async function getOrRenderPdf(key, render, tags, { bypass = false } = {}) {
+  if (!bypass) {
+    const cached = getCachedPdf(key);
+    if (cached) {
+      return { pdf: cached, status: 'HIT' };
+    }
+
+    const inflight = inflightRenders.get(key);
+    if (inflight) {
+      return { pdf: await inflight, status: 'SHARED' };
+    }
+  }
+
+  const rendering = render().then((pdf) => {
+    cachePdf(key, pdf, tags);
+    return pdf;
+  });
+
+  if (!bypass) {
+    inflightRenders.set(key, rendering);
+    rendering.catch(() => {}).finally(() => inflightRenders.delete(key));
+  }
+
+  return { pdf: await rendering, status: bypass ? 'BYPASS' : 'MISS' };
+}
+
+export function invalidateOrderPdfs(orderId) {
+  getPdfCache().deleteWhere((entry) => entry.orderId === orderId);
+}
+
+export function invalidateClientPdfs(clientId) {
+  getPdfCache().deleteWhere((entry) => entry.clientId === clientId);
+}
+
+export function clearPdfCache() {
+  getPdfCache().clear();
+}
+
+export function getPdfCacheStats() {
+  return getPdfCache().stats();
+}
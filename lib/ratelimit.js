@@ -0,0 +1,132 @@
+import { LRUCache } from './cache.js';
+
+// A request refused for now; answer 429 with Retry-After: retryAfter (seconds)
+export class RateLimitError extends Error {
+  constructor(message, retryAfter) {
+    super(message);
+    this.name = 'RateLimitError';
+    this.retryAfter = retryAfter;
+  }
+}
+
+// Token bucket per key (client IP, username): up to `burst` requests at once,
+// refilled at `perMinute`. An idle bucket is full again after burst/rate, so
+// buckets live in an LRU with that TTL instead of piling up for every key
+// ever seen. burst <= 0 disables the limiter.
+export class TokenBucketLimiter {
+  constructor({ burst, perMinute, maxKeys = 10000 }) {
+    this.burst = burst;
+    this.ratePerMs = perMinute / 60000;
+    this.enabled = burst > 0 && perMinute > 0;
+    this.buckets = new LRUCache({
+      max: this.enabled ? maxKeys : 0,
+      ttl: this.enabled ? Math.ceil(burst / this.ratePerMs) : 0
+    });
+    this.limited = 0;
+  }
+
+  refill(key) {
+    const now = Date.now();
+    const bucket = this.buckets.get(key) || { tokens: this.burst, updatedAt: now };
+
+    bucket.tokens = Math.min(this.burst, bucket.tokens + (now - bucket.updatedAt) * this.ratePerMs);
+    bucket.updatedAt = now;
+    this.buckets.set(key, bucket);
+    return bucket;
+  }
+
+  // Seconds until `key` has a token (0 = one is available); consumes nothing
+  peek(key) {
+    if (!this.enabled) return 0;
+
+    const bucket = this.refill(key);
+    if (bucket.tokens >= 1) return 0;
+
+    this.limited++;
+    return Math.ceil((1 - bucket.tokens) / this.ratePerMs / 1000);
+  }
+
+  // Consume a token for `key`; returns 0, or the seconds to wait if none is left
+  take(key) {
+    const wait = this.peek(key);
+
+    if (wait === 0 && this.enabled) {
+      this.buckets.get(key).tokens -= 1;
+    }
+
+    return wait;
+  }
+
+  // Return a token taken for `key` (the attempt turned out not to count)
+  giveBack(key) {
+    if (!this.enabled) return;
+
+    const bucket = this.refill(key);
+    bucket.tokens = Math.min(this.burst, bucket.tokens + 1);
+  }
+
+  stats() {
+    return { keys: this.buckets.size, limited: this.limited };
+  }
+}
+
+// At most `max` callers inside run() at once; up to `maxQueue` more wait in
+// FIFO order and anything beyond is rejected with a RateLimitError, so a
+// burst can't pile up unbounded work behind the slots.
+export class Semaphore {
+  constructor({ max, maxQueue, message = 'Too many requests in progress' }) {
+    this.max = max;
+    this.maxQueue = maxQueue;
+    this.message = message;
+    this.active = 0;
+    this.waiters = [];
+    this.counters = { runs: 0, queued: 0, rejected: 0, peakQueue: 0 };
+  }
+
+  async run(fn) {
+    await this.acquire();
+    try {
+      return await fn();
+    } finally {
+      this.release();
+    }
+  }
+
+  acquire() {
+    if (this.active < this.max) {
+      this.active++;
+      this.counters.runs++;
+      return Promise.resolve();
+    }
+
+    if (this.waiters.length >= this.maxQueue) {
+      this.counters.rejected++;
+      return Promise.reject(new RateLimitError(this.message, 1));
+    }
+
+    const slot = new Promise((resolve) => this.waiters.push(resolve));
+    this.counters.runs++;
+    this.counters.queued++;
+    this.counters.peakQueue = Math.max(this.counters.peakQueue, this.waiters.length);
+    return slot;
+  }
+
+  // Hand the slot straight to the next waiter, like BrowserPool.release()
+  release() {
+    const next = this.waiters.shift();
+    if (next) {
+      next();
+    } else {
+      this.active--;
+    }
+  }
+
+  stats() {
+    return {
+      ...this.counters,
+      max: this.max,
+      active: this.active,
+      waiting: this.waiters.length
+    };
+  }
+}
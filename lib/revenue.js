@@ -0,0 +1,106 @@
+import { query, prepared, withTransaction } from './db.js';
+
+// Revenue is bucketed by the business's local calendar day
+export const REVENUE_TIMEZONE = 'America/Sao_Paulo';
+
+const UPSERT_DAILY_REVENUE = prepared('upsert_daily_revenue', `
+  INSERT INTO daily_revenue (tenant_id, day, total, order_count)
+  VALUES ($1, ($2::timestamptz AT TIME ZONE '${REVENUE_TIMEZONE}')::date, $3, $4)
+  ON CONFLICT (tenant_id, day) DO UPDATE
+  SET total = daily_revenue.total + EXCLUDED.total,
+      order_count = daily_revenue.order_count + EXCLUDED.order_count
+`);
+
+function isPaid(order) {
+  return order?.status === 'paid' && order.paid_at;
+}
+
+function samePayment(before, after) {
+  return new Date(before.paid_at).getTime() === new Date(after.paid_at).getTime()
+    && parseFloat(before.total_amount) === parseFloat(after.total_amount);
+}
+
+// Keep daily_revenue in step with an order's paid state. `before` and `after`
+// are { status, paid_at, total_amount } snapshots (before is null for a new
+// order, after is null for a deleted one). Pass the transaction handle as
+// `db` so the rollup commits together with the order change.
+export async function recordRevenueChange(tenantId, before, after, db = { query }) {
+  const wasPaid = isPaid(before);
+  const nowPaid = isPaid(after);
+
+  if (wasPaid && nowPaid && samePayment(before, after)) {
+    return;
+  }
+
+  if (wasPaid) {
+    await db.query(UPSERT_DAILY_REVENUE, [tenantId, before.paid_at, -parseFloat(before.total_amount), -1]);
+  }
+
+  if (nowPaid) {
+    await db.query(UPSERT_DAILY_REVENUE, [tenantId, after.paid_at, parseFloat(after.total_amount), 1]);
+  }
+}
+
+// Add freshly created orders to the rollup, one upsert per distinct paid_at
+// (a batch created in one request shares a single timestamp)
+export async function recordNewOrdersRevenue(tenantId, orders, db = { query }) {
+  const paidTotals = new Map();
+
+  for (const order of orders) {
+    if (!isPaid(order)) continue;
+
+    const paidAt = new Date(order.paid_at).toISOString();
+    const bucket = paidTotals.get(paidAt) || { amount: 0, count: 0 };
+    bucket.amount += parseFloat(order.total_amount);
+    bucket.count++;
+    paidTotals.set(paidAt, bucket);
+  }
+
+  for (const [paidAt, { amount, count }] of paidTotals) {
+    await db.query(UPSERT_DAILY_REVENUE, [tenantId, paidAt, amount, count]);
+  }
+}
+
+// Recompute the rollup from orders (used after migrations and seeding)
+export async function rebuildDailyRevenue() {
+  await withTransaction(async (tx) => {
+    await tx.query('DELETE FROM daily_revenue');
+    await tx.query(`
+      INSERT INTO daily_revenue (tenant_id, day, total, order_count)
+      SELECT tenant_id, (paid_at AT TIME ZONE '${REVENUE_TIMEZONE}')::date, SUM(total_amount), COUNT(*)
+      FROM orders
+      WHERE status = 'paid' AND paid_at IS NOT NULL
+      GROUP BY 1, 2
+    `);
+  });
+}
+
+// Exported for scripts/explain-check.mjs
+export const REVENUE_SUMMARY = prepared('revenue_summary', `
+  WITH bounds AS (
+    SELECT (NOW() AT TIME ZONE '${REVENUE_TIMEZONE}')::date AS today
+  )
+  SELECT
+    COALESCE(SUM(r.total) FILTER (WHERE r.day = b.today), 0) AS today,
+    COALESCE(SUM(r.total) FILTER (WHERE r.day > b.today - 15), 0) AS last15,
+    COALESCE(SUM(r.total), 0) AS last30
+  FROM bounds b
+  LEFT JOIN daily_revenue r
+    ON r.tenant_id = $1
+   AND r.day > b.today - 30
+   AND r.day <= b.today
+`);
+
+// Today / last 15 days / last 30 days (calendar days, including today) in one
+// pass over at most 30 rollup rows, however many orders the tenant has
+export async function getRevenueSummary(tenantId) {
+  const result = await query(REVENUE_SUMMARY, [tenantId]);
+
+  const row = result.rows[0];
+
+  return {
+    today: parseFloat(row.today),
+    last15Days: parseFloat(row.last15),
+    last30Days: parseFloat(row.last30)
+  };
+}
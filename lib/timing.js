@@ -0,0 +1,44 @@
+import { AsyncLocalStorage } from 'async_hooks';
+
+// Per-request phase durations (ms) for the Server-Timing header; see trackTiming()
+const timingStorage = new AsyncLocalStorage();
+
+// Run fn with fresh phase totals; every timePhase()/recordPhase() reached from
+// inside it (however deeply nested) adds to the returned phases.
+export function trackTiming(fn) {
+  const phases = new Map();
+  return timingStorage.run(phases, async () => ({ result: await fn(), phases }));
+}
+
+// Add `duration` ms to a phase of the current request (no-op outside one).
+// Phases that overlap (concurrent awaits) are summed, not merged.
+export function recordPhase(name, duration) {
+  const phases = timingStorage.getStore();
+  if (phases) {
+    phases.set(name, (phases.get(name) || 0) + duration);
+  }
+}
+
+export async function timePhase(name, fn) {
+  const start = performance.now();
+  try {
+    return await fn();
+  } finally {
+    recordPhase(name, performance.now() - start);
+  }
+}
+
+export function timePhaseSync(name, fn) {
+  const start = performance.now();
+  try {
+    return fn();
+  } finally {
+    recordPhase(name, performance.now() - start);
+  }
+}
+
+// One Server-Timing metric: name;desc="...";dur=ms
+export function serverTimingEntry(name, duration, description) {
+  const desc = description ? `;desc="${description.replace(/["\\]/g, '')}"` : '';
+  return `${name}${desc};dur=${duration.toFixed(1)}`;
+}
@@ -0,0 +1,30 @@
+import { query, prepared } from './db.js';
+
+// Per-tenant version counters for listings that rarely change. Every write to
+// a listing bumps its counter; GET handlers derive the ETag from it, so a
+// conditional request costs one primary-key lookup instead of the list query.
+export const CATALOG = 'catalog';
+export const TEAM = 'team';
+
+// Every conditional GET on a versioned listing starts with this lookup
+const RESOURCE_VERSION = prepared('resource_version', `
+  SELECT version FROM resource_versions
+  WHERE tenant_id = $1 AND resource = $2
+`);
+
+export async function getResourceVersion(tenantId, resource, db = { query }) {
+  const result = await db.query(RESOURCE_VERSION, [tenantId, resource]);
+
+  return result.rows.length > 0 ? Number(result.rows[0].version) : 0;
+}
+
+// Pass the transaction handle as `db` so the bump commits together with the
+// write; readers then never see new rows under an old version.
+export async function bumpResourceVersion(tenantId, resource, db = { query }) {
+  await db.query(`
+    INSERT INTO resource_versions (tenant_id, resource, version)
+    VALUES ($1, $2, 1)
+    ON CONFLICT (tenant_id, resource) DO UPDATE
+    SET version = resource_versions.version + 1
+  `, [tenantId, resource]);
+}
@@ -0,0 +1,253 @@
+// EXPLAIN regression check for the hot API queries.
+//
+// Runs the migrations against DATABASE_URL, seeds a throwaway tenant with
+// --rows clients and orders (two items each), ANALYZEs, then EXPLAIN ANALYZEs
+// every query below and fails if any plan reads a large table with a
+// sequential scan. The tenant is deleted afterwards unless --keep is given.
+//
+//   DATABASE_URL=postgresql://... yarn db:explain [--rows 100000] [--keep]
+//
+// The orders, revenue and export statements are imported from lib/ as the
+// API runs them (default projection); the clients, single order and receipt
+// ones live in app/api/[[...path]]/route.js, which can't be imported outside
+// Next, so keep those entries in step with it by hand.
+
+import { query, getPool } from '../lib/db.js';
+import { runMigrations } from '../lib/migrate.js';
+import { ORDER_LIST_DEFAULT, ordersPageSql, recentOrdersSql } from '../lib/orders.js';
+import { REVENUE_SUMMARY, REVENUE_TIMEZONE } from '../lib/revenue.js';
+import { PAID_ORDERS } from '../lib/export.js';
+import { seedTenant } from './seed-tenant.mjs';
+
+// Tables that grow with the business; a seq scan on these is a regression
+const LARGE_TABLES = ['orders', 'clients', 'order_items'];
+
+const HOT_QUERIES = [
+  {
+    name: 'GET /orders?limit= (first page)',
+    sql: ordersPageSql(ORDER_LIST_DEFAULT),
+    params: (f) => [f.tenantId, null, null, 101]
+  },
+  {
+    name: 'GET /orders?after= (deep page)',
+    sql: ordersPageSql(ORDER_LIST_DEFAULT),
+    params: (f) => [f.tenantId, f.orderCursor.created_at, f.orderCursor.id, 101]
+  },
+  {
+    name: 'GET /clients?limit= (first page)',
+    sql: `
+      SELECT *, created_at::text as _cursor_created_at FROM clients
+      WHERE tenant_id = $1
+        AND ($2::timestamptz IS NULL OR (created_at, id) < ($2::timestamptz, $3::uuid))
+      ORDER BY created_at DESC, id DESC
+      LIMIT $4
+    `,
+    params: (f) => [f.tenantId, null, null, 101]
+  },
+  {
+    name: 'GET /clients?after= (deep page)',
+    sql: `
+      SELECT *, created_at::text as _cursor_created_at FROM clients
+      WHERE tenant_id = $1
+        AND ($2::timestamptz IS NULL OR (created_at, id) < ($2::timestamptz, $3::uuid))
+      ORDER BY created_at DESC, id DESC
+      LIMIT $4
+    `,
+    params: (f) => [f.tenantId, f.clientCursor.created_at, f.clientCursor.id, 101]
+  },
+  {
+    name: 'GET /dashboard (recent orders)',
+    sql: recentOrdersSql(ORDER_LIST_DEFAULT),
+    params: (f) => [f.tenantId]
+  },
+  {
+    name: 'GET /dashboard (revenue summary)',
+    sql: REVENUE_SUMMARY.text,
+    params: (f) => [f.tenantId]
+  },
+  {
+    name: 'GET /orders/export (paid range)',
+    sql: PAID_ORDERS,
+    params: (f) => [f.tenantId, f.paidFrom, f.paidTo]
+  },
+  {
+    name: 'GET /orders/:id (order)',
+    sql: `
+      SELECT o.*, c.name as client_name, c.phone as client_phone,
+             c.vehicle_plate, c.vehicle_model
+      FROM orders o
+      LEFT JOIN clients c ON o.client_id = c.id
+      WHERE o.id = $1 AND o.tenant_id = $2
+    `,
+    params: (f) => [f.orderId, f.tenantId]
+  },
+  {
+    name: 'GET /orders/:id (items)',
+    sql: `
+      SELECT * FROM order_items
+      WHERE order_id = $1
+    `,
+    params: (f) => [f.orderId]
+  },
+  {
+    name: 'GET /orders/:id/pdf (receipt)',
+    sql: `
+      SELECT o.*, c.name as client_name, c.phone as client_phone,
+             c.vehicle_plate, c.vehicle_model,
+             t.name as tenant_name, t.logo_url, t.primary_color
+      FROM orders o
+      LEFT JOIN clients c ON o.client_id = c.id
+      LEFT JOIN tenants t ON o.tenant_id = t.id
+      WHERE o.id = $1 AND o.tenant_id = $2
+    `,
+    params: (f) => [f.orderId, f.tenantId]
+  },
+  {
+    name: 'GET /orders/:id/pdf (items)',
+    sql: `
+      SELECT service_name, price, quantity
+      FROM order_items
+      WHERE order_id = $1
+      ORDER BY created_at, id
+    `,
+    params: (f) => [f.orderId]
+  }
+];
+
+function parseArgs(argv) {
+  const args = { rows: 100000, keep: false };
+
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === '--rows') {
+      args.rows = parseInt(argv[++i], 10);
+    } else if (argv[i] === '--keep') {
+      args.keep = true;
+    } else {
+      throw new Error(`Unknown argument: ${argv[i]}`);
+    }
+  }
+
+  if (!(args.rows > 0)) {
+    throw new Error('--rows must be a positive integer');
+  }
+
+  return args;
+}
+
+// YYYY-MM-DD of an instant on the business calendar (REVENUE_TIMEZONE)
+function businessDate(ms) {
+  return new Date(ms).toLocaleDateString('en-CA', { timeZone: REVENUE_TIMEZONE });
+}
+
+async function loadFixtures(tenantId, rows) {
+  // Cursors/ids from the middle of the data set, like a user deep in a listing
+  // (created_at as text keeps microseconds, as the API cursors do)
+  const offset = Math.floor(rows / 2);
+
+  const orderResult = await query(`
+    SELECT id, created_at::text as created_at FROM orders
+    WHERE tenant_id = $1
+    ORDER BY created_at DESC, id DESC
+    OFFSET $2 LIMIT 1
+  `, [tenantId, offset]);
+
+  const clientResult = await query(`
+    SELECT id, created_at::text as created_at FROM clients
+    WHERE tenant_id = $1
+    ORDER BY created_at DESC, id DESC
+    OFFSET $2 LIMIT 1
+  `, [tenantId, offset]);
+
+  return {
+    tenantId,
+    orderId: orderResult.rows[0].id,
+    orderCursor: orderResult.rows[0],
+    clientCursor: clientResult.rows[0],
+    // The last 30 business days, as a GET /orders/export?paid_from=&paid_to= would ask
+    paidFrom: businessDate(Date.now() - 30 * 24 * 60 * 60 * 1000),
+    paidTo: businessDate(Date.now())
+  };
+}
+
+// Seq scans on large tables, plus every index the plan touches
+function inspectPlan(node, found = { seqScans: [], indexes: new Set() }) {
+  if (node['Node Type'] === 'Seq Scan' && LARGE_TABLES.includes(node['Relation Name'])) {
+    found.seqScans.push(node['Relation Name']);
+  }
+
+  if (node['Index Name']) {
+    found.indexes.add(node['Index Name']);
+  }
+
+  for (const child of node.Plans || []) {
+    inspectPlan(child, found);
+  }
+
+  return found;
+}
+
+async function explain(hotQuery, fixtures) {
+  const result = await query(`EXPLAIN (ANALYZE, FORMAT JSON) ${hotQuery.sql}`, hotQuery.params(fixtures));
+  const [plan] = result.rows[0]['QUERY PLAN'];
+  const { seqScans, indexes } = inspectPlan(plan.Plan);
+
+  return {
+    name: hotQuery.name,
+    seqScans,
+    indexes: [...indexes],
+    executionMs: plan['Execution Time']
+  };
+}
+
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+
+  if (!process.env.DATABASE_URL) {
+    throw new Error('DATABASE_URL is not set; point it at a local Postgres you can seed');
+  }
+
+  await runMigrations();
+
+  console.log(`\nSeeding ${args.rows} clients and orders...`);
+  const seedStart = Date.now();
+  const tenantId = await seedTenant(args.rows, 'EXPLAIN check');
+  console.log(`✓ Seeded tenant ${tenantId} in ${((Date.now() - seedStart) / 1000).toFixed(1)}s\n`);
+
+  let failures = 0;
+
+  try {
+    const fixtures = await loadFixtures(tenantId, args.rows);
+
+    for (const hotQuery of HOT_QUERIES) {
+      const report = await explain(hotQuery, fixtures);
+      const ok = report.seqScans.length === 0;
+
+      if (!ok) failures++;
+
+      console.log(`${ok ? '✓' : '✗'} ${report.name.padEnd(34)} ${report.executionMs.toFixed(2).padStart(9)}ms  ` +
+        (ok ? (report.indexes.join(', ') || 'no index') : `Seq Scan on ${report.seqScans.join(', ')}`));
+    }
+  } finally {
+    if (!args.keep) {
+      await query('DELETE FROM tenants WHERE id = $1', [tenantId]);
+    }
+  }
+
+  if (failures > 0) {
+    console.error(`\n❌ ${failures} of ${HOT_QUERIES.length} hot queries fall back to a sequential scan at ${args.rows} rows`);
+    process.exitCode = 1;
+  } else {
+    console.log(`\n✅ All ${HOT_QUERIES.length} hot queries use indexes at ${args.rows} rows`);
+  }
+}
+
+main()
+  .catch((error) => {
+    console.error('EXPLAIN check failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(() => {
+    if (process.env.DATABASE_URL) {
+      return getPool().end();
+    }
+  });
@@ -0,0 +1,204 @@
+// Prepared-statement benchmark for the hot read paths.
+//
+// Runs the migrations against DATABASE_URL, seeds a throwaway tenant with
+// --rows clients and orders (as db:explain does), then drives the queries
+// behind GET /orders and GET /dashboard from --concurrency workers for
+// --duration seconds each: once with every statement sent unnamed (parsed and
+// planned on each call) and once as named prepared statements. Prints
+// throughput and latency per path side by side. The tenant is deleted
+// afterwards unless --keep is given.
+//
+//   DATABASE_URL=postgresql://... yarn db:bench-prepared [--rows 10000] [--duration 10] [--concurrency 8] [--keep]
+//
+// The paths call the same lib functions the API route does, so the SQL can't
+// drift from what production runs. Watch the deep keyset page in particular:
+// after five executions Postgres may switch a prepared statement to a generic
+// plan, and the ($2 IS NULL OR ...) cursor condition is where that could plan
+// worse than the custom plan an unnamed query always gets.
+
+import { query, getPool, setPreparedStatements, getPreparedStatementStats } from '../lib/db.js';
+import { runMigrations } from '../lib/migrate.js';
+import { getUserWithTenants } from '../lib/auth.js';
+import { getRevenueSummary } from '../lib/revenue.js';
+import { listOrders, listRecentOrders, ORDER_LIST_DEFAULT } from '../lib/orders.js';
+import { seedTenant } from './seed-tenant.mjs';
+
+// Iterations per worker before timing starts (connections open, plans cached)
+const WARMUP_ITERATIONS = 20;
+
+const PATHS = [
+  {
+    name: 'authenticate (cache miss)',
+    run: (f) => getUserWithTenants(f.userId)
+  },
+  {
+    name: 'GET /orders?limit=100',
+    run: (f) => listOrders(f.tenantId, ORDER_LIST_DEFAULT, { limit: 100, cursor: null })
+  },
+  {
+    name: 'GET /orders?after= (deep page)',
+    run: (f) => listOrders(f.tenantId, ORDER_LIST_DEFAULT, { limit: 100, cursor: f.orderCursor })
+  },
+  {
+    name: 'GET /orders?fields=id,status',
+    run: (f) => listOrders(f.tenantId, 'o.id as id, o.status as status', { limit: 100, cursor: null })
+  },
+  {
+    name: 'GET /dashboard',
+    run: (f) => Promise.all([
+      getRevenueSummary(f.tenantId),
+      listRecentOrders(f.tenantId, ORDER_LIST_DEFAULT)
+    ])
+  }
+];
+
+function parseArgs(argv) {
+  const args = { rows: 10000, duration: 10, concurrency: 8, keep: false };
+
+  for (let i = 0; i < argv.length; i++) {
+    if (argv[i] === '--rows') {
+      args.rows = parseInt(argv[++i], 10);
+    } else if (argv[i] === '--duration') {
+      args.duration = parseFloat(argv[++i]);
+    } else if (argv[i] === '--concurrency') {
+      args.concurrency = parseInt(argv[++i], 10);
+    } else if (argv[i] === '--keep') {
+      args.keep = true;
+    } else {
+      throw new Error(`Unknown argument: ${argv[i]}`);
+    }
+  }
+
+  if (!(args.rows > 0) || !(args.duration > 0) || !(args.concurrency > 0)) {
+    throw new Error('--rows, --duration and --concurrency must be positive');
+  }
+
+  return args;
+}
+
+async function loadFixtures(tenantId, rows) {
+  // A member of the tenant for the authenticate path
+  const userResult = await query(`
+    INSERT INTO users (email, username, password_hash, full_name)
+    VALUES ($1, $1, 'not-a-real-hash', 'Prepared bench')
+    RETURNING id
+  `, [`prepared-bench-${Date.now()}@example.com`]);
+
+  const userId = userResult.rows[0].id;
+
+  await query(`
+    INSERT INTO user_tenants (user_id, tenant_id, role)
+    VALUES ($1, $2, 'owner')
+  `, [userId, tenantId]);
+
+  // Cursor from the middle of the listing (created_at as text, like the API's)
+  const orderResult = await query(`
+    SELECT id, created_at::text as created_at FROM orders
+    WHERE tenant_id = $1
+    ORDER BY created_at DESC, id DESC
+    OFFSET $2 LIMIT 1
+  `, [tenantId, Math.floor(rows / 2)]);
+
+  return {
+    tenantId,
+    userId,
+    orderCursor: { createdAt: orderResult.rows[0].created_at, id: orderResult.rows[0].id }
+  };
+}
+
+function percentile(sorted, p) {
+  return sorted[Math.min(sorted.length - 1, Math.floor(sorted.length * p))];
+}
+
+// Run one path from `concurrency` workers for `duration` seconds
+async function measure(path, fixtures, { duration, concurrency }) {
+  await Promise.all(Array.from({ length: concurrency }, async () => {
+    for (let i = 0; i < WARMUP_ITERATIONS; i++) {
+      await path.run(fixtures);
+    }
+  }));
+
+  const latencies = [];
+  const start = performance.now();
+  const deadline = start + duration * 1000;
+
+  await Promise.all(Array.from({ length: concurrency }, async () => {
+    while (performance.now() < deadline) {
+      const callStart = performance.now();
+      await path.run(fixtures);
+      latencies.push(performance.now() - callStart);
+    }
+  }));
+
+  const elapsed = (performance.now() - start) / 1000;
+  latencies.sort((a, b) => a - b);
+
+  return {
+    rps: latencies.length / elapsed,
+    p50: percentile(latencies, 0.5),
+    p95: percentile(latencies, 0.95)
+  };
+}
+
+function formatResult(result) {
+  return `${result.rps.toFixed(0).padStart(7)} req/s  p50 ${result.p50.toFixed(2).padStart(6)}ms  p95 ${result.p95.toFixed(2).padStart(6)}ms`;
+}
+
+async function main() {
+  const args = parseArgs(process.argv.slice(2));
+
+  if (!process.env.DATABASE_URL) {
+    throw new Error('DATABASE_URL is not set; point it at a local Postgres you can seed');
+  }
+
+  await runMigrations();
+
+  console.log(`\nSeeding ${args.rows} clients and orders...`);
+  const seedStart = Date.now();
+  const tenantId = await seedTenant(args.rows, 'Prepared bench');
+  console.log(`✓ Seeded tenant ${tenantId} in ${((Date.now() - seedStart) / 1000).toFixed(1)}s`);
+  console.log(`\nEach path: ${args.duration}s at concurrency ${args.concurrency}\n`);
+
+  let userId = null;
+
+  try {
+    const fixtures = await loadFixtures(tenantId, args.rows);
+    userId = fixtures.userId;
+
+    console.log(`${'Path'.padEnd(32)} ${'Unprepared'.padEnd(44)} ${'Prepared'.padEnd(44)} Change`);
+
+    for (const path of PATHS) {
+      setPreparedStatements(false);
+      const unprepared = await measure(path, fixtures, args);
+      setPreparedStatements(true);
+      const preparedResult = await measure(path, fixtures, args);
+
+      const change = (preparedResult.rps / unprepared.rps - 1) * 100;
+      console.log(`${path.name.padEnd(32)} ${formatResult(unprepared)}   ${formatResult(preparedResult)}   ` +
+        `${change >= 0 ? '+' : ''}${change.toFixed(1)}%`);
+    }
+
+    const stats = getPreparedStatementStats();
+    console.log(`\n${stats.registered} statements registered for preparation (max ${stats.max}, ${stats.overflow} over)`);
+  } finally {
+    setPreparedStatements(true);
+
+    if (!args.keep) {
+      await query('DELETE FROM tenants WHERE id = $1', [tenantId]);
+      if (userId) {
+        await query('DELETE FROM users WHERE id = $1', [userId]);
+      }
+    }
+  }
+}
+
+main()
+  .catch((error) => {
+    console.error('Prepared statement benchmark failed:', error);
+    process.exitCode = 1;
+  })
+  .finally(() => {
+    if (process.env.DATABASE_URL) {
+      return getPool().end();
+    }
+  });
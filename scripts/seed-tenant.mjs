@@ -0,0 +1,62 @@
+// Throwaway tenant seeding shared by the database scripts (db:explain,
+// db:bench-prepared). Callers delete the tenant when done; every seeded row
+// hangs off it with ON DELETE CASCADE.
+
+import { query } from '../lib/db.js';
+import { REVENUE_TIMEZONE } from '../lib/revenue.js';
+
+// Seed `rows` clients and orders (two items each) plus the tenant's
+// daily_revenue rollup, then ANALYZE. Returns the tenant id.
+export async function seedTenant(rows, name) {
+  const tenantResult = await query(`
+    INSERT INTO tenants (name, slug)
+    VALUES ($1, $2)
+    RETURNING id
+  `, [name, name.toLowerCase().replace(/[^a-z0-9]+/g, '-') + '-' + Date.now()]);
+
+  const tenantId = tenantResult.rows[0].id;
+
+  // One row every 10 minutes going back in time (~2 years at 100k rows)
+  await query(`
+    INSERT INTO clients (tenant_id, name, phone, vehicle_plate, vehicle_model, created_at)
+    SELECT $1, 'Cliente ' || g, '11900000000', 'EXP-' || g, 'Honda Civic', NOW() - g * INTERVAL '10 minutes'
+    FROM generate_series(1, $2) g
+  `, [tenantId, rows]);
+
+  await query(`
+    WITH client_ids AS (
+      SELECT array_agg(id) AS ids FROM clients WHERE tenant_id = $1
+    )
+    INSERT INTO orders (tenant_id, client_id, order_number, status, total_amount, payment_method, paid_at, created_at)
+    SELECT $1,
+           ids[1 + g % array_length(ids, 1)],
+           'EXP-' || g,
+           (ARRAY['pending', 'in_progress', 'completed', 'paid', 'paid', 'paid'])[1 + g % 6],
+           50 + g % 200,
+           CASE WHEN g % 6 >= 3 THEN 'PIX' END,
+           CASE WHEN g % 6 >= 3 THEN NOW() - g * INTERVAL '10 minutes' END,
+           NOW() - g * INTERVAL '10 minutes'
+    FROM client_ids, generate_series(1, $2) g
+  `, [tenantId, rows]);
+
+  await query(`
+    INSERT INTO order_items (order_id, service_name, price, quantity)
+    SELECT o.id, item.name, item.price, 1
+    FROM orders o
+    CROSS JOIN (VALUES ('Lavagem Completa', 50.00), ('Enceramento', 30.00)) AS item(name, price)
+    WHERE o.tenant_id = $1
+  `, [tenantId]);
+
+  // Same rollup rebuildDailyRevenue() builds, for this tenant only
+  await query(`
+    INSERT INTO daily_revenue (tenant_id, day, total, order_count)
+    SELECT tenant_id, (paid_at AT TIME ZONE '${REVENUE_TIMEZONE}')::date, SUM(total_amount), COUNT(*)
+    FROM orders
+    WHERE tenant_id = $1 AND status = 'paid' AND paid_at IS NOT NULL
+    GROUP BY 1, 2
+  `, [tenantId]);
+
+  await query('ANALYZE tenants, clients, orders, order_items, daily_revenue');
+
+  return tenantId;
+}